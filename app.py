@@ -1,19 +1,32 @@
+import time
+_startup_begin = time.time()
+
+import asyncio
+import os
 import gradio as gr
-from langgraph_flow import run_langgraph_pipeline
+from langgraph_flow import aprepare_view, astream_langgraph_pipeline
 from category_agent import determine_required_views
-import sqlite3
-import time
+from db_ops import init_db, seed_demo_orders, get_reference_image
+from utils.model_registry import start_background_warmup, load_times
+from utils.metrics import start_metrics_server, observe
+from utils.speculative import SPECULATIVE_ENABLED, SpeculativeJobs
+
+_imports_done = time.time()
+
+# YOLO crop / normalization per uploaded image, keyed by (session, slot);
+# results are in-memory ImageBuffers, nothing to clean up on disk
+prepared_jobs = SpeculativeJobs(aprepare_view)
 
 # --- Logic Functions ---
 
-def get_product_requirements(category_name):
+async def get_product_requirements(category_name):
     """
     AI to determine required views based on category
     """
     if not category_name:
         return [gr.update(visible=True, value="Please enter a category.")] + [gr.update(visible=False)] * 4 + [gr.update(visible=False)]
     
-    required_views = determine_required_views(category_name) 
+    required_views = await asyncio.to_thread(determine_required_views, category_name)
     
     updates = [gr.update(visible=False, value="")] 
     
@@ -32,7 +45,23 @@ def get_product_requirements(category_name):
     return updates + image_updates + [form_visibility, stored_views]
 
 
-def process_final_submission(order_id, user_desc, view_names, img1, img2, img3, img4):
+def _session_id(request):
+    return getattr(request, "session_hash", None) or "default"
+
+
+def make_upload_handler(slot):
+    """Change handler of one image slot: start preparing the new image in the background"""
+    async def on_image_change(image, request: gr.Request):
+        if SPECULATIVE_ENABLED:
+            prepared_jobs.start(_session_id(request), slot, image)
+    return on_image_change
+
+
+async def cancel_prepared_jobs(request: gr.Request):
+    prepared_jobs.cancel(_session_id(request))
+
+
+async def process_final_submission(order_id, user_desc, view_names, img1, img2, img3, img4, request: gr.Request):
     """
     collect images and start initial analysis
     """
@@ -53,14 +82,10 @@ def process_final_submission(order_id, user_desc, view_names, img1, img2, img3,
     # --- Database ---
     reference_image_path = None
     try:
-        with sqlite3.connect("database.db") as conn:
-            c = conn.cursor() 
-            row = c.execute("SELECT reference_image FROM orders WHERE order_id=?", (order_id,)).fetchone()
-            if row:
-                reference_image_path = row[0]
-            else:
-                yield gr.update(visible=True), gr.update(visible=False), "Order ID not found.", []
-                return
+        reference_image_path = await asyncio.to_thread(get_reference_image, order_id)
+        if reference_image_path is None:
+            yield gr.update(visible=True), gr.update(visible=False), "Order ID not found.", []
+            return
     except Exception as e:
         yield gr.update(visible=True), gr.update(visible=False), f"DB Error: {e}", []
         return
@@ -73,15 +98,33 @@ def process_final_submission(order_id, user_desc, view_names, img1, img2, img3,
 
     # ---Run Pipeline---
     try:
-        outputs = run_langgraph_pipeline(
+        # pick up what was prepared while the form was being filled in (waits for running jobs)
+        session = _session_id(request)
+        prepared = await asyncio.gather(
+            *(prepared_jobs.take(session, i, images_list[i]) for i in range(len(view_names)))
+        )
+        prepared_views = {view: result for view, result in zip(view_names, prepared) if result is not None}
+
+        streamed = False
+        async for event in astream_langgraph_pipeline(
             order_id=order_id, 
             user_images_dict=user_images_dict, 
             reference_image_path=reference_image_path, 
-            user_description=user_desc
-        )
-        initial_reply = outputs['Policy']['policy_decision']
-        current_history[-1]["content"] = initial_reply
-        yield gr.update(visible=False), gr.update(visible=True), "", current_history
+            user_description=user_desc,
+            prepared_views=prepared_views or None,
+        ):
+            if "token" in event:
+                if not streamed:
+                    current_history[-1]["content"] = ""
+                    streamed = True
+                current_history[-1]["content"] += event["token"]
+            elif event["result"]['Quality']['retake_views']:
+                # unusable photos: back to the form so the listed views can be replaced
+                yield gr.update(visible=True), gr.update(visible=False), event["result"]['Policy']['policy_decision'], []
+                return
+            else:
+                current_history[-1]["content"] = event["result"]['Policy']['policy_decision']
+            yield gr.update(visible=False), gr.update(visible=True), "", current_history
     except Exception as e:
         current_history[-1]["content"] = f"System Error: {e}"
         yield gr.update(visible=False), gr.update(visible=True), "", current_history
@@ -94,22 +137,22 @@ def add_user_message(user_msg, history):
     return "", history
 
 
-def chat_response(history, order_id):
+async def chat_response(history, order_id):
     if not history or history[-1]["role"] != "user":
         yield history
         return
 
     user_msg = history[-1]["content"]
+    history.append({"role": "assistant", "content": ""})
     try:
-        outputs = run_langgraph_pipeline(order_id=order_id, user_images_dict=None, reference_image_path=None, user_description=user_msg)
-        ai_reply = outputs['Policy']['policy_decision']
+        async for event in astream_langgraph_pipeline(order_id=order_id, user_images_dict=None, reference_image_path=None, user_description=user_msg):
+            if "token" in event:
+                history[-1]["content"] += event["token"]
+            else:
+                history[-1]["content"] = event["result"]['Policy']['policy_decision']
+            yield history
     except Exception as e:
-        ai_reply = f"Error: {e}"
-
-    history.append({"role": "assistant", "content": ""})
-    for char in ai_reply:
-        history[-1]["content"] += char
-        time.sleep(0.005) 
+        history[-1]["content"] = f"Error: {e}"
         yield history
 
 
@@ -161,6 +204,9 @@ with gr.Blocks(title="FaultLens AI") as demo:
         outputs=[cat_status, img1, img2, img3, img4, details_section, stored_view_names]
     )
     
+    for slot, image_input in enumerate([img1, img2, img3, img4]):
+        image_input.change(fn=make_upload_handler(slot), inputs=[image_input], queue=False, show_progress="hidden")
+
     submit_btn.click(
         fn=process_final_submission,
         inputs=[order_input, desc_input, stored_view_names, img1, img2, img3, img4],
@@ -195,6 +241,27 @@ with gr.Blocks(title="FaultLens AI") as demo:
         fn=lambda: (gr.update(visible=True), gr.update(visible=False), "", [], gr.update(visible=False), gr.update(visible=False), gr.update(visible=False), gr.update(visible=False), gr.update(visible=False)),
         outputs=[inspection_stage, chat_stage, error_output, chatbot, img1, img2, img3, img4, details_section]
     )
+    reset_btn.click(fn=cancel_prepared_jobs, queue=False)
+    demo.unload(cancel_prepared_jobs)
 
 if __name__ == "__main__":
-    demo.launch(theme=gr.themes.Soft())
\ No newline at end of file
+    init_db()
+    if os.environ.get("FAULTLENS_SEED_DEMO", "1") != "0":
+        seed_demo_orders()
+    _db_done = time.time()
+
+    # serve first, then load/warm the models in the background
+    demo.launch(theme=gr.themes.Soft(), prevent_thread_lock=True)
+    _ready = time.time()
+    observe("startup.ready_seconds", _ready - _startup_begin)
+    start_metrics_server()
+    print(
+        f"--- Startup: imports {_imports_done - _startup_begin:.2f}s, "
+        f"db {_db_done - _imports_done:.2f}s, UI ready after {_ready - _startup_begin:.2f}s ---"
+    )
+
+    warmup_thread = start_background_warmup()
+    if warmup_thread is not None:
+        warmup_thread.join()
+        print(f"--- Warm-up finished {time.time() - _startup_begin:.2f}s after start, model load times: {load_times()} ---")
+    demo.block_thread()
\ No newline at end of file
@@ -0,0 +1,163 @@
+"""
+Offline batch inspection: stream queued complaints through the LangGraph pipeline.
+
+    python batch_runner.py complaints.jsonl -o results.jsonl --concurrency 4 --batch-size 8
+
+Input rows (JSONL), `id` and `reference_image` are optional:
+    {"id": "c-1", "order_id": 909, "description": "...", "images": {"Front View": "a.jpg", "Back View": "b.jpg"}}
+`images` may also be a list or a single path. CSV files use the same column names, or the
+Gradio flag log headers ("Order ID", "Upload Your Product Image", "Product Description").
+
+Results are appended to the output JSONL as each item finishes; re-running with the same
+output file skips every id that already completed successfully.
+"""
+import argparse
+import asyncio
+import csv
+import hashlib
+import json
+import os
+import time
+
+from langgraph_flow import arun_langgraph_pipeline
+from db_ops import init_db, get_reference_image
+from utils.ollama_client import get_client
+
+_CSV_ALIASES = {
+    "order id": "order_id",
+    "upload your product image": "images",
+    "product description": "description",
+}
+
+
+def _normalize_images(images):
+    if not images:
+        return {}
+    if isinstance(images, dict):
+        return images
+    if isinstance(images, str):
+        images = [p for p in images.split(";") if p.strip()]
+    return {f"View {i + 1}": path.strip() for i, path in enumerate(images)}
+
+
+def _item_id(item):
+    if item.get("id"):
+        return str(item["id"])
+    key = json.dumps([str(item["order_id"]), item["images"], item["description"]], sort_keys=True)
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+
+
+def read_items(path):
+    """
+    Load complaints from a .jsonl or .csv file
+    Returns:
+        list of dict: id, order_id, images (view -> path), description, reference_image
+    """
+    rows = []
+    if path.lower().endswith(".csv"):
+        with open(path, newline="", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                rows.append({_CSV_ALIASES.get(k.strip().lower(), k.strip()): v for k, v in row.items() if k})
+    else:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    rows.append(json.loads(line))
+
+    items = []
+    for row in rows:
+        if not row.get("order_id"):
+            continue
+        item = {
+            "order_id": row["order_id"],
+            "images": _normalize_images(row.get("images")),
+            "description": row.get("description", ""),
+            "reference_image": row.get("reference_image"),
+            "id": row.get("id"),
+        }
+        item["id"] = _item_id(item)
+        items.append(item)
+    return items
+
+
+def completed_ids(output_path):
+    """Ids already written with status "ok" (so a crashed run can resume)"""
+    done = set()
+    if not os.path.exists(output_path):
+        return done
+    with open(output_path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # half-written last line after a crash
+            if record.get("status") == "ok":
+                done.add(record["id"])
+    return done
+
+
+async def _process(item):
+    start = time.time()
+    record = {"id": item["id"], "order_id": item["order_id"]}
+    try:
+        reference_image = item["reference_image"] or await asyncio.to_thread(get_reference_image, item["order_id"])
+        if reference_image is None:
+            raise ValueError(f"Order ID not found: {item['order_id']}")
+        # items of the same order share a checkpoint thread: the pipeline runs them one at a time
+        outputs = await arun_langgraph_pipeline(
+            order_id=item["order_id"],
+            user_images_dict=item["images"],
+            reference_image_path=reference_image,
+            user_description=item["description"],
+        )
+        record.update(status="ok", outputs=outputs)
+    except Exception as e:
+        record.update(status="error", error=str(e))
+    record["elapsed"] = round(time.time() - start, 3)
+    return record
+
+
+async def run_batch(input_path, output_path, concurrency=4, batch_size=8):
+    init_db()
+    items = read_items(input_path)
+    done = completed_ids(output_path)
+    pending = [item for item in items if item["id"] not in done]
+    print(f"--- Batch: {len(items)} items, {len(items) - len(pending)} already done, {len(pending)} to run ---")
+
+    semaphore = asyncio.Semaphore(concurrency)
+    stats = {"ok": 0, "error": 0}
+    start = time.time()
+
+    async def bounded(item):
+        async with semaphore:
+            return await _process(item)
+
+    with open(output_path, "a", encoding="utf-8") as out:
+        for i in range(0, len(pending), batch_size):
+            batch = pending[i:i + batch_size]
+            for future in asyncio.as_completed([bounded(item) for item in batch]):
+                record = await future
+                out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                out.flush()
+                os.fsync(out.fileno())
+                stats[record["status"]] += 1
+                print(f"[{stats['ok'] + stats['error']}/{len(pending)}] {record['id']}: {record['status']} ({record['elapsed']}s)")
+
+    await get_client().aclose()
+    elapsed = time.time() - start
+    print(f"--- Batch finished: {stats['ok']} ok, {stats['error']} errors in {elapsed:.1f}s ---")
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run queued complaints through the FaultLens pipeline")
+    parser.add_argument("input", help="complaints .jsonl or .csv")
+    parser.add_argument("-o", "--output", default="batch_results.jsonl", help="results .jsonl (appended)")
+    parser.add_argument("--concurrency", type=int, default=4, help="items in flight at once")
+    parser.add_argument("--batch-size", type=int, default=8, help="items scheduled per micro-batch")
+    args = parser.parse_args()
+    asyncio.run(run_batch(args.input, args.output, args.concurrency, args.batch_size))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""
+Fake YOLO backend for benchmarks: no weights, no ultralytics, a fixed centre box per image
+and a configurable per-batch latency.
+"""
+import time
+
+from utils.model_registry import register
+
+
+class _Boxes:
+    def __init__(self, box):
+        self.xyxy = [_Row(box)] if box else []
+
+
+class _Row(list):
+    def tolist(self):
+        return list(self)
+
+
+class _Result:
+    def __init__(self, box):
+        self.boxes = _Boxes(box)
+
+
+class FakeYOLO:
+    """Mimics the slice of the ultralytics results API that yolov8_crop reads"""
+
+    def __init__(self, batch_latency=0.05, per_image_latency=0.01, margin=0.1):
+        self.batch_latency = batch_latency
+        self.per_image_latency = per_image_latency
+        self.margin = margin
+        self.calls = 0
+
+    def __call__(self, images, conf=0.5, **kwargs):
+        if not isinstance(images, list):
+            images = [images]
+        self.calls += 1
+        time.sleep(self.batch_latency + self.per_image_latency * len(images))
+        results = []
+        for img in images:
+            w, h = img.size
+            box = (w * self.margin, h * self.margin, w * (1 - self.margin), h * (1 - self.margin))
+            results.append(_Result(box))
+        return results
+
+
+def install_fake_yolo(**kwargs):
+    """Register a FakeYOLO as the "yolo" model, replacing the real weights"""
+    import yolov8_crop  # noqa: F401  (registers the real loader first, so ours wins)
+    fake = FakeYOLO(**kwargs)
+    register("yolo", lambda: fake)
+    return fake
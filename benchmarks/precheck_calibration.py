@@ -0,0 +1,86 @@
+"""
+Calibrate the similarity pre-check threshold on labelled (photo, reference) pairs.
+
+    python -m benchmarks.precheck_calibration
+    python -m benchmarks.precheck_calibration --pairs labelled.jsonl --real-yolo
+
+Pairs come from a JSONL file of {"query": path, "reference": path, "match": bool} lines, or by
+default from every img_for_test fixture against both demo references (909_* shows order 909).
+Both sides are cropped the way the pipeline crops them before scoring. The report lists the
+score ranges of genuine and wrong-product pairs, and the lowest FAULTLENS_PRECHECK_MATCH that
+lets no wrong product through with the given margin.
+"""
+import argparse
+import json
+import os
+
+FIXTURE_DIR = "img_for_test"
+
+
+def fixture_pairs(fixture_dir=FIXTURE_DIR):
+    """Every fixture photo against every demo reference, labelled by the order prefix of its name"""
+    from db_ops import DEMO_ORDERS
+    pairs = []
+    for name in sorted(os.listdir(fixture_dir)):
+        if not name.lower().endswith((".jpg", ".jpeg", ".png")):
+            continue
+        order = name.split("_")[0]
+        for order_id, reference in DEMO_ORDERS.items():
+            pairs.append({"query": os.path.join(fixture_dir, name), "reference": reference,
+                          "match": str(order_id) == order})
+    return pairs
+
+
+def read_pairs(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def score_pairs(pairs):
+    """Adds a "score" to every pair, both sides YOLO-cropped"""
+    from db_ops import reference_crop
+    from utils.similarity import compute_features, similarity
+
+    features = {}
+
+    def cropped_features(path):
+        if path not in features:
+            features[path] = compute_features(reference_crop(path))
+        return features[path]
+
+    for pair in pairs:
+        pair["score"] = similarity(cropped_features(pair["query"]), cropped_features(pair["reference"]))
+    return pairs
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Calibrate the similarity pre-check on labelled pairs")
+    parser.add_argument("--pairs", default=None, help="JSONL of {query, reference, match} (default: img_for_test fixtures)")
+    parser.add_argument("--margin", type=float, default=0.1, help="distance kept above the best wrong-product score")
+    parser.add_argument("--real-yolo", dest="fake_yolo", action="store_false", help="use the real YOLO weights")
+    args = parser.parse_args()
+
+    if args.fake_yolo:
+        from benchmarks.fake_yolo import install_fake_yolo
+        install_fake_yolo(batch_latency=0.0, per_image_latency=0.0)
+    from utils.similarity import PRECHECK_MATCH
+
+    pairs = score_pairs(read_pairs(args.pairs) if args.pairs else fixture_pairs())
+    for pair in sorted(pairs, key=lambda p: p["score"], reverse=True):
+        label = "match" if pair["match"] else "wrong"
+        print(f"{pair['score']:.3f}  {label:5}  {pair['query']} vs {pair['reference']}")
+
+    genuine = [p["score"] for p in pairs if p["match"]]
+    wrong = [p["score"] for p in pairs if not p["match"]]
+    if genuine:
+        print(f"--- Genuine pairs: {min(genuine):.3f} .. {max(genuine):.3f} ({len(genuine)}) ---")
+    if wrong:
+        print(f"--- Wrong-product pairs: {min(wrong):.3f} .. {max(wrong):.3f} ({len(wrong)}) ---")
+        threshold = min(1.0, max(wrong) + args.margin)
+        skipped = sum(score >= threshold for score in genuine)
+        print(f"--- Suggested FAULTLENS_PRECHECK_MATCH >= {threshold:.2f} (current {PRECHECK_MATCH:.2f}): "
+              f"{skipped}/{len(genuine)} genuine pairs would skip the VLM ---")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,238 @@
+"""
+Reproducible pipeline benchmark against a stub Ollama server and (optionally) a fake YOLO.
+
+    python -m benchmarks.run_benchmark --concurrency 1 2 4 8 --requests 16 -o bench.json
+    python -m benchmarks.run_benchmark --vision-modes per_view multi_image mosaic --concurrency 1 4
+
+Every request submits one fixture set from img_for_test (909_* for order 909, 999_* for
+order 999). All state (DB, caches, checkpoints, crops) goes to a temp directory, so runs
+do not touch the working tree and are comparable with each other.
+
+`--ollama-host` runs against a real Ollama server instead of the stub; each level then keeps
+the per-view reports of its first request under "samples", so the vision modes can be
+compared for accuracy as well as latency.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXTURES = {
+    909: ["img_for_test/909_1.jpg", "img_for_test/909_2.jpg", "img_for_test/909_3.jpg"],
+    999: ["img_for_test/999_1.jpg", "img_for_test/999_2.jpg", "img_for_test/999_3.jpg"],
+}
+VIEW_NAMES = ["Front View", "Back View", "Close-up of Defect"]
+
+
+def _isolate_state(workdir, use_cache):
+    """Point every on-disk artifact at `workdir` (must run before the project modules are imported)"""
+    os.environ["FAULTLENS_DB_PATH"] = os.path.join(workdir, "database.db")
+    os.environ["FAULTLENS_CHECKPOINT_PATH"] = os.path.join(workdir, "checkpoints.db")
+    os.environ["FAULTLENS_CACHE_PATH"] = os.path.join(workdir, "analysis_cache.db")
+    os.environ["FAULTLENS_CACHE_ENABLED"] = "1" if use_cache else "0"
+    os.environ["FAULTLENS_NORMALIZED_DIR"] = os.path.join(workdir, "normalized")
+
+
+def peak_rss_mb():
+    try:
+        import resource
+    except ImportError:  # Windows
+        try:
+            import psutil
+            return psutil.Process().memory_info().peak_wset / 2 ** 20
+        except Exception:
+            return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / 2 ** 20 if sys.platform == "darwin" else peak / 2 ** 10
+
+
+def _percentiles(values):
+    ordered = sorted(values)
+
+    def pick(q):
+        return ordered[min(len(ordered) - 1, round(q / 100 * (len(ordered) - 1)))]
+
+    return {
+        "mean": round(statistics.mean(ordered), 4),
+        "p50": round(pick(50), 4),
+        "p95": round(pick(95), 4),
+        "p99": round(pick(99), 4),
+        "max": round(ordered[-1], 4),
+    }
+
+
+async def _run_level(langgraph_flow, db_ops, concurrency, n_requests, use_stream, vision_mode):
+    from utils import metrics
+
+    metrics.reset()
+    semaphore = asyncio.Semaphore(concurrency)
+    orders = list(FIXTURES)
+    latencies, first_tokens, errors = [], [], []
+    samples = {}
+
+    async def one(i):
+        order_id = orders[i % len(orders)]
+        images = dict(zip(VIEW_NAMES, [os.path.join(REPO_ROOT, p) for p in FIXTURES[order_id]]))
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                # a distinct order id (= checkpoint thread) per request, so runs never share
+                # checkpoint state, wait on each other's order lock or get coalesced
+                run_order_id = (order_id * 1_000 + concurrency) * 1_000_000 + i
+                if use_stream:
+                    first = None
+                    async for event in langgraph_flow.astream_langgraph_pipeline(
+                        run_order_id, images, db_ops.get_reference_image(order_id), "The item arrived scratched."
+                    ):
+                        if first is None and "token" in event:
+                            first = time.perf_counter() - start
+                        if "result" in event:
+                            result = event["result"]
+                    if first is not None:
+                        first_tokens.append(first)
+                else:
+                    result = await langgraph_flow.arun_langgraph_pipeline(
+                        run_order_id, images, db_ops.get_reference_image(order_id), "The item arrived scratched."
+                    )
+                latencies.append(time.perf_counter() - start)
+                samples.setdefault(order_id, result["Vision"]["view_reports"])
+            except Exception as e:
+                errors.append(str(e))
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(n_requests)))
+    elapsed = time.perf_counter() - start
+
+    snapshot = metrics.snapshot()
+    stages = {
+        name[len("span."):]: summary
+        for name, summary in snapshot["histograms"].items()
+        if name.startswith("span.")
+    }
+    llm = {name: summary for name, summary in snapshot["histograms"].items() if name.startswith("llm.")}
+    queue = {name: summary for name, summary in snapshot["histograms"].items() if name.startswith("queue_wait.")}
+    return {
+        "vision_mode": vision_mode,
+        "concurrency": concurrency,
+        "requests": n_requests,
+        "errors": len(errors),
+        "error_samples": errors[:3],
+        "elapsed_seconds": round(elapsed, 4),
+        "throughput_rps": round(len(latencies) / elapsed, 4) if elapsed else 0.0,
+        "latency_seconds": _percentiles(latencies) if latencies else None,
+        "time_to_first_token_seconds": _percentiles(first_tokens) if first_tokens else None,
+        "peak_rss_mb": round(peak_rss_mb() or 0.0, 1),
+        "stages": stages,
+        "llm_calls": llm,
+        "queue_wait": queue,
+        "counters": snapshot["counters"],
+        "samples": {str(k): v for k, v in samples.items()},
+    }
+
+
+async def run_benchmark(args):
+    workdir = tempfile.mkdtemp(prefix="faultlens_bench_")
+    _isolate_state(workdir, args.cache)
+    sys.path.insert(0, REPO_ROOT)
+    os.chdir(REPO_ROOT)
+
+    stub = None
+    from utils.ollama_client import OllamaClient, set_client
+    if args.ollama_host:
+        set_client(OllamaClient(host=args.ollama_host))
+    else:
+        from benchmarks.stub_ollama import StubOllamaServer
+        stub = StubOllamaServer(
+            first_token=args.first_token, tokens_per_second=args.tokens_per_second,
+            reply_tokens=args.reply_tokens, image_cost=args.image_cost,
+        ).start()
+        set_client(OllamaClient(host=stub.url))
+
+    if args.fake_yolo:
+        from benchmarks.fake_yolo import install_fake_yolo
+        install_fake_yolo(batch_latency=args.yolo_latency)
+
+    import db_ops
+    import langgraph_flow
+    import vision_agent
+
+    db_ops.init_db()
+    db_ops.seed_demo_orders()
+
+    levels = []
+    for vision_mode in args.vision_modes:
+        vision_agent.VISION_MODE = vision_mode
+        for concurrency in args.concurrency:
+            result = await _run_level(langgraph_flow, db_ops, concurrency, args.requests, args.stream, vision_mode)
+            levels.append(result)
+            _print_level(result)
+
+    if stub is not None:
+        stub.stop()
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "platform": {"python": platform.python_version(), "system": platform.platform()},
+        "config": {
+            "requests_per_level": args.requests,
+            "ollama": args.ollama_host or "stub",
+            "first_token": args.first_token,
+            "tokens_per_second": args.tokens_per_second,
+            "reply_tokens": args.reply_tokens,
+            "image_cost": args.image_cost,
+            "fake_yolo": args.fake_yolo,
+            "yolo_latency": args.yolo_latency if args.fake_yolo else None,
+            "cache": args.cache,
+            "stream": args.stream,
+            "env": {k: v for k, v in os.environ.items() if k.startswith("FAULTLENS_") and "PATH" not in k and "DIR" not in k},
+        },
+        "stub_max_in_flight": stub.max_in_flight if stub else None,
+        "levels": levels,
+    }
+
+
+def _print_level(result):
+    latency = result["latency_seconds"] or {}
+    llm_calls = sum(count for name, count in result["counters"].items() if name.startswith("llm.") and name.endswith(".calls"))
+    print(
+        f"mode={result['vision_mode']:<11} concurrency={result['concurrency']:>3}  "
+        f"throughput={result['throughput_rps']:.2f} req/s  "
+        f"p50={latency.get('p50', 0):.3f}s  p95={latency.get('p95', 0):.3f}s  "
+        f"p99={latency.get('p99', 0):.3f}s  llm_calls={llm_calls}  rss={result['peak_rss_mb']}MB  "
+        f"errors={result['errors']}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the FaultLens pipeline against a stub Ollama server")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--requests", type=int, default=16, help="requests per concurrency level")
+    parser.add_argument("--first-token", type=float, default=0.2, help="stub seconds to first token")
+    parser.add_argument("--tokens-per-second", type=float, default=50.0)
+    parser.add_argument("--reply-tokens", type=int, default=40)
+    parser.add_argument("--image-cost", type=float, default=0.05, help="stub extra prefill seconds per image")
+    parser.add_argument("--real-yolo", dest="fake_yolo", action="store_false", help="use the real YOLO weights")
+    parser.add_argument("--vision-modes", nargs="+", default=["per_view"], choices=["per_view", "multi_image", "mosaic"],
+                        help="vision modes to compare (see vision_agent.VISION_MODE)")
+    parser.add_argument("--ollama-host", default=None, help="benchmark a real Ollama server instead of the stub")
+    parser.add_argument("--yolo-latency", type=float, default=0.05, help="fake YOLO seconds per batch")
+    parser.add_argument("--cache", action="store_true", help="keep the analysis cache enabled")
+    parser.add_argument("--no-stream", dest="stream", action="store_false", help="use ainvoke instead of astream")
+    parser.add_argument("-o", "--output", default="bench_results.json")
+    args = parser.parse_args()
+    args.output = os.path.abspath(args.output)
+
+    results = asyncio.run(run_benchmark(args))
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
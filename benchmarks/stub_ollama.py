@@ -0,0 +1,268 @@
+"""
+Stand-in Ollama HTTP server for benchmarks and local experiments.
+
+Implements the parts of the API FaultLens uses (/api/generate, /api/chat, /api/tags)
+with a configurable time-to-first-token and token rate, so pipeline timings can be
+measured without a GPU or real model.
+
+    python -m benchmarks.stub_ollama --port 11434 --first-token 0.2 --tokens-per-second 40
+"""
+import argparse
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+_WORDS = (
+    "VERDICT: MATCH. Reasoning: the logo, shape and port placement align with the reference. "
+    "The product shows a minor scratch near the lower edge, severity low, consistent with shipping damage."
+).split()
+
+
+class StubOllamaServer:
+    """
+    Args:
+        first_token: float, seconds before the first token (models prefill / image encoding)
+        tokens_per_second: float, generation speed after the first token
+        reply_tokens: int, tokens per reply
+        image_cost: float, extra seconds of prefill per attached image
+        models: list of str reported by /api/tags (None = accept anything)
+        verdict: str, verdict of structured comparison answers ("MATCH", "WRONG_PRODUCT", "UNSURE")
+        severity: str, severity of structured vision answers ("none", "low", "medium", "high")
+
+    Failures can be injected for client tests: `fail_next(503, "drop", "error")` answers the next
+    three POSTs with a 503, a dropped connection and an error reported by the model inside a
+    200 response; `break_after = n` cuts streams after n tokens.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, first_token=0.2, tokens_per_second=50.0,
+                 reply_tokens=40, image_cost=0.0, models=None, verdict="MATCH", severity="low"):
+        self.first_token = first_token
+        self.tokens_per_second = tokens_per_second
+        self.reply_tokens = reply_tokens
+        self.image_cost = image_cost
+        self.models = models
+        self.verdict = verdict
+        self.severity = severity
+        self.requests = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.healthy = True
+        self.received = 0             # every POST, failed ones included
+        self.break_after = None
+        self._failures = []
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name="stub-ollama", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    # --- behaviour ---
+
+    def fail_next(self, *failures):
+        """Queue failures for the next POSTs: an HTTP status code, "drop" or "error" (see class docstring)"""
+        with self._lock:
+            self._failures.extend(failures)
+
+    def _take_failure(self):
+        with self._lock:
+            self.received += 1
+            return self._failures.pop(0) if self._failures else None
+
+    def reply_text(self, body):
+        """Text returned for a request; override for custom scenarios"""
+        fmt = body.get("format")
+        if fmt is not None:
+            properties = fmt.get("properties", {}) if isinstance(fmt, dict) else {}
+            prompt = body.get("prompt", "")
+            report = {
+                "defects": [] if self.severity == "none" else
+                [{"type": "scratch", "location": "lower edge", "severity": self.severity}],
+                "severity": self.severity,
+                "summary": "Minor scratch, consistent with shipping damage."
+                if self.severity != "none" else "No visible defect.",
+            }
+            if "views" in properties or '"views"' in prompt:
+                # multi-view vision request: one entry per numbered view in the prompt
+                names = re.findall(r"^\d+\. (.+)$", prompt, flags=re.MULTILINE)
+                return json.dumps({"views": [dict(report, view=name) for name in names]})
+            if "verdict" in properties or '"verdict"' in prompt:
+                return json.dumps({"verdict": self.verdict, "confidence": 0.9,
+                                   "reasoning": "Logo, shape and ports align.", "defects": report["defects"]})
+            return json.dumps(report)
+        return " ".join(_WORDS[i % len(_WORDS)] for i in range(self.reply_tokens))
+
+    def _tokens(self, body):
+        text = self.reply_text(body)
+        if body.get("format") is not None:
+            return [text]
+        words = text.split(" ")
+        return [w if i == 0 else " " + w for i, w in enumerate(words)]
+
+    def _handler_class(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send_json(self, status, payload):
+                data = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                if self.path.startswith("/api/tags"):
+                    if not stub.healthy:
+                        self._send_json(503, {"error": "unhealthy"})
+                        return
+                    self._send_json(200, {"models": [{"name": m} for m in (stub.models or [])]})
+                else:
+                    self._send_json(404, {"error": "not found"})
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                body = json.loads(self.rfile.read(length) or b"{}")
+                failure = stub._take_failure()
+                if failure == "drop":
+                    self.close_connection = True
+                    return
+                if failure == "error":
+                    if body.get("stream", True) is False:
+                        self._send_json(200, {"error": "injected model error"})
+                    else:
+                        self.send_response(200)
+                        self.send_header("Content-Type", "application/x-ndjson")
+                        self.send_header("Transfer-Encoding", "chunked")
+                        self.end_headers()
+                        self._write_chunk(json.dumps({"error": "injected model error"}) + "\n")
+                        self.wfile.write(b"0\r\n\r\n")
+                    return
+                if failure is not None:
+                    self._send_json(failure, {"error": f"injected failure {failure}"})
+                    return
+                if not stub.healthy:
+                    self._send_json(503, {"error": "unhealthy"})
+                    return
+                if stub.models is not None and body.get("model") not in stub.models:
+                    self._send_json(404, {"error": f"model '{body.get('model')}' not found"})
+                    return
+                with stub._lock:
+                    stub.requests += 1
+                    stub.in_flight += 1
+                    stub.max_in_flight = max(stub.max_in_flight, stub.in_flight)
+                try:
+                    self._generate(body)
+                finally:
+                    with stub._lock:
+                        stub.in_flight -= 1
+
+            def _generate(self, body):
+                chat = self.path.startswith("/api/chat")
+                if not chat and not self.path.startswith("/api/generate"):
+                    self._send_json(404, {"error": "not found"})
+                    return
+                if not chat and "prompt" not in body:
+                    # keep-alive / load request
+                    self._send_json(200, {"model": body.get("model"), "response": "", "done": True})
+                    return
+
+                images = body.get("images") or []
+                if chat:
+                    messages = body.get("messages", [])
+                    prompt = " ".join(m.get("content", "") for m in messages)
+                    images = [img for m in messages for img in m.get("images", []) or []]
+                else:
+                    prompt = body.get("prompt", "")
+                tokens = stub._tokens(body)
+                delay = 1.0 / stub.tokens_per_second if stub.tokens_per_second else 0.0
+                stats = {
+                    "prompt_eval_count": max(1, len(prompt) // 4),
+                    "eval_count": len(tokens),
+                    "context": [1, 2, 3],
+                }
+                time.sleep(stub.first_token + stub.image_cost * len(images))
+
+                def piece(text, done):
+                    if chat:
+                        chunk = {"model": body.get("model"), "message": {"role": "assistant", "content": text}, "done": done}
+                    else:
+                        chunk = {"model": body.get("model"), "response": text, "done": done}
+                    if done:
+                        chunk.update(stats)
+                    return chunk
+
+                if body.get("stream", True) is False:
+                    time.sleep(delay * max(0, len(tokens) - 1))
+                    self._send_json(200, piece("".join(tokens), True))
+                    return
+
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                for i, token in enumerate(tokens):
+                    if stub.break_after is not None and i >= stub.break_after:
+                        # server died mid-reply: no final chunk, no end of the chunked body
+                        self.close_connection = True
+                        return
+                    if i:
+                        time.sleep(delay)
+                    self._write_chunk(json.dumps(piece(token, False)) + "\n")
+                self._write_chunk(json.dumps(piece("", True)) + "\n")
+                self.wfile.write(b"0\r\n\r\n")
+
+            def _write_chunk(self, text):
+                data = text.encode("utf-8")
+                self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+                self.wfile.flush()
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a stand-in Ollama server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11434)
+    parser.add_argument("--first-token", type=float, default=0.2, help="seconds before the first token")
+    parser.add_argument("--tokens-per-second", type=float, default=50.0)
+    parser.add_argument("--reply-tokens", type=int, default=40)
+    parser.add_argument("--image-cost", type=float, default=0.0, help="extra prefill seconds per image")
+    args = parser.parse_args()
+    server = StubOllamaServer(args.host, args.port, args.first_token, args.tokens_per_second,
+                              args.reply_tokens, args.image_cost).start()
+    print(f"Stub Ollama listening on {server.url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
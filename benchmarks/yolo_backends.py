@@ -0,0 +1,102 @@
+"""
+Latency / memory of each YOLO backend on the img_for_test images.
+
+    python -m benchmarks.yolo_backends --backends torch onnx:fp32 onnx:int8 openvino:fp16 --threads 4
+
+Every backend runs in its own subprocess, so load time and peak RSS are not skewed by
+libraries another backend already imported. Results are printed and written as JSON.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _measure(spec, image_dir, imgsz, threads, repeats, conf):
+    """Runs inside the subprocess: load, warm up, then time `repeats` batched calls"""
+    sys.path.insert(0, REPO_ROOT)
+    os.chdir(REPO_ROOT)
+    from benchmarks.run_benchmark import peak_rss_mb
+    from benchmarks.yolo_parity import parse_spec, test_images
+    from utils.image_prep import load_oriented
+
+    baseline_rss = peak_rss_mb()
+    start = time.perf_counter()
+    from yolov8_crop import default_model_path, load_yolo_backend
+    backend, precision = parse_spec(spec)
+    model = load_yolo_backend(backend, default_model_path(backend, precision), imgsz=imgsz, threads=threads)
+    load_seconds = time.perf_counter() - start
+
+    images = [load_oriented(path) for path in test_images(image_dir)]
+    model(images[:1], conf=conf)  # warm-up
+    batch_times, single_times = [], []
+    for _ in range(repeats):
+        t = time.perf_counter()
+        model(images, conf=conf)
+        batch_times.append(time.perf_counter() - t)
+        t = time.perf_counter()
+        model(images[:1], conf=conf)
+        single_times.append(time.perf_counter() - t)
+
+    return {
+        "backend": spec,
+        "images_per_batch": len(images),
+        "load_seconds": round(load_seconds, 3),
+        "batch_p50_seconds": round(statistics.median(batch_times), 4),
+        "batch_max_seconds": round(max(batch_times), 4),
+        "single_p50_seconds": round(statistics.median(single_times), 4),
+        "peak_rss_mb": round(peak_rss_mb() or 0.0, 1),
+        "rss_over_baseline_mb": round((peak_rss_mb() or 0.0) - (baseline_rss or 0.0), 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark YOLO backends (latency, RSS)")
+    parser.add_argument("--backends", nargs="+", default=["torch", "onnx:fp32"], help="backend[:precision]")
+    parser.add_argument("--images", default=os.path.join(REPO_ROOT, "img_for_test"))
+    parser.add_argument("--imgsz", type=int, default=640)
+    parser.add_argument("--threads", type=int, default=0, help="inference threads (0 = runtime default)")
+    parser.add_argument("--repeats", type=int, default=10)
+    parser.add_argument("--conf", type=float, default=0.5)
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    parser.add_argument("-o", "--output", default="bench_yolo.json")
+    args = parser.parse_args()
+
+    if args.worker:
+        result = _measure(args.worker, args.images, args.imgsz, args.threads, args.repeats, args.conf)
+        print(json.dumps(result))
+        return
+
+    results = []
+    for spec in args.backends:
+        cmd = [
+            sys.executable, "-m", "benchmarks.yolo_backends", "--worker", spec, "--images", args.images,
+            "--imgsz", str(args.imgsz), "--threads", str(args.threads), "--repeats", str(args.repeats),
+            "--conf", str(args.conf),
+        ]
+        proc = subprocess.run(cmd, cwd=REPO_ROOT, capture_output=True, text=True)
+        if proc.returncode != 0:
+            print(f"{spec:<14} FAILED: {proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else proc.returncode}")
+            results.append({"backend": spec, "error": proc.stderr.strip()[-2000:]})
+            continue
+        result = json.loads(proc.stdout.strip().splitlines()[-1])
+        results.append(result)
+        print(
+            f"{spec:<14} load={result['load_seconds']:.2f}s  batch({result['images_per_batch']})="
+            f"{result['batch_p50_seconds']:.3f}s  single={result['single_p50_seconds']:.3f}s  "
+            f"rss={result['peak_rss_mb']}MB"
+        )
+
+    output = os.path.abspath(args.output)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump({"imgsz": args.imgsz, "threads": args.threads, "results": results}, f, indent=2)
+    print(f"Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
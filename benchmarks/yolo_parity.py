@@ -0,0 +1,89 @@
+"""
+Check that an exported YOLO backend finds the same product boxes as the PyTorch weights.
+
+    python -m benchmarks.yolo_parity --backends onnx:fp32 onnx:int8 openvino:fp16 --min-iou 0.9
+
+For every image in img_for_test the best box of each backend is compared with the PyTorch
+one (IoU and confidence difference). Exits with status 1 if any backend is out of tolerance.
+"""
+import argparse
+import os
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def parse_spec(spec):
+    """"onnx:int8" -> ("onnx", "int8")"""
+    backend, _, precision = spec.partition(":")
+    return backend, precision or "fp32"
+
+
+def test_images(image_dir):
+    return [
+        os.path.join(image_dir, name) for name in sorted(os.listdir(image_dir))
+        if name.lower().endswith((".jpg", ".jpeg", ".png"))
+    ]
+
+
+def iou(a, b):
+    x1, y1 = max(a[0], b[0]), max(a[1], b[1])
+    x2, y2 = min(a[2], b[2]), min(a[3], b[3])
+    inter = max(0.0, x2 - x1) * max(0.0, y2 - y1)
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+def best_boxes(model, images, conf):
+    """(box, confidence) of the top detection per image, None where nothing was found"""
+    boxes = []
+    for result in model(images, conf=conf):
+        if len(result.boxes.xyxy) == 0:
+            boxes.append(None)
+        else:
+            boxes.append((list(map(float, result.boxes.xyxy[0].tolist())), float(result.boxes.conf[0])))
+    return boxes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare exported YOLO backends with the PyTorch weights")
+    parser.add_argument("--backends", nargs="+", default=["onnx:fp32"], help="backend[:precision] to check")
+    parser.add_argument("--images", default=os.path.join(REPO_ROOT, "img_for_test"))
+    parser.add_argument("--imgsz", type=int, default=640)
+    parser.add_argument("--conf", type=float, default=0.5)
+    parser.add_argument("--min-iou", type=float, default=0.9, help="required IoU with the PyTorch box")
+    parser.add_argument("--max-conf-diff", type=float, default=0.1, help="allowed confidence difference")
+    args = parser.parse_args()
+
+    sys.path.insert(0, REPO_ROOT)
+    os.chdir(REPO_ROOT)
+    from yolov8_crop import default_model_path, load_yolo_backend
+    from utils.image_prep import load_oriented
+
+    paths = test_images(args.images)
+    images = [load_oriented(path) for path in paths]
+    reference = best_boxes(load_yolo_backend("torch", imgsz=args.imgsz), images, args.conf)
+
+    failed = False
+    for spec in args.backends:
+        backend, precision = parse_spec(spec)
+        model = load_yolo_backend(backend, default_model_path(backend, precision), imgsz=args.imgsz)
+        print(f"--- {spec} ---")
+        for path, ref, got in zip(paths, reference, best_boxes(model, images, args.conf)):
+            name = os.path.basename(path)
+            if ref is None or got is None:
+                ok = ref is None and got is None
+                print(f"  {name}: torch={'none' if ref is None else 'box'} {spec}={'none' if got is None else 'box'}"
+                      f"  {'OK' if ok else 'MISMATCH'}")
+            else:
+                overlap, conf_diff = iou(ref[0], got[0]), abs(ref[1] - got[1])
+                ok = overlap >= args.min_iou and conf_diff <= args.max_conf_diff
+                print(f"  {name}: iou={overlap:.3f} conf_diff={conf_diff:.3f}  {'OK' if ok else 'MISMATCH'}")
+            failed |= not ok
+
+    print("Parity FAILED" if failed else "Parity OK")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
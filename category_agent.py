@@ -1,8 +1,127 @@
 import json
+import os
 import re
-import ollama  
+import threading
+import time
+from concurrent.futures import Future
+from difflib import get_close_matches
+from utils.concurrency import limiter
+from utils.ollama_client import get_client
+from utils.model_registry import register
+from db_ops import get_db
+from utils import metrics
+
+DEFAULT_VIEWS = ["Front View", "Back View", "Close-up of Defect"]
+SEED_TABLE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "category_views.json")
+FUZZY_CUTOFF = float(os.environ.get("FAULTLENS_CATEGORY_FUZZY_CUTOFF", "0.85"))
+CATEGORY_MODEL = os.environ.get("FAULTLENS_CATEGORY_MODEL", "phi3")
+
+register(CATEGORY_MODEL, get_client, lambda client: client.ping(CATEGORY_MODEL))
+
+_views = None             # normalized category -> list of views
+_views_lock = threading.Lock()
+_inflight = {}            # normalized category -> Future, so concurrent misses share one LLM call
+_inflight_lock = threading.Lock()
+
+
+def normalize_category(name):
+    """Lowercase, drop punctuation/extra spaces and singularize each word ("Running Shoes" -> "running shoe")"""
+    words = re.sub(r"[^\w\s-]", " ", name.lower()).split()
+    singular = []
+    for word in words:
+        if len(word) > 4 and word.endswith("ies"):
+            word = word[:-3] + "y"
+        elif len(word) > 4 and word.endswith(("sses", "shes", "ches", "xes")):
+            word = word[:-2]
+        elif len(word) > 3 and word.endswith("s") and not word.endswith(("ss", "us", "is")):
+            word = word[:-1]
+        singular.append(word)
+    return " ".join(singular)
+
+
+def _load_views():
+    """Seed table + every answer stored so far, loaded once into memory"""
+    global _views
+    if _views is not None:
+        return _views
+    with _views_lock:
+        if _views is not None:
+            return _views
+        views = {}
+        if os.path.exists(SEED_TABLE_PATH):
+            with open(SEED_TABLE_PATH, "r", encoding="utf-8") as f:
+                views.update({normalize_category(k): v for k, v in json.load(f).items()})
+        with get_db().connection() as conn:
+            conn.execute("""
+            CREATE TABLE IF NOT EXISTS category_views (
+                category TEXT PRIMARY KEY,
+                views TEXT,
+                updated_at REAL
+            )
+            """)
+            for category, views_json in conn.execute("SELECT category, views FROM category_views").fetchall():
+                views[category] = json.loads(views_json)
+        _views = views
+        return _views
+
+
+def _store_views(key, views):
+    _load_views()[key] = views
+    with get_db().connection() as conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO category_views (category, views, updated_at) VALUES (?, ?, ?)",
+            (key, json.dumps(views), time.time()),
+        )
+
+
+def lookup_cached_views(product_category):
+    """Views for a known (or fuzzily matching) category, or None on a true miss"""
+    key = normalize_category(product_category)
+    views = _load_views()
+    if key in views:
+        return views[key]
+    match = get_close_matches(key, list(views), n=1, cutoff=FUZZY_CUTOFF)
+    if match:
+        return views[match[0]]
+    return None
+
 
 def determine_required_views(product_category: str):
+    cached = lookup_cached_views(product_category)
+    if cached is not None:
+        metrics.increment("cache.category.hits")
+        return cached
+    metrics.increment("cache.category.misses")
+
+    key = normalize_category(product_category)
+    with _inflight_lock:
+        future = _inflight.get(key)
+        owner = future is None
+        if owner:
+            future = Future()
+            _inflight[key] = future
+
+    if not owner:
+        return future.result()
+
+    try:
+        views = _ask_llm_for_views(product_category)
+        if views:
+            _store_views(key, views)
+        else:
+            views = DEFAULT_VIEWS
+        future.set_result(views)
+        return views
+    except Exception as e:
+        future.set_exception(e)
+        raise
+    finally:
+        with _inflight_lock:
+            _inflight.pop(key, None)
+
+
+def _ask_llm_for_views(product_category):
+    """Ask the category model (phi3) for the views; None when the call fails or the answer is not a JSON list"""
     
     prompt = f"""
     You are an expert quality assurance inspector. 
@@ -19,28 +138,23 @@ def determine_required_views(product_category: str):
     
     try:
         # call Ollama 
-        response = ollama.chat(
-            model='phi3', 
-            messages=[{'role': 'user', 'content': prompt}],
-            options={'temperature': 0.0} 
-        )
-        
-        content = response['message']['content']
+        with limiter("llm").hold():
+            content = get_client().generate(CATEGORY_MODEL, prompt, options={'temperature': 0.0})
         
        
         match = re.search(r'\[.*\]', content, re.DOTALL)
         if match:
             json_str = match.group(0)
             views = json.loads(json_str)
-            return views
-        else:
-            print(f"Warning: Could not parse JSON from Ollama response: {content}")
-            return ["Front View", "Back View", "Close-up of Defect"]
+            if views and all(isinstance(v, str) for v in views):
+                return views
+        print(f"Warning: Could not parse JSON from Ollama response: {content}")
+        return None
 
     except Exception as e:
         print(f"Error calling Ollama: {e}")
         # Erorr handling 
-        return ["Front View", "Back View", "Close-up of Defect"]
+        return None
 
 
 # --- n-test ---
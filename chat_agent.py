@@ -0,0 +1,131 @@
+import os
+
+from utils.rag_wrapper import arun_qwen2vl, astream_qwen2vl
+
+# Token budget of the per-order conversation kept on the model server
+CHAT_CONTEXT_TOKENS = int(os.environ.get("FAULTLENS_CHAT_CONTEXT_TOKENS", "3072"))
+# Most recent exchanges (user + assistant) kept verbatim when the context is rebuilt
+CHAT_KEEP_TURNS = int(os.environ.get("FAULTLENS_CHAT_KEEP_TURNS", "3"))
+# Room left for the reply when deciding whether a turn still fits
+CHAT_REPLY_TOKENS = 512
+_TURN_MAX_CHARS = 1200
+
+
+def estimate_tokens(text):
+    """Rough token count (about 4 characters per token)"""
+    return len(text or "") // 4 + 1
+
+
+def _clip(text, max_chars):
+    text = (text or "").strip()
+    return text if len(text) <= max_chars else text[:max_chars].rstrip() + " ..."
+
+
+def _format_turns(turns):
+    return "\n".join(
+        f"{'Customer' if turn['role'] == 'user' else 'FaultLens AI'}: {_clip(turn['content'], _TURN_MAX_CHARS)}"
+        for turn in turns
+    )
+
+
+def build_chat_turn(user_message):
+    """Prompt for one follow-up appended to a conversation the server already holds"""
+    return f"""
+### FOLLOW-UP FROM THE CUSTOMER:
+"{user_message}"
+
+Answer as "FaultLens AI", consistent with everything said so far. RESPOND ONLY in English.
+Do NOT output internal thinking. Just the response.
+"""
+
+
+def build_chat_prompt(user_message, defect_text, comparison_text, policies_text, summary, recent_turns):
+    """Self-contained prompt used when there is no reusable context (first chat turn or budget exceeded)"""
+    return f"""
+### SYSTEM ROLE:
+You are "FaultLens AI", a helpful and empathetic customer service agent, continuing a conversation
+about a product complaint that was already inspected.
+
+### INSPECTION FINDINGS:
+- Visual Match Verdict: "{_clip(comparison_text, 800)}"
+- Defect Analysis: "{_clip(defect_text, 1500)}"
+
+### RELEVANT COMPANY POLICIES:
+{policies_text}
+
+### CONVERSATION SUMMARY (older turns):
+{summary or "(none)"}
+
+### RECENT CONVERSATION:
+{_format_turns(recent_turns) or "(none)"}
+
+### NEW MESSAGE FROM THE CUSTOMER:
+"{user_message}"
+
+### GENERATE RESPONSE:
+- RESPOND ONLY in English.
+- Stay consistent with the findings and with anything already promised to the customer.
+- Do NOT output internal thinking. Just the response.
+"""
+
+
+def build_summary_prompt(previous_summary, turns):
+    return f"""
+Summarize this customer service conversation in at most 120 words.
+Keep the order facts, the customer's requests, and every decision or promise made by the agent.
+
+### EARLIER SUMMARY:
+{previous_summary or "(none)"}
+
+### TURNS TO ADD:
+{_format_turns(turns)}
+
+### SUMMARY:
+"""
+
+
+async def summarize_turns(previous_summary, turns):
+    """
+    Fold `turns` into the running summary. Falls back to clipped transcript lines
+    if the model call fails, so the conversation can always continue.
+    """
+    if not turns:
+        return previous_summary or ""
+    try:
+        summary = await arun_qwen2vl(
+            build_summary_prompt(previous_summary, turns), options={"num_predict": 200}
+        )
+        if summary:
+            return summary
+    except Exception as e:
+        print(f" Chat summary failed, truncating instead: {e}")
+    fallback = "\n".join(filter(None, [previous_summary, _format_turns(turns)]))
+    return fallback[-_TURN_MAX_CHARS * 2:]
+
+
+def fits_context(context, user_message, budget=None):
+    """Whether the next turn can be appended to `context` without exceeding the budget"""
+    budget = CHAT_CONTEXT_TOKENS if budget is None else budget
+    if not context:
+        return False
+    return len(context) + estimate_tokens(build_chat_turn(user_message)) + CHAT_REPLY_TOKENS <= budget
+
+
+def split_history(history, keep_turns=None):
+    """(older turns to summarize, recent turns kept verbatim)"""
+    keep = 2 * (CHAT_KEEP_TURNS if keep_turns is None else keep_turns)
+    if len(history) <= keep:
+        return [], list(history)
+    return list(history[:-keep]), list(history[-keep:])
+
+
+async def astream_chat_agent(prompt, context=None, done_info=None):
+    """
+    Stream the reply to a chat prompt
+    Args:
+        prompt: str, from build_chat_turn (with `context`) or build_chat_prompt (without)
+        context: list of int, optional, server-side conversation to continue
+        done_info: dict, optional, receives the final chunk incl. the new `context`
+    """
+    async for chunk in astream_qwen2vl(prompt, context=context, done_info=done_info):
+        yield chunk
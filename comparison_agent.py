@@ -1,29 +1,69 @@
-from utils.llm_wrapper import run_qwen2vl
+import json
+import re
+from utils.llm_wrapper import arun_qwen2vl, MODEL
+from utils.analysis_cache import get_cache
+from utils.structured import (
+    COMPARISON_SCHEMA, StructuredOutputError,
+    agenerate_validated, response_format, validate_comparison,
+)
 
-def run_comparison_agent(defect_text, reference_image, user_description, cropped_user_image):
-    prompt = f"""
+def build_comparison_prompt(defect_text, user_description):
+    """defect_text None leaves out the vision analysis, for a comparison on the images alone"""
+    inputs = [f"USER COMPLAINT: {user_description}"]
+    if defect_text is not None:
+        inputs.append(f"VISUAL ANALYSIS OF USER ITEM: {defect_text}")
+    inputs.append("IMAGES: Provided below (first the user's item, then the reference image).")
+    inputs = "\n    ".join(f"{i + 1}. {line}" for i, line in enumerate(inputs))
+    return f"""
     You are a specialized Visual QA Agent for e-commerce returns.
-    
+
     ### TASK:
     Determine if the "User's Item" is the SAME MODEL as the "Reference Image".
-    
+
     ### INPUTS:
-    1. USER COMPLAINT: {user_description}
-    2. VISUAL ANALYSIS OF USER ITEM: {defect_text}
-    3. IMAGES: Provided below.
+    {inputs}
 
     ### INSTRUCTIONS:
     - Ignore lighting, background, or minor wear.
     - Focus on: Brand Logo, Shape, Buttons/Ports placement, and distinctive design features.
-    
+
     ### OUTPUT DECISION RULES:
-    1. If features match -> Output: "VERDICT: MATCH"
-    2. If it is a different product/brand/model -> Output: "VERDICT: WRONG PRODUCT"
-    
+    1. If features match -> "verdict": "MATCH"
+    2. If it is a different product/brand/model -> "verdict": "WRONG_PRODUCT"
+    3. If the images do not allow a decision -> "verdict": "UNSURE"
+
     ### FINAL RESPONSE FORMAT:
-    Start immediately with the verdict. Example: "VERDICT: MATCH. Reasoning: The logo and shape align perfectly."
+    Answer ONLY with JSON of this form:
+    {{"verdict": "MATCH", "confidence": 0.0-1.0, "reasoning": "The logo and shape align perfectly.",
+      "defects": [{{"type": "...", "location": "...", "severity": "none|low|medium|high"}}]}}
+    """
+
+
+def _fallback_comparison(text):
+    """Best effort when the model never produced valid JSON: read a plain-text verdict, if any"""
+    match = re.search(r"VERDICT:\s*(MATCH|WRONG[ _]PRODUCT)", text or "", re.IGNORECASE)
+    verdict = match.group(1).upper().replace(" ", "_") if match else "UNSURE"
+    return {"verdict": verdict, "confidence": 0.0, "reasoning": (text or "").strip(), "defects": []}
+
+
+async def arun_comparison_agent(defect_text, reference_image, user_description, cropped_user_image, priority=False):
+    """
+    priority: bool, jump the queue of waiting VLM calls (the comparison is on the critical path)
+    Returns:
+        dict: verdict (MATCH / WRONG_PRODUCT / UNSURE), confidence, reasoning, defects
     """
+    prompt = build_comparison_prompt(defect_text, user_description)
+    images = [cropped_user_image, reference_image]
+    fmt = response_format(COMPARISON_SCHEMA)
 
-    response = run_qwen2vl(prompt, [cropped_user_image, reference_image])
-    return response
+    async def compute():
+        comparison = await agenerate_validated(
+            lambda p: arun_qwen2vl(p, images, format=fmt, priority=priority), prompt, validate_comparison
+        )
+        return json.dumps(comparison)
 
+    try:
+        text = await get_cache().aget_or_compute(MODEL, prompt, images, compute)
+    except StructuredOutputError as e:
+        return _fallback_comparison(e.text)
+    return validate_comparison(json.loads(text))
@@ -1,19 +1,347 @@
-import sqlite3
+"""
+Order / reference-image store.
+
+Every query goes through one shared WAL-mode connection pool (utils.db_pool), so
+concurrent Gradio workers and batch runs never open a connection per call.
+
+Bulk-import a reference catalog (CSV or JSONL with order_id, reference_image and an
+optional product_category column):
+
+    python db_ops.py import catalog.csv --workers 16
+"""
+import argparse
+import csv
+import json
 import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from utils.concurrency import limiter
+from utils.db_pool import get_pool
+from utils.image_prep import normalize_image
+from utils.similarity import compute_features
+from yolov8_crop import crop_images
+
+DB_PATH = os.environ.get("FAULTLENS_DB_PATH", "database.db")
+IMPORT_BATCH_SIZE = 5000
+# bumped whenever compute_features changes, so stored reference features are recomputed
+FEATURES_VERSION = 2
+
+_features_memo = {}
+_features_lock = threading.Lock()
+
+_CATALOG_ALIASES = {
+    "order": "order_id",
+    "order id": "order_id",
+    "image": "reference_image",
+    "image_path": "reference_image",
+    "reference": "reference_image",
+    "reference image": "reference_image",
+    "category": "product_category",
+    "product category": "product_category",
+}
+
+
+# Demo orders shipped with the repo (order id -> reference image)
+DEMO_ORDERS = {
+    909: os.path.join("images", "ref.jpg"),
+    999: os.path.join("images", "Smart_ref.jpg"),
+}
+
+
+def get_db():
+    """Shared connection pool for DB_PATH"""
+    return get_pool(DB_PATH)
+
+
+def order_key(order_id):
+    """
+    Canonical integer key of an order id (909, 909.0, "909" and " 909 " are the same order)
+    Raises:
+        ValueError: if the id is not a whole number
+    """
+    if isinstance(order_id, bool):
+        raise ValueError(f"Invalid order id: {order_id!r}")
+    if isinstance(order_id, int):
+        return order_id
+    if isinstance(order_id, float):
+        if not order_id.is_integer():
+            raise ValueError(f"Invalid order id: {order_id!r}")
+        return int(order_id)
+    # int() keeps ids above 2**53 exact and rejects "1e3", "inf" and "909.5"
+    return int(str(order_id).strip())
 
-DB_PATH = "database.db"
 
-def insert_reference_image(order_id, image_path):
+def _migrate_orders(conn):
+    """
+    Older databases declared order_id as TEXT: rebuild them with an INTEGER key.
+    Runs in one explicit transaction (sqlite3 would autocommit each DDL statement),
+    so a crash midway leaves the old table untouched.
+    """
+    isolation_level = conn.isolation_level
+    conn.isolation_level = None
+    try:
+        # IMMEDIATE: a second process starting at the same time waits, then sees the migrated table
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            _migrate_orders_table(conn)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+    finally:
+        conn.isolation_level = isolation_level
+
+
+def _migrate_orders_table(conn):
+    columns = {row[1]: row[2].upper() for row in conn.execute("PRAGMA table_info(orders)")}
+    if not columns:
+        return
+    if columns.get("order_id") != "INTEGER":
+        conn.execute("ALTER TABLE orders RENAME TO orders_old")
+        _create_orders(conn)
+        for order_id, reference_image in conn.execute(
+            "SELECT order_id, reference_image FROM orders_old"
+        ).fetchall():
+            try:
+                key = order_key(order_id)
+            except (TypeError, ValueError):
+                print(f"Dropping order with non-numeric id during migration: {order_id!r}")
+                continue
+            conn.execute(
+                "INSERT OR REPLACE INTO orders (order_id, reference_image, updated_at) VALUES (?, ?, ?)",
+                (key, reference_image, time.time()),
+            )
+        conn.execute("DROP TABLE orders_old")
+        return
+    for column, ddl in (("product_category", "TEXT"), ("updated_at", "REAL")):
+        if column not in columns:
+            conn.execute(f"ALTER TABLE orders ADD COLUMN {column} {ddl}")
+
+
+def _create_orders(conn):
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS orders (
+        order_id INTEGER PRIMARY KEY,
+        reference_image TEXT,
+        user_image TEXT,
+        product_category TEXT,
+        updated_at REAL
+    )
+    """)
+
+
+def init_db():
+    """Create (or migrate) the tables if needed (idempotent, cheap)"""
+    with get_db().connection() as conn:
+        _migrate_orders(conn)
+        _create_orders(conn)
+        conn.execute("""
+        CREATE TABLE IF NOT EXISTS reference_features (
+            image_path TEXT PRIMARY KEY,
+            mtime REAL,
+            features BLOB,
+            version INTEGER
+        )
+        """)
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(reference_features)")}
+        if "version" not in columns:
+            # rows of older databases lack a version, so they are recomputed on first use
+            conn.execute("ALTER TABLE reference_features ADD COLUMN version INTEGER")
+
+
+def seed_demo_orders():
+    """Register the demo reference images (skips files that are missing)"""
+    for order_id, image_path in DEMO_ORDERS.items():
+        try:
+            insert_reference_image(order_id=order_id, image_path=image_path)
+        except FileNotFoundError:
+            print(f"Demo reference image missing, skipping order {order_id}: {image_path}")
+
+
+def insert_reference_image(order_id, image_path, product_category=None):
     if not os.path.exists(image_path):
         raise FileNotFoundError("Reference image not found")
 
-    conn = sqlite3.connect(DB_PATH, check_same_thread=False)
-    c = conn.cursor()
+    # pre-normalize once, so comparisons reuse the memoized downscaled copy
+    # (the similarity features need YOLO, so they are computed on the first comparison or by --precompute)
+    normalize_image(image_path)
+
+    with get_db().connection() as conn:
+        conn.execute("""
+        INSERT OR REPLACE INTO orders (order_id, reference_image, product_category, updated_at)
+        VALUES (?, ?, ?, ?)
+        """, (order_key(order_id), image_path, product_category, time.time()))
+
+
+def get_reference_image(order_id):
+    """Reference image path registered for an order, or None"""
+    try:
+        key = order_key(order_id)
+    except (TypeError, ValueError):
+        return None
+    row = get_db().fetchone("SELECT reference_image FROM orders WHERE order_id=?", (key,))
+    return row[0] if row else None
+
+
+def get_order(order_id):
+    """Full order row as a dict, or None"""
+    try:
+        key = order_key(order_id)
+    except (TypeError, ValueError):
+        return None
+    row = get_db().fetchone(
+        "SELECT order_id, reference_image, product_category, updated_at FROM orders WHERE order_id=?", (key,)
+    )
+    if not row:
+        return None
+    return dict(zip(("order_id", "reference_image", "product_category", "updated_at"), row))
+
+
+def read_catalog(path):
+    """
+    Load reference catalog rows from a .csv or .jsonl file.
+    Relative image paths are resolved against the catalog's directory.
+    Returns:
+        list of dict: order_id, reference_image, product_category
+    """
+    rows = []
+    if path.lower().endswith(".csv"):
+        with open(path, newline="", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                rows.append({_CATALOG_ALIASES.get(k.strip().lower(), k.strip()): v for k, v in row.items() if k})
+    else:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    row = json.loads(line)
+                    rows.append({_CATALOG_ALIASES.get(k.lower(), k): v for k, v in row.items()})
+
+    base_dir = os.path.dirname(os.path.abspath(path))
+    catalog = []
+    for row in rows:
+        image_path = (row.get("reference_image") or "").strip()
+        if image_path and not os.path.isabs(image_path):
+            image_path = os.path.normpath(os.path.join(base_dir, image_path))
+        catalog.append({
+            "order_id": row.get("order_id"),
+            "reference_image": image_path,
+            "product_category": row.get("product_category") or None,
+        })
+    return catalog
+
+
+def import_reference_catalog(path, workers=16, batch_size=IMPORT_BATCH_SIZE, precompute=False):
+    """
+    Bulk-register reference images from a catalog file.
+    File existence checks (the slow part on network storage) run in parallel, then rows
+    are written with executemany in batches of `batch_size`, one transaction per batch.
+    Args:
+        path: str, .csv or .jsonl catalog
+        workers: int, threads for existence checks (and precompute)
+        precompute: bool, also normalize images and compute similarity features (loads YOLO)
+            now instead of lazily on the first comparison
+    Returns:
+        dict: imported, missing, invalid counts
+    """
+    init_db()
+    catalog = read_catalog(path)
+    stats = {"imported": 0, "missing": 0, "invalid": 0}
+
+    valid = []
+    for row in catalog:
+        try:
+            row["order_id"] = order_key(row["order_id"])
+        except (TypeError, ValueError):
+            stats["invalid"] += 1
+            continue
+        if not row["reference_image"]:
+            stats["invalid"] += 1
+            continue
+        valid.append(row)
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        exists = list(pool.map(os.path.exists, [row["reference_image"] for row in valid], chunksize=256))
+        present = [row for row, ok in zip(valid, exists) if ok]
+        stats["missing"] = len(valid) - len(present)
+
+        if precompute:
+            def prepare(image_path):
+                try:
+                    normalize_image(image_path)
+                    get_reference_features(image_path)
+                except Exception as e:
+                    print(f"Precompute failed for {image_path}: {e}")
+
+            list(pool.map(prepare, sorted({row["reference_image"] for row in present})))
+
+    now = time.time()
+    db = get_db()
+    for i in range(0, len(present), batch_size):
+        batch = present[i:i + batch_size]
+        with db.connection() as conn:
+            conn.executemany("""
+            INSERT OR REPLACE INTO orders (order_id, reference_image, product_category, updated_at)
+            VALUES (?, ?, ?, ?)
+            """, [(row["order_id"], row["reference_image"], row["product_category"], now) for row in batch])
+        stats["imported"] += len(batch)
+    return stats
+
+
+def reference_crop(image_path):
+    """The reference as user photos reach the pre-check: YOLO-cropped, or whole when nothing is detected"""
+    # the YOLO predictor is not thread-safe: catalog precompute calls this from a thread pool
+    with limiter("yolo").hold():
+        crop = crop_images([image_path])[0]
+    return crop if crop is not None else image_path
+
+
+def get_reference_features(image_path):
+    """
+    Similarity features of the cropped reference image: memoized in memory and stored in the
+    reference_features table, recomputed only when the file's mtime (or FEATURES_VERSION) changes
+    """
+    mtime = os.path.getmtime(image_path)
+    cached = _features_memo.get(image_path)
+    if cached and cached[0] == mtime:
+        return cached[1]
+
+    db = get_db()
+    row = db.fetchone("SELECT mtime, version, features FROM reference_features WHERE image_path=?", (image_path,))
+    if row and row[0] == mtime and row[1] == FEATURES_VERSION:
+        features = np.frombuffer(row[2], dtype=np.float32)
+    else:
+        features = compute_features(reference_crop(image_path))
+        with db.connection() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO reference_features (image_path, mtime, features, version) VALUES (?, ?, ?, ?)",
+                (image_path, mtime, features.tobytes(), FEATURES_VERSION),
+            )
+
+    with _features_lock:
+        _features_memo[image_path] = (mtime, features)
+    return features
+
+
+def main():
+    parser = argparse.ArgumentParser(description="FaultLens order / reference store")
+    sub = parser.add_subparsers(dest="command", required=True)
+    imp = sub.add_parser("import", help="bulk-import a reference catalog (.csv or .jsonl)")
+    imp.add_argument("catalog")
+    imp.add_argument("--workers", type=int, default=16, help="threads for file existence checks")
+    imp.add_argument("--batch-size", type=int, default=IMPORT_BATCH_SIZE, help="rows per executemany transaction")
+    imp.add_argument("--precompute", action="store_true", help="normalize images and compute features now")
+    args = parser.parse_args()
+
+    if args.command == "import":
+        start = time.time()
+        stats = import_reference_catalog(args.catalog, args.workers, args.batch_size, args.precompute)
+        print(
+            f"--- Imported {stats['imported']} orders ({stats['missing']} missing images, "
+            f"{stats['invalid']} invalid rows) in {time.time() - start:.1f}s ---"
+        )
 
-    c.execute("""
-    INSERT OR REPLACE INTO orders (order_id, reference_image)
-    VALUES (?, ?)
-    """, (order_id, image_path))
 
-    conn.commit()
-    conn.close()
\ No newline at end of file
+if __name__ == "__main__":
+    main()
@@ -1,39 +1,68 @@
-import sqlite3
-import os
+import asyncio
+import hashlib
+import threading
 import time 
-from concurrent.futures import ThreadPoolExecutor 
-from typing import TypedDict, Optional, Dict, List 
+from typing import Annotated, TypedDict, Optional, Dict, List 
+from langchain_core.runnables import RunnableConfig
 from langgraph.graph import StateGraph, END
-from langgraph.checkpoint.memory import MemorySaver
-from yolov8_crop import run_yolo_crop
-from vision_agent import run_vision_agent
-from comparison_agent import run_comparison_agent
-from policy_agent import run_policy_agent
-from db_ops import insert_reference_image
-
-# --- Database Setup ---
-conn = sqlite3.connect("database.db", check_same_thread=False)
-c = conn.cursor()
-c.execute("""
-CREATE TABLE IF NOT EXISTS orders (
-    order_id INTEGER PRIMARY KEY,
-    reference_image TEXT,
-    user_image TEXT 
-)
-""")
-conn.commit()
-#########################Database
-insert_reference_image(
-    order_id=909,
-    image_path="images\\ref.jpg"
+from langgraph.config import get_stream_writer
+from langgraph.types import Send
+from yolov8_crop import crop_images
+import vision_agent
+from vision_agent import arun_vision_views, format_view_reports
+from comparison_agent import arun_comparison_agent
+from policy_agent import astream_policy_agent, confirmed_wrong_product, templated_policy_response
+from chat_agent import (
+    astream_chat_agent, build_chat_prompt, build_chat_turn, fits_context, split_history, summarize_turns,
 )
+from db_ops import get_reference_features, order_key
+from utils.policy_index import PolicyIndex
+from utils.image_prep import load_prepared, prepare_image
+from utils.checkpointer import BoundedSqliteSaver
+from utils.concurrency import LIMITS, limiter
+from utils.similarity import PRECHECK_ENABLED, score_views, precheck_verdict
+from utils.quality import QUALITY_GATE_ENABLED, check_image, check_views, retake_message
+from utils.ollama_client import ContextLost, get_client
+from utils.analysis_cache import image_digest
+from utils.singleflight import KeyedLocks, StreamCoalescer
+from utils.metrics import traced, span, observe, increment, profile_request
+from utils.structured import render_comparison
+
+# --- Policy index and checkpointer: created on first use, so importing this module touches no files ---
+_policy_index = None
+_checkpointer = None
+_app = None
+_lazy_lock = threading.Lock()
+
+
+def get_policy_index():
+    """Policy index (built once from the policies directory, refreshed when files change)"""
+    global _policy_index
+    if _policy_index is None:
+        with _lazy_lock:
+            if _policy_index is None:
+                _policy_index = PolicyIndex("policies")
+    return _policy_index
+
+
+def get_checkpointer():
+    """Checkpointer shared by every graph run (opens the checkpoint database)"""
+    global _checkpointer
+    if _checkpointer is None:
+        with _lazy_lock:
+            if _checkpointer is None:
+                _checkpointer = BoundedSqliteSaver()
+    return _checkpointer
 
-insert_reference_image(
-    order_id=999,
-    image_path="images\\Smart_ref.jpg"
-)
 
 # --- State Definition ---
+def merge_reports(current, update):
+    """Reducer of view_reports: results of parallel branches are merged, None (new inspection) clears them"""
+    if update is None:
+        return None
+    return {**(current or {}), **update}
+
+
 class OrderState(TypedDict):
     order_id: int
     reference_image: str
@@ -41,13 +70,42 @@ class OrderState(TypedDict):
     user_description: str
     cropped_images: Optional[Dict[str, object]] 
     defect_text: Optional[str]
+    view_reports: Annotated[Optional[Dict[str, Dict[str, str]]], merge_reports]
+    verdict: Optional[Dict[str, object]]
     comparison_text: Optional[str]
     policy_text: Optional[str]
+    chat_history: Optional[List[Dict[str, str]]]
+    chat_summary: Optional[str]
+    chat_context: Optional[List[int]]
+    prepared_views: Optional[Dict[str, Dict[str, object]]]
+    retake_views: Optional[Dict[str, str]]
+
+
+class ViewTask(TypedDict):
+    """Input of one vision branch (fan-out via Send)"""
+    views: Dict[str, object]    # view name -> ImageBuffer: one view, or all of them in the multi-view modes
+    user_description: str
+    wait_for_verdict: bool      # start only once the comparison is done, leaving it a VLM slot
 
 
 # --- Nodes (The Logic) ---
 
-def yolo_crop_node(state: OrderState):
+@traced("quality_gate")
+async def quality_gate_node(state: OrderState):
+    """
+    CPU-only checks of the uploads (resolution, exposure, blur, duplicate views),
+    so an unusable photo is sent back before any model time is spent on it
+    """
+    if not QUALITY_GATE_ENABLED:
+        return {"retake_views": None}
+    start_time = time.time()
+    problems = await asyncio.to_thread(check_views, state['user_images'])
+    print(f"---Quality gate: {len(problems)} view(s) to retake, {time.time() - start_time:.3f} seconds---")
+    return {"retake_views": problems or None}
+
+
+@traced("yolo_crop")
+async def yolo_crop_node(state: OrderState):
     """
     YOLO Crop
     """
@@ -55,164 +113,514 @@ def yolo_crop_node(state: OrderState):
         print("--- Skipping YOLO (Chat Mode) ---")
         return {}
     
-    image_items = list(state['user_images'].items())
-    print(f"--- Starting Sequential YOLO on {len(image_items)} images ---")
+    # views already cropped while the user was still filling in the form
+    # (the quality gate reports the ones rejected at upload time, they are never reused)
+    prepared = {
+        view_name: view for view_name, view in (state.get('prepared_views') or {}).items()
+        if not view.get("problem")
+    }
+    image_items = [
+        (view_name, img_path) for view_name, img_path in state['user_images'].items()
+        if img_path and view_name not in prepared
+    ]
+    print(f"--- Starting Batched YOLO on {len(image_items)} images ({len(prepared)} prepared) ---")
     start_time = time.time()
     
-    cropped_results = {}
+    normalized = {view_name: view["cropped"] for view_name, view in prepared.items()}
 
-    for view_name, img_path in image_items:
-        if img_path:
-            try:
-                print(f"Processing view: {view_name}...")
-                cropped = run_yolo_crop(img_path)
-                if cropped is not None:
-                    cropped_results[view_name] = cropped
-            except Exception as e:
-                print(f" Error processing {view_name}: {e}")
+    failed = {}
+    try:
+        if image_items:
+            async with limiter("yolo").ahold():
+                crops = await asyncio.to_thread(crop_images, [img_path for _, img_path in image_items])
+            # crops stay in memory: decoded once here, encoded once for every later model call
+            for (view_name, _), cropped in zip(image_items, crops):
+                normalized[view_name] = await asyncio.to_thread(prepare_image, cropped) if cropped is not None else None
+    except Exception as e:
+        print(f" Error running YOLO batch: {e}")
+        increment("yolo.errors")
+        # views the batch never got to are reported, not silently left out of the analysis
+        failed = {
+            view_name: f"the photo could not be processed ({e})"
+            for view_name, _ in image_items if view_name not in normalized
+        }
+
+    cropped_results = {}
+    missing = {}
+    for view_name in state['user_images']:
+        if normalized.get(view_name):
+            cropped_results[view_name] = normalized[view_name]
+        elif view_name in normalized:
+            print(f" No product detected in view: {view_name}")
+            missing[view_name] = "no product could be found in the photo"
 
     print(f"---YOLO Finished in {time.time() - start_time:.2f} seconds---")     
-    return {"cropped_images": cropped_results}
+    update = {"cropped_images": cropped_results}
+    # processing errors are always reported, a missing product only when the quality gate is on
+    retake = {**(missing if QUALITY_GATE_ENABLED else {}), **failed}
+    if retake:
+        update["retake_views"] = retake
+    return update
 
 
-def vision_node(state: OrderState):
+@traced("speculative_prep")
+async def aprepare_view(image_path):
     """
-    Vision Analysis
+    Upload-time work for one view, before the order id and description are known:
+    YOLO crop and normalization only. The vision analysis needs the complaint description,
+    so it always runs after submit. Photos the quality gate would reject get no model work.
+    Returns:
+        dict: {"cropped": ImageBuffer or None, "problem": quality gate reason or None},
+        the value expected per view in astream_langgraph_pipeline(prepared_views=...)
     """
-    if not state.get('cropped_images'):
-        print("--- Vision Node: No images to analyze ---")
-        return {}
-        
-    if state.get('defect_text') and not state.get('user_images'):
-        return {} 
+    prepared = {"cropped": None, "problem": None}
+    async with limiter("speculative").ahold():
+        if QUALITY_GATE_ENABLED:
+            try:
+                prepared["problem"] = (await asyncio.to_thread(check_image, image_path))["problem"]
+            except (OSError, ValueError) as e:
+                prepared["problem"] = f"the file could not be read as an image ({e})"
+            if prepared["problem"]:
+                increment("speculative.rejected")
+                return prepared
+        async with limiter("yolo").ahold():
+            cropped = (await asyncio.to_thread(crop_images, [image_path]))[0]
+        if cropped is not None:
+            prepared["cropped"] = await asyncio.to_thread(prepare_image, cropped)
+        return prepared
+
 
-    print(f"---Starting Parallel Vision Analysis on {len(state['cropped_images'])} images---")
+def _run_signal(config, name):
+    """
+    asyncio.Event of the current run: "wrong_product" is set once the comparison finds a
+    confident wrong product, "verdict_ready" once the comparison is done either way
+    """
+    return (config or {}).get("configurable", {}).get(name)
+
+
+@traced("vision_analysis")
+async def vision_view_node(task: ViewTask, config: RunnableConfig):
+    """
+    Vision branch: defect analysis of one view (or of all views in one request in the multi-view
+    modes). Abandoned as soon as the comparison branch decides the item is the wrong product.
+    """
+    names = ", ".join(task['views'])
+    wrong_product = _run_signal(config, "wrong_product")
+    verdict_ready = _run_signal(config, "verdict_ready")
+    if task.get('wait_for_verdict') and verdict_ready is not None:
+        # branches holding every VLM slot would keep the comparison (which can cancel them) waiting
+        await verdict_ready.wait()
+        if wrong_product is not None and wrong_product.is_set():
+            increment("vision.cancelled")
+            print(f"---Vision [{names}]: skipped, wrong product---")
+            return {}
+    print(f"---Vision [{names}]: started---")
     start_time = time.time()
-    
-    cropped_items = list(state['cropped_images'].items())
+    analysis = asyncio.ensure_future(arun_vision_views(task['views'], task['user_description']))
+    if wrong_product is not None:
+        stop = asyncio.ensure_future(wrong_product.wait())
+        try:
+            await asyncio.wait({analysis, stop}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            stop.cancel()
+        if not analysis.done():
+            analysis.cancel()
+            increment("vision.cancelled")
+            print(f"---Vision [{names}]: cancelled, wrong product---")
+            return {}
+    view_reports = await analysis
+    print(f"---Vision [{names}]: finished in {time.time() - start_time:.2f} seconds---")
+    return {"view_reports": view_reports}
 
-    def process_single_analysis(item):
-        view_name, cropped_img = item
-        analysis = run_vision_agent(cropped_img, state['user_description'])
-        return f"View [{view_name}]: {analysis}"
 
-    with ThreadPoolExecutor(max_workers=3) as executor:
-        reports = list(executor.map(process_single_analysis, cropped_items))
-    
-    combined_defect_text = "\n".join(reports)
-    
-    print(f"---Vision Finished in {time.time() - start_time:.2f} seconds---")
-    return {"defect_text": combined_defect_text}
+@traced("comparison")
+async def comparison_node(state: OrderState, config: RunnableConfig):
+    """
+    Identity comparison (same model as the reference?), from the images alone,
+    so it runs concurrently with the vision branches
+    """
+    try:
+        return await _acompare(state, config)
+    finally:
+        # vision branches held back for the verdict start now (or stop, for a wrong product)
+        verdict_ready = _run_signal(config, "verdict_ready")
+        if verdict_ready is not None:
+            verdict_ready.set()
 
 
-def comparison_node(state: OrderState):
-    """Comparison Node"""
+async def _acompare(state, config):
     if not state.get('cropped_images'):
         print("--- Comparison Node: No images found, skipping... ---")
         return {} 
-    
-    if state.get('comparison_text') and not state.get('user_images'):
-        print("---Comparison Node: Using existing memory---")
-        return {}
 
-    print(f"---Running Comparison Agent---")
-    
     all_cropped_images = list(state['cropped_images'].values())
+    best_view_image = all_cropped_images[0]
+    comparison = None
+
+    # --- Cheap local pre-check: skip the VLM when the item clearly matches ---
+    if PRECHECK_ENABLED:
+        try:
+            # the reference is YOLO-cropped like the views (once per reference, then stored)
+            reference_features = await asyncio.to_thread(get_reference_features, state['reference_image'])
+            scores = await asyncio.to_thread(score_views, state['cropped_images'], reference_features)
+            best_score, best_view, best_view_image = scores[0]
+            print(f"---Similarity pre-check: best view [{best_view}] score {best_score:.2f}---")
+            # a low score is not evidence of a wrong product, only the VLM decides that
+            if precheck_verdict(best_score) == "MATCH":
+                # the score itself is the confidence: a heuristic is never certain
+                comparison = {
+                    "verdict": "MATCH", "confidence": round(min(best_score, 1.0), 2), "defects": [],
+                    "source": "precheck",
+                    "reasoning": f"local similarity pre-check scored view [{best_view}] at {best_score:.2f} against the reference image.",
+                }
+        except Exception as e:
+            print(f" Similarity pre-check failed, falling back to VLM: {e}")
+
+    if comparison is None:
+        print(f"---Running Comparison Agent---")
+        reference_image = await asyncio.to_thread(load_prepared, state['reference_image'])
+        comparison = await arun_comparison_agent(
+            cropped_user_image=best_view_image,  
+            reference_image=reference_image,
+            defect_text=None, 
+            user_description=state['user_description'],
+            # the verdict can cancel the vision branches, so it goes ahead of them in the VLM queue
+            priority=True,
+        )
+
+    # a confident wrong product from the VLM is answered from a template: the defect analysis is not needed
+    wrong_product = _run_signal(config, "wrong_product")
+    if wrong_product is not None and confirmed_wrong_product(comparison):
+        wrong_product.set()
     
-    enhanced_defect_context = f"""
-    The following analysis is derived from {len(all_cropped_images)} different angles of the same product. 
-    Please verify if these attributes match the single reference image provided.
-    ---
-    DETAILED ANALYSIS:
-    {state.get('defect_text', '')}
-    """
-
-    comparison_text = run_comparison_agent(
-        cropped_user_image=all_cropped_images[0],  
-        reference_image=state['reference_image'],
-        defect_text=enhanced_defect_context, 
-        user_description=state['user_description']
-    )
-    
-    return {"comparison_text": comparison_text}
+    return {"verdict": comparison, "comparison_text": render_comparison(comparison)}
 
 
-def policy_node(state: OrderState):
+@traced("policy_decision")
+async def policy_node(state: OrderState):
     print("---Running Policy Agent---")
+    writer = get_stream_writer()
+
+    # join of the vision branches (in view order) and the comparison
+    reports = state.get('view_reports') or {}
+    ordered = {view_name: reports[view_name] for view_name in (state.get('cropped_images') or {}) if view_name in reports}
+    defect_text = format_view_reports(ordered)
     
-    if "WRONG_PRODUCT_CONFIRMED" in state.get('comparison_text', ''):
+    # clear-cut verdicts get a fixed answer without an LLM call
+    policy_text = templated_policy_response(state.get('verdict'), ordered)
+    if policy_text:
+        increment("policy.templated")
+        writer({"policy_token": policy_text})
         return {
-            "policy_text": "Based on the images provided, the product does not match our records for this Order ID."
+            "defect_text": defect_text,
+            "policy_text": policy_text,
+            "chat_history": [
+                {"role": "user", "content": state['user_description']},
+                {"role": "assistant", "content": policy_text},
+            ],
+            "chat_context": None,
         }
     
-    policies_dir = "policies" 
-    combined_policies = ""
-
-    if os.path.exists(policies_dir):
-        for file in os.listdir(policies_dir):
-            if file.endswith(".txt"):
-                with open(os.path.join(policies_dir, file), "r", encoding="utf-8") as f: 
-                     combined_policies += f.read() + "\n---\n"
+    query = "\n".join(filter(None, [
+        state.get('user_description'), defect_text, state.get('comparison_text')
+    ]))
+    combined_policies = await asyncio.to_thread(get_policy_index().retrieve_text, query)
 
-    policy_decision = run_policy_agent(
+    chunks = []
+    done_info = {}
+    async for chunk in astream_policy_agent(
         comparison_text=state['comparison_text'],
-        defect_text=state['defect_text'],
+        defect_text=defect_text,
         user_description=state['user_description'],
-        policies_combined_text=combined_policies
-    )
-    return {"policy_text": policy_decision}
+        policies_combined_text=combined_policies,
+        done_info=done_info,
+    ):
+        if not chunks:
+            chunk = chunk.lstrip()
+            if not chunk:
+                continue
+        chunks.append(chunk)
+        writer({"policy_token": chunk})
+
+    policy_text = "".join(chunks).strip()
+    # the server-side conversation (prompt + reply) that chat follow-ups continue from
+    return {
+        "defect_text": defect_text,
+        "policy_text": policy_text,
+        "chat_history": [
+            {"role": "user", "content": state['user_description']},
+            {"role": "assistant", "content": policy_text},
+        ],
+        "chat_context": done_info.get("context"),
+    }
+
+
+@traced("retake")
+async def retake_node(state: OrderState):
+    """Answer with the views the user has to photograph again, instead of analyzing them"""
+    increment("quality.retake")
+    message = retake_message(state['retake_views'])
+    get_stream_writer()({"policy_token": message})
+    return {"policy_text": message}
+
+
+async def _stream_chat_reply(prompt, context, writer):
+    """Stream one chat reply to the writer, returns (reply, final model chunk)"""
+    chunks = []
+    done_info = {}
+    async for chunk in astream_chat_agent(prompt, context=context, done_info=done_info):
+        if not chunks:
+            chunk = chunk.lstrip()
+            if not chunk:
+                continue
+        chunks.append(chunk)
+        writer({"policy_token": chunk})
+    return "".join(chunks).strip(), done_info
+
+
+@traced("chat")
+async def chat_node(state: OrderState):
+    """
+    Chat follow-up: continue the conversation kept on the model server, so only the new
+    message is prefilled. Once the context would exceed its token budget (or the server that
+    holds it is gone), older turns are folded into a summary and a compact prompt starts a
+    fresh context.
+    """
+    writer = get_stream_writer()
+    user_message = state['user_description']
+    history = list(state.get('chat_history') or [])
+    summary = state.get('chat_summary') or ""
+    context = state.get('chat_context')
+
+    reply = None
+    if fits_context(context, user_message):
+        print("---Chat: continuing cached context---")
+        try:
+            reply, done_info = await _stream_chat_reply(build_chat_turn(user_message), context, writer)
+        except ContextLost:
+            print("---Chat: backend holding the context is gone---")
+    if reply is None:
+        print("---Chat: rebuilding context from summary + recent turns---")
+        older, history = split_history(history)
+        summary = await summarize_turns(summary, older)
+        policies = await asyncio.to_thread(get_policy_index().retrieve_text, user_message, 2)
+        prompt = build_chat_prompt(
+            user_message, state.get('defect_text'), state.get('comparison_text'), policies, summary, history
+        )
+        reply, done_info = await _stream_chat_reply(prompt, None, writer)
+
+    history += [{"role": "user", "content": user_message}, {"role": "assistant", "content": reply}]
+    return {
+        "policy_text": reply,
+        "chat_history": history,
+        "chat_summary": summary,
+        "chat_context": done_info.get("context"),
+    }
 
 
 def route_start(state: OrderState):
     """Route starting point"""
     if not state.get('user_images'):
-        print("--- ROUTING TO POLICY (CHAT MODE) ---")
-        return "policy_decision"
+        print("--- ROUTING TO CHAT (FOLLOW-UP) ---")
+        return "chat"
     else:
-        print("--- ROUTING TO YOLO (INITIAL INSPECTION) ---")
-        return "yolo_crop"
+        print("--- ROUTING TO QUALITY GATE (INITIAL INSPECTION) ---")
+        return "quality_gate"
+
+
+def route_retake(next_node):
+    """Router that stops at the retake answer when some view has to be photographed again"""
+    def route(state: OrderState):
+        return "retake" if state.get('retake_views') else next_node
+    return route
+
+
+def route_analysis(state: OrderState):
+    """
+    After YOLO: retake, or fan out into one vision branch per view (a single branch for the
+    multi-view modes) next to the identity comparison; policy_decision joins them all
+    """
+    if state.get('retake_views'):
+        return "retake"
+    cropped = state.get('cropped_images') or {}
+    if vision_agent.VISION_MODE == "per_view":
+        groups = [{view_name: img} for view_name, img in cropped.items()]
+    else:
+        groups = [cropped] if cropped else []
+    # the comparison goes ahead of the vision calls in the VLM queue, but branches that already
+    # hold a slot are not preempted: only as many start right away as leave one slot free for it
+    running = max(LIMITS["vlm"] - 1, 0)
+    branches = [
+        Send("vision_view", {"views": views, "user_description": state['user_description'],
+                             "wait_for_verdict": i >= running})
+        for i, views in enumerate(groups)
+    ]
+    return ["comparison"] + branches
 
 
 # ---- Build the Graph ---- #
 workflow = StateGraph(OrderState)
+workflow.add_node("quality_gate", quality_gate_node)
 workflow.add_node("yolo_crop", yolo_crop_node)
-workflow.add_node("vision_analysis", vision_node)
+workflow.add_node("vision_view", vision_view_node, input=ViewTask)
 workflow.add_node("comparison", comparison_node)
 workflow.add_node("policy_decision", policy_node)
+workflow.add_node("retake", retake_node)
+workflow.add_node("chat", chat_node)
 
 workflow.set_conditional_entry_point(
     route_start,
     {
-        "yolo_crop": "yolo_crop",
-        "policy_decision": "policy_decision"
+        "quality_gate": "quality_gate",
+        "chat": "chat"
     }
 )
-workflow.add_edge("yolo_crop", "vision_analysis")
-workflow.add_edge("vision_analysis", "comparison")
+workflow.add_conditional_edges(
+    "quality_gate", route_retake("yolo_crop"), {"yolo_crop": "yolo_crop", "retake": "retake"}
+)
+workflow.add_conditional_edges("yolo_crop", route_analysis, ["vision_view", "comparison", "retake"])
+workflow.add_edge("vision_view", "policy_decision")
 workflow.add_edge("comparison", "policy_decision")
-workflow.add_edge("policy_decision", END) 
+workflow.add_edge("policy_decision", END)
+workflow.add_edge("retake", END)
+workflow.add_edge("chat", END)
 
-memory = MemorySaver()
-app = workflow.compile(checkpointer=memory)
 
+def get_app():
+    """The compiled graph, bound to the shared checkpointer"""
+    global _app
+    if _app is None:
+        checkpointer = get_checkpointer()
+        with _lazy_lock:
+            if _app is None:
+                _app = workflow.compile(checkpointer=checkpointer)
+    return _app
 
-def run_langgraph_pipeline(order_id, user_images_dict, reference_image_path, user_description):
-    
-    config = {"configurable": {"thread_id": str(order_id)}}
-    initial_inputs = {
+
+def _build_inputs(order_id, user_images_dict, reference_image_path, user_description, prepared_views=None):
+    if not user_images_dict:
+        # chat mode: keep the checkpointed crops/analysis of this order, only the new message changes
+        return {
+            "order_id": order_id,
+            "user_images": None,
+            "user_description": user_description,
+        }
+    return {
         "order_id": order_id,
         "user_images": user_images_dict, 
         "reference_image": reference_image_path,
         "user_description": user_description,
         "cropped_images": None,
         "defect_text": "",
+        "view_reports": None,
+        "verdict": None,
         "comparison_text": "",
-        "policy_text": ""
+        "policy_text": "",
+        "chat_history": None,
+        "chat_summary": "",
+        "chat_context": None,
+        "prepared_views": prepared_views,
+        "retake_views": None,
     }
 
-    result = app.invoke(initial_inputs, config=config)
+
+def _format_outputs(result):
     return {
-        "Vision": {"defect_text": result.get("defect_text")},
-        "Comparison": {"comparison_text": result.get("comparison_text")},
-        "Policy": {"policy_decision": result.get("policy_text")}
-    }
\ No newline at end of file
+        "Vision": {"defect_text": result.get("defect_text"), "view_reports": result.get("view_reports")},
+        "Comparison": {"comparison_text": result.get("comparison_text"), "verdict": result.get("verdict")},
+        "Policy": {"policy_decision": result.get("policy_text")},
+        "Quality": {"retake_views": result.get("retake_views")},
+    }
+
+
+# identical inspection submissions share one run; runs on the same order never overlap
+_submissions = StreamCoalescer("submission")
+_order_locks = KeyedLocks()
+
+
+def _submission_key(order_id, user_images_dict, user_description):
+    """Order id + content hash of every uploaded view + description"""
+    h = hashlib.sha256(str(order_key(order_id)).encode("utf-8"))
+    for view_name, image_path in sorted(user_images_dict.items()):
+        h.update(b"\0" + view_name.encode("utf-8") + b"\0")
+        h.update(image_digest(image_path).encode("ascii") if image_path else b"-")
+    h.update(b"\0" + (user_description or "").strip().encode("utf-8"))
+    return h.hexdigest()
+
+
+async def _astream_graph(order_id, user_images_dict, reference_image_path, user_description, prepared_views=None):
+    # one checkpoint thread and lock per order, whichever way its id was typed (909, "909", " 909 ")
+    order_id = order_key(order_id)
+    # per-run objects in configurable are not written to the checkpoint metadata
+    config = {"configurable": {
+        "thread_id": str(order_id), "wrong_product": asyncio.Event(), "verdict_ready": asyncio.Event(),
+    }}
+    initial_inputs = _build_inputs(order_id, user_images_dict, reference_image_path, user_description, prepared_views)
+
+    result = {}
+    async with _order_locks.get(order_id):
+        with span("pipeline"), profile_request(f"order-{order_id}"):
+            first_token = True
+            start = time.perf_counter()
+            async for mode, chunk in get_app().astream(initial_inputs, config=config, stream_mode=["custom", "values"]):
+                if mode == "custom" and "policy_token" in chunk:
+                    if first_token:
+                        observe("pipeline.time_to_first_token", time.perf_counter() - start)
+                        first_token = False
+                    yield {"token": chunk["policy_token"]}
+                elif mode == "values":
+                    result = chunk
+
+    yield {"result": _format_outputs(result)}
+
+
+async def astream_langgraph_pipeline(order_id, user_images_dict, reference_image_path, user_description,
+                                     prepared_views=None):
+    """
+    Run the pipeline and stream its answer
+    Identical inspection submissions (same order, image contents and description) that arrive
+    while one is running attach to it and receive the same events instead of starting a second run.
+    Args:
+        order_id: int or str, canonicalized with db_ops.order_key (ValueError if it is not a whole number)
+        prepared_views: dict, optional, view name -> aprepare_view() result for views processed at upload time
+    Yields:
+        {"token": str} for every chunk the policy agent generates,
+        then a final {"result": outputs} with the same shape run_langgraph_pipeline returns
+    """
+    def run():
+        return _astream_graph(order_id, user_images_dict, reference_image_path, user_description, prepared_views)
+
+    if not user_images_dict:
+        # chat turns are never coalesced: the same short message twice is two questions
+        async for event in run():
+            yield event
+        return
+
+    key = await asyncio.to_thread(_submission_key, order_id, user_images_dict, user_description)
+    async for event in _submissions.subscribe(key, run):
+        yield event
+
+
+async def arun_langgraph_pipeline(order_id, user_images_dict, reference_image_path, user_description,
+                                  prepared_views=None):
+    """Non-streaming variant of astream_langgraph_pipeline, returns the outputs dict"""
+    result = None
+    async for event in astream_langgraph_pipeline(
+        order_id, user_images_dict, reference_image_path, user_description, prepared_views
+    ):
+        if "result" in event:
+            result = event["result"]
+    return result
+
+
+def run_langgraph_pipeline(order_id, user_images_dict, reference_image_path, user_description):
+    """
+    Blocking entry point for scripts / threads without an event loop
+    """
+    async def _run():
+        try:
+            return await arun_langgraph_pipeline(order_id, user_images_dict, reference_image_path, user_description)
+        finally:
+            await get_client().aclose()
+
+    return asyncio.run(_run())
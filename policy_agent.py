@@ -1,7 +1,21 @@
-from utils.rag_wrapper import run_qwen2vl
+import os
+from utils.rag_wrapper import astream_qwen2vl
 
-def run_policy_agent(comparison_text, defect_text, user_description, policies_combined_text):
-    prompt = f"""
+# Verdicts at or above this confidence are clear-cut enough to answer from a template
+VERDICT_CONFIDENCE = float(os.environ.get("FAULTLENS_VERDICT_CONFIDENCE", "0.8"))
+
+WRONG_PRODUCT_RESPONSE = (
+    "Based on the images provided, the product does not match our records for this Order ID. "
+    "Please check that the Order ID is correct and that the photos show the item you received with this order."
+)
+NO_DEFECT_RESPONSE = (
+    "Good news, the product is working perfectly! Our inspection of your photos found no visible defect, "
+    "and the item matches the one in your order. It might be a misunderstanding of how to use it - "
+    "if you tell me what happens when you use it, I will gladly help you operate it."
+)
+
+def build_policy_prompt(comparison_text, defect_text, user_description, policies_combined_text):
+    return f"""
 ### SYSTEM ROLE:
 You are "FaultLens AI", a helpful and empathetic customer service agent.
 
@@ -45,4 +59,50 @@ Based on the inputs above, pick the correct scenario and write the response to t
 - Be professional.
 - Do NOT output internal thinking or "Scenario A" labels. Just the response.
 """
-    return run_qwen2vl(prompt)
\ No newline at end of file
+
+
+def confirmed_wrong_product(comparison):
+    """
+    Whether the comparison is a confident WRONG_PRODUCT verdict made by the VLM
+    (a similarity pre-check score alone never rejects an item)
+    """
+    return (
+        bool(comparison)
+        and comparison["verdict"] == "WRONG_PRODUCT"
+        and comparison.get("source") != "precheck"
+        and comparison.get("confidence", 0.0) >= VERDICT_CONFIDENCE
+    )
+
+
+def templated_policy_response(comparison, view_reports):
+    """
+    Fixed answer for clear-cut cases, so they skip the LLM entirely
+    Args:
+        comparison: dict from the comparison step (verdict, confidence, ...), optional
+        view_reports: dict view name -> report (defects, severity, summary), optional
+    Returns:
+        str or None when the case needs the policy agent
+    """
+    if not comparison or comparison.get("confidence", 0.0) < VERDICT_CONFIDENCE:
+        return None
+    if comparison["verdict"] == "WRONG_PRODUCT":
+        return WRONG_PRODUCT_RESPONSE if confirmed_wrong_product(comparison) else None
+    if (
+        comparison["verdict"] == "MATCH"
+        and view_reports
+        and all(report.get("severity") == "none" for report in view_reports.values())
+    ):
+        return NO_DEFECT_RESPONSE
+    return None
+
+
+async def astream_policy_agent(comparison_text, defect_text, user_description, policies_combined_text, done_info=None):
+    """
+    Policy answer, yielded token by token
+    Args:
+        done_info: dict, optional, receives the final model chunk; its `context` lets
+            chat follow-ups continue this conversation without re-sending the prompt
+    """
+    prompt = build_policy_prompt(comparison_text, defect_text, user_description, policies_combined_text)
+    async for chunk in astream_qwen2vl(prompt, done_info=done_info):
+        yield chunk
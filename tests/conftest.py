@@ -0,0 +1,10 @@
+import pytest
+
+from benchmarks.stub_ollama import StubOllamaServer
+
+
+@pytest.fixture
+def stub():
+    """Stand-in Ollama server answering instantly"""
+    with StubOllamaServer(first_token=0.0, tokens_per_second=0, reply_tokens=5) as server:
+        yield server
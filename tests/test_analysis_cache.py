@@ -0,0 +1,87 @@
+import asyncio
+
+import pytest
+
+from utils import analysis_cache
+from utils.analysis_cache import AnalysisCache
+
+
+class Clock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(analysis_cache.time, "time", clock)
+    return clock
+
+
+def make_cache(tmp_path, **kwargs):
+    return AnalysisCache(path=str(tmp_path / "cache.db"), use_phash=False, **kwargs)
+
+
+def test_key_depends_on_model_prompt_and_image_content(tmp_path):
+    cache = make_cache(tmp_path)
+    key = cache.make_key("m", "p", b"image-1")
+    assert key == cache.make_key("m", "p", [b"image-1"])
+    assert key != cache.make_key("m", "p", b"image-2")
+    assert key != cache.make_key("m", "other prompt", b"image-1")
+    assert key != cache.make_key("other", "p", b"image-1")
+
+
+def test_entries_expire_after_ttl(tmp_path, clock):
+    cache = make_cache(tmp_path, ttl=60, max_entries=0)
+    cache.set("k", "answer")
+    clock.now += 59
+    assert cache.get("k") == "answer"
+    clock.now += 2
+    assert cache.get("k") is None
+    assert cache.stats()["entries"] == 0
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path, clock):
+    cache = make_cache(tmp_path, ttl=0, max_entries=2)
+    cache.set("a", "1")
+    clock.now += 1
+    cache.set("b", "2")
+    clock.now += 1
+    assert cache.get("a") == "1"      # "b" is now the least recently used
+    clock.now += 1
+    cache.set("c", "3")
+    assert cache.stats()["entries"] == 2
+    assert cache.get("b") is None
+    assert cache.get("a") == "1"
+    assert cache.get("c") == "3"
+
+
+def test_aget_or_compute_calls_the_model_once(tmp_path):
+    cache = make_cache(tmp_path)
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        return "answer"
+
+    async def run():
+        first = await cache.aget_or_compute("m", "p", b"img", compute)
+        second = await cache.aget_or_compute("m", "p", b"img", compute)
+        return first, second
+
+    assert asyncio.run(run()) == ("answer", "answer")
+    assert len(calls) == 1
+
+
+def test_empty_answers_are_not_cached(tmp_path):
+    cache = make_cache(tmp_path)
+
+    async def compute():
+        return ""
+
+    asyncio.run(cache.aget_or_compute("m", "p", b"img", compute))
+    assert cache.stats()["entries"] == 0
@@ -0,0 +1,56 @@
+import asyncio
+
+import chat_agent
+from chat_agent import CHAT_REPLY_TOKENS, build_chat_turn, estimate_tokens, fits_context, split_history, summarize_turns
+
+
+def turns(n):
+    history = []
+    for i in range(n):
+        history += [{"role": "user", "content": f"question {i}"}, {"role": "assistant", "content": f"answer {i}"}]
+    return history
+
+
+def test_fits_context_up_to_the_token_budget():
+    message = "Can I get a refund?"
+    needed = estimate_tokens(build_chat_turn(message)) + CHAT_REPLY_TOKENS
+    context = [1] * 100
+    assert fits_context(context, message, budget=100 + needed)
+    assert not fits_context(context, message, budget=100 + needed - 1)
+
+
+def test_no_context_never_fits():
+    assert not fits_context(None, "hi", budget=10 ** 6)
+    assert not fits_context([], "hi", budget=10 ** 6)
+
+
+def test_split_history_keeps_the_recent_turns():
+    history = turns(5)
+    older, recent = split_history(history, keep_turns=2)
+    assert older == history[:6]
+    assert recent == history[6:]
+    assert split_history(turns(2), keep_turns=2) == ([], turns(2))
+
+
+def test_summarize_turns_folds_older_turns_into_the_summary(monkeypatch):
+    prompts = []
+
+    async def fake_run(prompt, **kwargs):
+        prompts.append(prompt)
+        return "new summary"
+
+    monkeypatch.setattr(chat_agent, "arun_qwen2vl", fake_run)
+    assert asyncio.run(summarize_turns("old summary", turns(1))) == "new summary"
+    assert "old summary" in prompts[0] and "question 0" in prompts[0]
+    assert asyncio.run(summarize_turns("old summary", [])) == "old summary"
+    assert len(prompts) == 1
+
+
+def test_summarize_turns_truncates_when_the_model_fails(monkeypatch):
+    async def failing_run(prompt, **kwargs):
+        raise RuntimeError("backend down")
+
+    monkeypatch.setattr(chat_agent, "arun_qwen2vl", failing_run)
+    summary = asyncio.run(summarize_turns("old summary", turns(1)))
+    assert summary.startswith("old summary")
+    assert "Customer: question 0" in summary and "FaultLens AI: answer 0" in summary
@@ -0,0 +1,75 @@
+import pytest
+from langgraph.checkpoint.base import create_checkpoint, empty_checkpoint
+
+from utils import checkpointer
+from utils.checkpointer import BoundedSqliteSaver
+
+
+class Clock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(checkpointer.time, "time", clock)
+    return clock
+
+
+def make_saver(tmp_path, **kwargs):
+    return BoundedSqliteSaver(path=str(tmp_path / "checkpoints.db"), **kwargs)
+
+
+def put_checkpoints(saver, thread_id, count):
+    config = {"configurable": {"thread_id": thread_id, "checkpoint_ns": ""}}
+    checkpoint = empty_checkpoint()
+    for step in range(count):
+        checkpoint = create_checkpoint(checkpoint, {}, step)
+        config = saver.put(config, checkpoint, {"step": step}, {})
+    return config
+
+
+def checkpoint_ids(saver, thread_id):
+    return [item.config["configurable"]["checkpoint_id"]
+            for item in saver.list({"configurable": {"thread_id": thread_id}})]
+
+
+def test_keeps_only_the_newest_checkpoints_per_thread(tmp_path):
+    saver = make_saver(tmp_path, max_checkpoints=3)
+    last = put_checkpoints(saver, "1", 6)
+    ids = checkpoint_ids(saver, "1")
+    assert len(ids) == 3
+    assert ids[0] == last["configurable"]["checkpoint_id"]
+    assert saver.get_tuple({"configurable": {"thread_id": "1"}}).metadata["step"] == 5
+
+
+def test_never_keeps_fewer_than_two_checkpoints(tmp_path):
+    saver = make_saver(tmp_path, max_checkpoints=1)
+    put_checkpoints(saver, "1", 4)
+    assert len(checkpoint_ids(saver, "1")) == 2
+
+
+def test_evict_drops_threads_past_their_ttl(tmp_path, clock):
+    saver = make_saver(tmp_path, ttl=60)
+    put_checkpoints(saver, "old", 2)
+    clock.now += 50
+    put_checkpoints(saver, "new", 2)
+    clock.now += 20
+    saver.evict()
+    assert checkpoint_ids(saver, "old") == []
+    assert len(checkpoint_ids(saver, "new")) == 2
+
+
+def test_evict_keeps_the_most_recently_written_threads(tmp_path, clock):
+    saver = make_saver(tmp_path, ttl=0, max_threads=2)
+    for thread_id in ("a", "b", "c"):
+        put_checkpoints(saver, thread_id, 2)
+        clock.now += 1
+    put_checkpoints(saver, "a", 1)
+    saver.evict()
+    assert checkpoint_ids(saver, "b") == []
+    assert checkpoint_ids(saver, "a") and checkpoint_ids(saver, "c")
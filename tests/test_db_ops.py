@@ -0,0 +1,18 @@
+import pytest
+
+from db_ops import order_key
+
+
+@pytest.mark.parametrize("order_id", [909, 909.0, "909", " 909 "])
+def test_order_key_canonicalizes_whole_numbers(order_id):
+    assert order_key(order_id) == 909
+
+
+def test_order_key_keeps_large_ids_exact():
+    assert order_key(str(2 ** 53 + 1)) == 2 ** 53 + 1
+
+
+@pytest.mark.parametrize("order_id", ["1e3", "inf", "nan", "909.0000000000001", "909.5", 909.5, float("inf"), "", True])
+def test_order_key_rejects_everything_else(order_id):
+    with pytest.raises(ValueError):
+        order_key(order_id)
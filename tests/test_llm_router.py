@@ -0,0 +1,125 @@
+import asyncio
+import time
+
+import pytest
+
+from benchmarks.stub_ollama import StubOllamaServer
+from utils.llm_router import Backend, LLMRouter
+from utils.ollama_client import ContextLost, OllamaError
+
+
+@pytest.fixture
+def stubs():
+    servers = [StubOllamaServer(first_token=0.0, tokens_per_second=0, reply_tokens=5).start() for _ in range(2)]
+    yield servers
+    for server in servers:
+        server.stop()
+
+
+def make_router(stubs, health_interval=0, **weights):
+    backends = [
+        Backend(stub.url, retries=0, retry_backoff=0.0, timeout=5, weight=weights.get(f"w{i}", 1.0))
+        for i, stub in enumerate(stubs)
+    ]
+    return LLMRouter(backends, health_interval=health_interval)
+
+
+def stream(router, prompt="hi", **kwargs):
+    async def run():
+        try:
+            return [chunk async for chunk in router.agenerate_stream("m", prompt, **kwargs)]
+        finally:
+            await router.aclose()
+    return asyncio.run(run())
+
+
+@pytest.mark.parametrize("failure", [503, "drop"])
+def test_fails_over_and_marks_backend_down(stubs, failure):
+    stubs[0].fail_next(failure)
+    router = make_router(stubs)
+    assert router.generate("m", "hi")
+    assert stubs[1].requests == 1
+    assert not router.backends[0].healthy
+
+
+def test_404_fails_over_but_keeps_backend(stubs):
+    stubs[0].models = ["other"]
+    router = make_router(stubs)
+    assert len(stream(router)) == 5
+    assert stubs[1].requests == 1
+    assert router.backends[0].healthy
+
+
+def test_model_error_is_not_failed_over(stubs):
+    stubs[0].fail_next("error")
+    router = make_router(stubs)
+    with pytest.raises(OllamaError, match="injected model error"):
+        stream(router)
+    assert stubs[1].received == 0
+    assert router.backends[0].healthy
+
+
+def test_client_error_is_not_failed_over(stubs):
+    stubs[0].fail_next(400)
+    router = make_router(stubs)
+    with pytest.raises(OllamaError):
+        router.generate("m", "hi")
+    assert stubs[1].received == 0
+    assert router.backends[0].healthy
+
+
+def test_stream_not_failed_over_after_first_chunk(stubs):
+    stubs[0].break_after = 2
+    router = make_router(stubs)
+    with pytest.raises(OllamaError):
+        stream(router)
+    assert stubs[1].received == 0
+
+
+def test_all_backends_down(stubs):
+    for stub in stubs:
+        stub.fail_next(503)
+    router = make_router(stubs)
+    with pytest.raises(OllamaError, match="All LLM backends failed"):
+        router.generate("m", "hi")
+
+
+def test_health_check_brings_backend_back(stubs):
+    stubs[0].healthy = False
+    router = make_router(stubs, health_interval=0.05)
+    try:
+        assert router.generate("m", "hi")
+        assert not router.backends[0].healthy
+        stubs[0].healthy = True
+        deadline = time.monotonic() + 5
+        while not router.backends[0].healthy and time.monotonic() < deadline:
+            time.sleep(0.02)
+        assert router.backends[0].healthy
+    finally:
+        router.close()
+
+
+def test_context_continuation_stays_on_its_backend(stubs):
+    router = make_router(stubs, w0=10.0)
+    done_info = {}
+    stream(router, done_info=done_info)
+    assert stubs[0].requests == 1
+
+    # backend 1 is now preferred for new conversations, the continuation still goes to backend 0
+    router.backends[0].weight = 0.01
+    stream(router)
+    assert stubs[1].requests == 1
+    stream(router, context=done_info["context"])
+    assert stubs[0].requests == 2
+
+    router.backends[0].mark_down("gone")
+    with pytest.raises(ContextLost):
+        stream(router, context=done_info["context"])
+    assert stubs[1].requests == 1
+
+
+def test_unknown_context_is_lost(stubs):
+    router = make_router(stubs)
+    with pytest.raises(ContextLost):
+        stream(router, context=[7, 8, 9])
+    assert stubs[0].received == stubs[1].received == 0
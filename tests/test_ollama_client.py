@@ -0,0 +1,106 @@
+import asyncio
+
+import pytest
+
+from utils.ollama_client import OllamaClient, OllamaError
+
+
+def make_client(url, retries=2):
+    return OllamaClient(host=url, retries=retries, retry_backoff=0.0, timeout=5)
+
+
+def test_generate(stub):
+    client = make_client(stub.url)
+    assert client.generate("m", "hi").startswith("VERDICT")
+    assert stub.requests == 1
+
+
+@pytest.mark.parametrize("failure", [500, 503, "drop"])
+def test_retries_server_and_transport_errors(stub, failure):
+    stub.fail_next(failure, failure)
+    client = make_client(stub.url)
+    assert client.generate("m", "hi")
+    assert stub.received == 3
+
+
+def test_gives_up_after_retries(stub):
+    stub.fail_next(503, 503, 503)
+    client = make_client(stub.url)
+    with pytest.raises(OllamaError):
+        client.generate("m", "hi")
+    assert stub.received == 3
+
+
+def test_client_errors_are_not_retried(stub):
+    stub.fail_next(400)
+    client = make_client(stub.url)
+    with pytest.raises(OllamaError):
+        client.generate("m", "hi")
+    assert stub.received == 1
+
+
+def test_stream_retries_before_first_chunk(stub):
+    stub.fail_next(503)
+    client = make_client(stub.url)
+    done_info = {}
+    chunks = list(client.generate_stream("m", "hi", done_info=done_info))
+    assert len(chunks) == 5
+    assert done_info["context"] == [1, 2, 3]
+    assert stub.received == 2
+
+
+def test_stream_not_retried_after_first_chunk(stub):
+    stub.break_after = 2
+    client = make_client(stub.url)
+    chunks = []
+    with pytest.raises(OllamaError):
+        for chunk in client.generate_stream("m", "hi"):
+            chunks.append(chunk)
+    assert len(chunks) == 2
+    assert stub.received == 1
+
+
+def test_async_retries(stub):
+    stub.fail_next(502, "drop")
+    client = make_client(stub.url)
+
+    async def run():
+        try:
+            return await client.agenerate("m", "hi")
+        finally:
+            await client.aclose()
+
+    assert asyncio.run(run())
+    assert stub.received == 3
+
+
+def test_async_stream_not_retried_after_first_chunk(stub):
+    stub.break_after = 1
+    client = make_client(stub.url)
+
+    async def run():
+        chunks = []
+        try:
+            async for chunk in client.agenerate_stream("m", "hi"):
+                chunks.append(chunk)
+        finally:
+            await client.aclose()
+        return chunks
+
+    with pytest.raises(OllamaError):
+        asyncio.run(run())
+    assert stub.received == 1
+
+
+def test_async_stream_retries_before_first_chunk(stub):
+    stub.fail_next("drop")
+    client = make_client(stub.url)
+
+    async def run():
+        try:
+            return [chunk async for chunk in client.agenerate_stream("m", "hi")]
+        finally:
+            await client.aclose()
+
+    assert len(asyncio.run(run())) == 5
+    assert stub.received == 2
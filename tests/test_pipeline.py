@@ -0,0 +1,80 @@
+import asyncio
+import time
+
+import pytest
+from PIL import Image
+
+from benchmarks.fake_yolo import install_fake_yolo
+from benchmarks.stub_ollama import StubOllamaServer
+from utils import analysis_cache, metrics, ollama_client, quality
+from utils.checkpointer import BoundedSqliteSaver
+from utils.ollama_client import OllamaClient
+
+FIXTURE = "img_for_test/909_1.jpg"
+VIEWS = {"Front": "img_for_test/909_1.jpg", "Back": "img_for_test/909_2.jpg", "Side": "img_for_test/909_3.jpg"}
+
+
+class SlowVisionStub(StubOllamaServer):
+    """Answers comparisons at once and vision requests only after `vision_delay` seconds"""
+
+    vision_delay = 2.0
+
+    def reply_text(self, body):
+        text = super().reply_text(body)
+        if '"verdict"' not in text:
+            time.sleep(self.vision_delay)
+        return text
+
+
+@pytest.fixture
+def fake_yolo():
+    return install_fake_yolo(batch_latency=0.0, per_image_latency=0.0)
+
+
+def test_prepare_view_crops_usable_photos(fake_yolo):
+    from langgraph_flow import aprepare_view
+
+    prepared = asyncio.run(aprepare_view(FIXTURE))
+    assert prepared["problem"] is None
+    assert prepared["cropped"] is not None
+    assert fake_yolo.calls == 1
+
+
+def test_prepare_view_skips_photos_the_quality_gate_rejects(fake_yolo, tmp_path):
+    from langgraph_flow import aprepare_view
+
+    small = tmp_path / "small.jpg"
+    Image.new("RGB", (64, 64), "gray").save(small)
+    prepared = asyncio.run(aprepare_view(str(small)))
+    assert "too small" in prepared["problem"]
+    assert prepared["cropped"] is None
+    assert fake_yolo.calls == 0
+
+
+@pytest.fixture
+def pipeline(monkeypatch, tmp_path, fake_yolo):
+    """langgraph_flow with its checkpoints in tmp_path, no analysis cache and no similarity pre-check"""
+    import langgraph_flow
+
+    monkeypatch.setattr(langgraph_flow, "_checkpointer", BoundedSqliteSaver(path=str(tmp_path / "checkpoints.db")))
+    monkeypatch.setattr(langgraph_flow, "_app", None)
+    monkeypatch.setattr(langgraph_flow, "PRECHECK_ENABLED", False)
+    monkeypatch.setattr(analysis_cache, "_shared_cache", analysis_cache._NoCache())
+    monkeypatch.setattr(quality, "DUPLICATE_DISTANCE", -1)
+    return langgraph_flow
+
+
+def test_confident_wrong_product_cancels_the_vision_branches(pipeline, monkeypatch):
+    from policy_agent import WRONG_PRODUCT_RESPONSE
+
+    with SlowVisionStub(first_token=0.0, tokens_per_second=0, reply_tokens=5, verdict="WRONG_PRODUCT") as stub:
+        monkeypatch.setattr(ollama_client, "_shared_client", OllamaClient(host=stub.url))
+        cancelled = metrics.snapshot()["counters"].get("vision.cancelled", 0)
+        start = time.perf_counter()
+        result = asyncio.run(pipeline.arun_langgraph_pipeline(909, VIEWS, "images/ref.jpg", "scratched"))
+        elapsed = time.perf_counter() - start
+
+    assert result["Comparison"]["verdict"]["verdict"] == "WRONG_PRODUCT"
+    assert result["Policy"]["policy_decision"] == WRONG_PRODUCT_RESPONSE
+    assert metrics.snapshot()["counters"].get("vision.cancelled", 0) - cancelled == len(VIEWS)
+    assert elapsed < SlowVisionStub.vision_delay
@@ -0,0 +1,23 @@
+from utils.policy_index import PolicyIndex
+
+
+def make_index(tmp_path):
+    (tmp_path / "returns.txt").write_text("Returns policy\n\nItems can be returned within 30 days.\n", encoding="utf-8")
+    (tmp_path / "shipping.txt").write_text("Shipping policy\n\nDamaged parcels are replaced for free.\n", encoding="utf-8")
+    return PolicyIndex(str(tmp_path))
+
+
+def test_search_ranks_matching_chunks(tmp_path):
+    index = make_index(tmp_path)
+    results = index.search("parcel arrived damaged", top_k=1)
+    assert [file for _, file, _ in results] == ["shipping.txt"]
+    assert "Damaged parcels" in index.retrieve_text("damaged", top_k=1)
+    assert "Returns policy" not in index.retrieve_text("damaged", top_k=1)
+
+
+def test_retrieve_text_falls_back_to_all_policies(tmp_path):
+    index = make_index(tmp_path)
+    for query in ("zzz unrelated words", "", "?!"):
+        assert index.search(query) == []
+        text = index.retrieve_text(query)
+        assert "Returns policy" in text and "Shipping policy" in text
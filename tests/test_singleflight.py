@@ -0,0 +1,139 @@
+import asyncio
+import gc
+
+from utils.singleflight import KeyedLocks, StreamCoalescer
+
+
+class Producer:
+    """Async stream factory that yields one event each time `step` is set"""
+
+    def __init__(self, events):
+        self.events = events
+        self.runs = 0
+        self.cancelled = False
+        self.step = asyncio.Event()
+
+    async def stream(self):
+        self.runs += 1
+        try:
+            for event in self.events:
+                await self.step.wait()
+                self.step.clear()
+                yield event
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+
+    async def advance(self, times=1):
+        for _ in range(times):
+            self.step.set()
+            while self.step.is_set():
+                await asyncio.sleep(0)
+        await asyncio.sleep(0.01)
+
+
+async def collect(coalescer, key, producer):
+    return [event async for event in coalescer.subscribe(key, producer.stream)]
+
+
+def test_concurrent_subscribers_share_one_run():
+    async def run():
+        coalescer = StreamCoalescer("test")
+        producer = Producer(["a", "b", "c"])
+        tasks = [asyncio.create_task(collect(coalescer, "k", producer)) for _ in range(3)]
+        await asyncio.sleep(0.01)
+        await producer.advance(3)
+        results = await asyncio.gather(*tasks)
+        return producer.runs, results, coalescer.in_flight()
+
+    runs, results, in_flight = asyncio.run(run())
+    assert runs == 1
+    assert results == [["a", "b", "c"]] * 3
+    assert in_flight == 0
+
+
+def test_late_joiner_gets_a_replay():
+    async def run():
+        coalescer = StreamCoalescer("test")
+        producer = Producer(["a", "b", "c"])
+        first = asyncio.create_task(collect(coalescer, "k", producer))
+        await asyncio.sleep(0.01)
+        await producer.advance(2)
+        late = asyncio.create_task(collect(coalescer, "k", producer))
+        await asyncio.sleep(0.01)
+        await producer.advance(1)
+        return producer.runs, await first, await late
+
+    runs, first, late = asyncio.run(run())
+    assert runs == 1
+    assert first == late == ["a", "b", "c"]
+
+
+def test_finished_runs_are_not_reused():
+    async def run():
+        coalescer = StreamCoalescer("test")
+        producer = Producer(["a"])
+        for _ in range(2):
+            task = asyncio.create_task(collect(coalescer, "k", producer))
+            await asyncio.sleep(0.01)
+            await producer.advance()
+            await task
+        return producer.runs
+
+    assert asyncio.run(run()) == 2
+
+
+def test_producer_is_cancelled_when_the_last_subscriber_leaves():
+    async def run():
+        coalescer = StreamCoalescer("test")
+        producer = Producer(["a", "b"])
+        tasks = [asyncio.create_task(collect(coalescer, "k", producer)) for _ in range(2)]
+        await asyncio.sleep(0.01)
+        tasks[0].cancel()
+        await asyncio.sleep(0.01)
+        cancelled_with_one_left = producer.cancelled
+        tasks[1].cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await asyncio.sleep(0.01)
+        return cancelled_with_one_left, producer.cancelled, coalescer.in_flight()
+
+    cancelled_with_one_left, cancelled, in_flight = asyncio.run(run())
+    assert not cancelled_with_one_left
+    assert cancelled
+    assert in_flight == 0
+
+
+def test_producer_errors_reach_every_subscriber():
+    async def failing():
+        yield "a"
+        raise RuntimeError("backend down")
+
+    async def run():
+        coalescer = StreamCoalescer("test")
+        received = []
+
+        async def subscriber():
+            async for event in coalescer.subscribe("k", failing):
+                received.append(event)
+
+        return received, await asyncio.gather(subscriber(), subscriber(), return_exceptions=True)
+
+    received, results = asyncio.run(run())
+    assert received == ["a", "a"]
+    assert all(isinstance(result, RuntimeError) for result in results)
+
+
+def test_keyed_locks_are_shared_per_key_and_dropped_when_unused():
+    async def run():
+        locks = KeyedLocks()
+        lock = locks.get("k")
+        same, other = locks.get("k") is lock, locks.get("j") is lock
+        async with lock:
+            pass
+        del lock
+        gc.collect()
+        return same, other, len(locks._locks)
+
+    same, other, remaining = asyncio.run(run())
+    assert same and not other
+    assert remaining == 0
@@ -0,0 +1,115 @@
+import asyncio
+
+from utils.speculative import SpeculativeJobs
+
+
+class Runner:
+    """Prepares an image once `release` is set, recording started and cancelled runs"""
+
+    def __init__(self):
+        self.started = []
+        self.cancelled = []
+        self.release = asyncio.Event()
+
+    async def __call__(self, image):
+        self.started.append(image)
+        try:
+            await self.release.wait()
+        except asyncio.CancelledError:
+            self.cancelled.append(image)
+            raise
+        return f"prepared {image}"
+
+
+def run(scenario, **kwargs):
+    async def main():
+        runner = Runner()
+        return await scenario(runner, SpeculativeJobs(runner, **kwargs))
+    return asyncio.run(main())
+
+
+def test_take_waits_for_the_job_and_consumes_it():
+    async def scenario(runner, jobs):
+        jobs.start("s", "front", "a.jpg")
+        jobs.start("s", "front", "a.jpg")
+        take = asyncio.create_task(jobs.take("s", "front", "a.jpg"))
+        await asyncio.sleep(0.01)
+        runner.release.set()
+        return runner.started, await take, await jobs.take("s", "front", "a.jpg"), len(jobs)
+
+    started, result, again, remaining = run(scenario)
+    assert started == ["a.jpg"]
+    assert result == "prepared a.jpg"
+    assert again is None
+    assert remaining == 0
+
+
+def test_new_image_replaces_the_running_job():
+    async def scenario(runner, jobs):
+        jobs.start("s", "front", "a.jpg")
+        await asyncio.sleep(0)
+        jobs.start("s", "front", "b.jpg")
+        runner.release.set()
+        await asyncio.sleep(0.01)
+        return list(runner.cancelled), await jobs.take("s", "front", "a.jpg"), await jobs.take("s", "front", "b.jpg")
+
+    cancelled, old, new = run(scenario)
+    assert cancelled == ["a.jpg"]
+    assert old is None
+    assert new == "prepared b.jpg"
+
+
+def test_untaken_jobs_expire_after_the_ttl():
+    async def scenario(runner, jobs):
+        jobs.start("s", "front", "a.jpg")
+        await asyncio.sleep(0.1)
+        return list(runner.cancelled), len(jobs), await jobs.take("s", "front", "a.jpg")
+
+    cancelled, remaining, result = run(scenario, ttl=0.05)
+    assert cancelled == ["a.jpg"]
+    assert remaining == 0
+    assert result is None
+
+
+def test_oldest_job_is_dropped_beyond_max_jobs():
+    async def scenario(runner, jobs):
+        for i, session in enumerate(["s1", "s2", "s3"]):
+            jobs.start(session, "front", f"{i}.jpg")
+            await asyncio.sleep(0)
+        await asyncio.sleep(0.01)
+        return list(runner.cancelled), len(jobs)
+
+    cancelled, remaining = run(scenario, max_jobs=2)
+    assert cancelled == ["0.jpg"]
+    assert remaining == 2
+
+
+def test_cancel_drops_every_job_of_the_session_only():
+    async def scenario(runner, jobs):
+        jobs.start("s1", "front", "a.jpg")
+        jobs.start("s1", "back", "b.jpg")
+        jobs.start("s2", "front", "c.jpg")
+        await asyncio.sleep(0)
+        jobs.cancel("s1")
+        await asyncio.sleep(0.01)
+        runner.release.set()
+        return sorted(runner.cancelled), await jobs.take("s2", "front", "c.jpg")
+
+    cancelled, kept = run(scenario)
+    assert cancelled == ["a.jpg", "b.jpg"]
+    assert kept == "prepared c.jpg"
+
+
+def test_cancelled_taker_leaves_the_job_for_the_next_submit():
+    async def scenario(runner, jobs):
+        jobs.start("s", "front", "a.jpg")
+        take = asyncio.create_task(jobs.take("s", "front", "a.jpg"))
+        await asyncio.sleep(0.01)
+        take.cancel()
+        await asyncio.gather(take, return_exceptions=True)
+        runner.release.set()
+        return list(runner.cancelled), await jobs.take("s", "front", "a.jpg")
+
+    cancelled, result = run(scenario)
+    assert cancelled == []
+    assert result == "prepared a.jpg"
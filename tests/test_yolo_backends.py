@@ -0,0 +1,82 @@
+import numpy as np
+import pytest
+from PIL import Image
+
+from utils.yolo_backends import _ExportedYOLO, letterbox, postprocess
+
+IMGSZ = 640
+
+
+def raw_output(boxes, classes=2, anchors=16):
+    """YOLOv8-shaped output (1, 4 + classes, anchors) from (cx, cy, w, h, class, score) rows"""
+    output = np.zeros((1, 4 + classes, anchors), dtype=np.float32)
+    for i, (cx, cy, w, h, cls, score) in enumerate(boxes):
+        output[0, :4, i] = (cx, cy, w, h)
+        output[0, 4 + cls, i] = score
+    return output
+
+
+def meta_for(size):
+    _, scale, pad = letterbox(Image.new("RGB", size), IMGSZ)
+    return [(scale, pad, size)]
+
+
+def test_letterbox_parameters():
+    _, scale, pad = letterbox(Image.new("RGB", (1280, 640)), IMGSZ)
+    assert scale == 0.5
+    assert pad == (0, 160)
+
+
+def test_boxes_are_mapped_back_to_the_original_image():
+    (result,) = postprocess(raw_output([(320, 320, 200, 100, 0, 0.9)]), meta_for((1280, 640)))
+    np.testing.assert_allclose(result.boxes.xyxy, [[440, 220, 840, 420]], atol=1e-3)
+    np.testing.assert_allclose(result.boxes.conf, [0.9])
+    assert result.boxes.cls.tolist() == [0]
+
+
+def test_nms_keeps_the_best_of_overlapping_boxes_of_one_class():
+    output = raw_output([
+        (320, 320, 200, 200, 0, 0.6),
+        (325, 322, 200, 200, 0, 0.9),     # same object, higher score
+        (100, 500, 50, 50, 0, 0.7),       # separate object
+        (320, 320, 200, 200, 1, 0.5),     # same place, other class: not suppressed
+        (500, 100, 40, 40, 0, 0.1),       # below the confidence threshold
+    ])
+    (result,) = postprocess(output, meta_for((640, 640)), conf_threshold=0.25, iou_threshold=0.7)
+    np.testing.assert_allclose(result.boxes.conf, [0.9, 0.7, 0.5])
+    assert result.boxes.cls.tolist() == [0, 0, 1]
+    np.testing.assert_allclose(result.boxes.xyxy[0], [225, 222, 425, 422], atol=1e-3)
+
+
+def test_boxes_are_clipped_to_the_image():
+    (result,) = postprocess(raw_output([(20, 20, 100, 100, 0, 0.8)]), meta_for((640, 640)))
+    np.testing.assert_allclose(result.boxes.xyxy, [[0, 0, 70, 70]], atol=1e-3)
+
+
+def test_no_detection():
+    (result,) = postprocess(raw_output([]), meta_for((640, 480)))
+    assert len(result.boxes.xyxy) == 0
+
+
+def test_backend_without_infer_cannot_be_instantiated():
+    class Incomplete(_ExportedYOLO):
+        pass
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+
+def test_call_runs_fixed_batch_models_one_image_at_a_time():
+    class Fixed(_ExportedYOLO):
+        def __init__(self):
+            self.batches = []
+
+        def _infer(self, batch):
+            self.batches.append(batch.shape)
+            return raw_output([(320, 320, 200, 200, 0, 0.9)])
+
+    model = Fixed()
+    results = model([Image.new("RGB", (640, 640)), Image.new("RGB", (1280, 640))])
+    assert model.batches == [(1, 3, IMGSZ, IMGSZ)] * 2
+    np.testing.assert_allclose(results[0].boxes.xyxy, [[220, 220, 420, 420]], atol=1e-3)
+    np.testing.assert_allclose(results[1].boxes.xyxy, [[440, 120, 840, 520]], atol=1e-3)
@@ -0,0 +1,194 @@
+import asyncio
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+from PIL import Image
+
+from utils import metrics
+from utils.image_prep import ImageBuffer
+
+CACHE_ENABLED = os.environ.get("FAULTLENS_CACHE_ENABLED", "1") != "0"
+CACHE_PATH = os.environ.get("FAULTLENS_CACHE_PATH", "analysis_cache.db")
+CACHE_TTL = float(os.environ.get("FAULTLENS_CACHE_TTL", str(7 * 24 * 3600)))
+CACHE_MAX_ENTRIES = int(os.environ.get("FAULTLENS_CACHE_MAX_ENTRIES", "10000"))
+CACHE_USE_PHASH = os.environ.get("FAULTLENS_CACHE_PHASH", "0") == "1"
+
+
+def _read_bytes(image):
+    if isinstance(image, (bytes, bytearray)):
+        return bytes(image)
+    with open(image, "rb") as f:
+        return f.read()
+
+
+def perceptual_hash(image, hash_size=8):
+    """
+    dHash of an image: stays the same when a photo is re-encoded or slightly resized
+    Args:
+        image: str path or PIL.Image
+    Returns:
+        str: hex digest
+    """
+    img = image if isinstance(image, Image.Image) else Image.open(image)
+    small = img.convert("L").resize((hash_size + 1, hash_size), Image.LANCZOS)
+    pixels = list(small.getdata())
+    bits = 0
+    for row in range(hash_size):
+        for col in range(hash_size):
+            left = pixels[row * (hash_size + 1) + col]
+            right = pixels[row * (hash_size + 1) + col + 1]
+            bits = (bits << 1) | (left > right)
+    return f"{bits:0{hash_size * hash_size // 4}x}"
+
+
+def image_digest(image, use_phash=False):
+    """Content hash of an image path / bytes / ImageBuffer (perceptual hash if use_phash)"""
+    if isinstance(image, ImageBuffer):
+        return "p:" + perceptual_hash(image.image) if use_phash else image.digest
+    if use_phash and not isinstance(image, (bytes, bytearray)):
+        return "p:" + perceptual_hash(image)
+    return "s:" + hashlib.sha256(_read_bytes(image)).hexdigest()
+
+
+class AnalysisCache:
+    """
+    On-disk SQLite cache for model answers, keyed by image content + model + prompt.
+    Entries expire after `ttl` seconds and the least recently used ones are
+    evicted once the table grows beyond `max_entries`.
+    """
+
+    def __init__(self, path=None, ttl=None, max_entries=None, use_phash=None):
+        self.path = path or CACHE_PATH
+        self.ttl = CACHE_TTL if ttl is None else ttl
+        self.max_entries = CACHE_MAX_ENTRIES if max_entries is None else max_entries
+        self.use_phash = CACHE_USE_PHASH if use_phash is None else use_phash
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("""
+        CREATE TABLE IF NOT EXISTS analysis_cache (
+            key TEXT PRIMARY KEY,
+            response TEXT,
+            created_at REAL,
+            last_access REAL
+        )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_cache_last_access ON analysis_cache(last_access)")
+        self._conn.commit()
+
+    def make_key(self, model, prompt, images=None):
+        if isinstance(images, (str, bytes, bytearray, ImageBuffer)):
+            images = [images]
+        h = hashlib.sha256()
+        h.update(model.encode("utf-8"))
+        h.update(b"\0")
+        h.update(prompt.encode("utf-8"))
+        for image in images or []:
+            h.update(b"\0")
+            h.update(image_digest(image, self.use_phash).encode("ascii"))
+        return h.hexdigest()
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response, created_at FROM analysis_cache WHERE key=?", (key,)
+            ).fetchone()
+            if row and (self.ttl <= 0 or now - row[1] <= self.ttl):
+                self._conn.execute("UPDATE analysis_cache SET last_access=? WHERE key=?", (now, key))
+                self._conn.commit()
+                self.hits += 1
+                metrics.increment("cache.analysis.hits")
+                return row[0]
+            if row:
+                self._conn.execute("DELETE FROM analysis_cache WHERE key=?", (key,))
+                self._conn.commit()
+            self.misses += 1
+            metrics.increment("cache.analysis.misses")
+            return None
+
+    def set(self, key, response):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO analysis_cache (key, response, created_at, last_access) VALUES (?, ?, ?, ?)",
+                (key, response, now, now),
+            )
+            self._evict(now)
+            self._conn.commit()
+
+    def _evict(self, now):
+        if self.ttl > 0:
+            self._conn.execute("DELETE FROM analysis_cache WHERE created_at < ?", (now - self.ttl,))
+        if self.max_entries > 0:
+            self._conn.execute("""
+            DELETE FROM analysis_cache WHERE key IN (
+                SELECT key FROM analysis_cache ORDER BY last_access DESC LIMIT -1 OFFSET ?
+            )
+            """, (self.max_entries,))
+
+    async def aget_or_compute(self, model, prompt, images, compute):
+        """
+        Return the cached answer for (model, prompt, images) or await compute() and store it.
+        SQLite work runs in a thread
+        """
+        key = await asyncio.to_thread(self.make_key, model, prompt, images)
+        cached = await asyncio.to_thread(self.get, key)
+        if cached is not None:
+            print(f"--- Cache hit ({self.hits} hits / {self.misses} misses) ---")
+            return cached
+        response = await compute()
+        if response:
+            await asyncio.to_thread(self.set, key, response)
+        return response
+
+    def stats(self):
+        with self._lock:
+            size = self._conn.execute("SELECT COUNT(*) FROM analysis_cache").fetchone()[0]
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": size,
+        }
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM analysis_cache")
+            self._conn.commit()
+            self.hits = 0
+            self.misses = 0
+
+
+class _NoCache:
+    """Stand-in used when FAULTLENS_CACHE_ENABLED=0"""
+    hits = 0
+    misses = 0
+
+    async def aget_or_compute(self, model, prompt, images, compute):
+        return await compute()
+
+    def stats(self):
+        return {"hits": 0, "misses": 0, "hit_rate": 0.0, "entries": 0}
+
+    def clear(self):
+        pass
+
+
+_shared_cache = None
+_shared_lock = threading.Lock()
+
+
+def get_cache():
+    """Process-wide analysis cache, created on first use."""
+    global _shared_cache
+    if _shared_cache is None:
+        with _shared_lock:
+            if _shared_cache is None:
+                _shared_cache = AnalysisCache() if CACHE_ENABLED else _NoCache()
+    return _shared_cache
@@ -0,0 +1,143 @@
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+from langgraph.checkpoint.sqlite import SqliteSaver
+
+CHECKPOINT_PATH = os.environ.get("FAULTLENS_CHECKPOINT_PATH", "checkpoints.db")
+CHECKPOINT_KEEP = int(os.environ.get("FAULTLENS_CHECKPOINT_KEEP", "4"))
+CHECKPOINT_TTL = float(os.environ.get("FAULTLENS_CHECKPOINT_TTL", str(7 * 24 * 3600)))
+CHECKPOINT_MAX_THREADS = int(os.environ.get("FAULTLENS_CHECKPOINT_MAX_THREADS", "10000"))
+CHECKPOINT_EVICT_EVERY = 100  # puts between TTL/LRU sweeps
+
+
+class CompressedSerializer:
+    """Wraps a langgraph serializer and zlib-compresses every typed payload"""
+
+    PREFIX = "z:"
+
+    def __init__(self, serde=None, level=6):
+        self.serde = serde or JsonPlusSerializer()
+        self.level = level
+
+    def dumps(self, obj):
+        return self.serde.dumps(obj)
+
+    def loads(self, data):
+        return self.serde.loads(data)
+
+    def dumps_typed(self, obj):
+        type_, data = self.serde.dumps_typed(obj)
+        return self.PREFIX + type_, zlib.compress(data, self.level)
+
+    def loads_typed(self, data):
+        type_, payload = data
+        if type_.startswith(self.PREFIX):
+            return self.serde.loads_typed((type_[len(self.PREFIX):], zlib.decompress(payload)))
+        return self.serde.loads_typed(data)
+
+
+class BoundedSqliteSaver(SqliteSaver):
+    """
+    SqliteSaver that keeps memory and disk use flat:
+    - only the newest `max_checkpoints` checkpoints of each thread are retained
+    - threads idle for longer than `ttl` seconds are dropped
+    - at most `max_threads` threads are kept (least recently written ones go first)
+    """
+
+    def __init__(self, path=None, max_checkpoints=None, ttl=None, max_threads=None):
+        conn = sqlite3.connect(path or CHECKPOINT_PATH, check_same_thread=False)
+        super().__init__(conn, serde=CompressedSerializer())
+        # the parent checkpoint is needed to resume a run, so never keep fewer than 2
+        self.max_checkpoints = max(2, CHECKPOINT_KEEP if max_checkpoints is None else max_checkpoints)
+        self.ttl = CHECKPOINT_TTL if ttl is None else ttl
+        self.max_threads = CHECKPOINT_MAX_THREADS if max_threads is None else max_threads
+        self._puts = 0
+        self._puts_lock = threading.Lock()
+        self.setup()
+
+    def setup(self):
+        if self.is_setup:
+            return
+        super().setup()
+        self.conn.executescript("""
+        CREATE TABLE IF NOT EXISTS thread_activity (
+            thread_id TEXT PRIMARY KEY,
+            last_access REAL
+        );
+        CREATE INDEX IF NOT EXISTS idx_thread_activity_last_access ON thread_activity(last_access);
+        """)
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        saved = super().put(config, checkpoint, metadata, new_versions)
+        thread_id = str(saved["configurable"]["thread_id"])
+        checkpoint_ns = saved["configurable"]["checkpoint_ns"]
+
+        with self.cursor() as cur:
+            cur.execute(
+                "INSERT OR REPLACE INTO thread_activity (thread_id, last_access) VALUES (?, ?)",
+                (thread_id, time.time()),
+            )
+            cur.execute("""
+            DELETE FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id NOT IN (
+                SELECT checkpoint_id FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ?
+                ORDER BY checkpoint_id DESC LIMIT ?
+            )
+            """, (thread_id, checkpoint_ns, thread_id, checkpoint_ns, self.max_checkpoints))
+            cur.execute("""
+            DELETE FROM writes WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id NOT IN (
+                SELECT checkpoint_id FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ?
+            )
+            """, (thread_id, checkpoint_ns, thread_id, checkpoint_ns))
+
+        with self._puts_lock:
+            self._puts += 1
+            sweep = self._puts % CHECKPOINT_EVICT_EVERY == 0
+        if sweep:
+            self.evict()
+        return saved
+
+    def evict(self):
+        """Drop threads past their TTL, then the least recently written ones beyond max_threads"""
+        stale = []
+        with self.cursor(transaction=False) as cur:
+            if self.ttl > 0:
+                cur.execute("SELECT thread_id FROM thread_activity WHERE last_access < ?", (time.time() - self.ttl,))
+                stale += [row[0] for row in cur.fetchall()]
+            if self.max_threads > 0:
+                cur.execute(
+                    "SELECT thread_id FROM thread_activity ORDER BY last_access DESC LIMIT -1 OFFSET ?",
+                    (self.max_threads,),
+                )
+                stale += [row[0] for row in cur.fetchall()]
+        for thread_id in set(stale):
+            self.delete_thread(thread_id)
+        if stale:
+            print(f"--- Checkpointer: evicted {len(set(stale))} old threads ---")
+
+    def delete_thread(self, thread_id):
+        super().delete_thread(thread_id)
+        with self.cursor() as cur:
+            cur.execute("DELETE FROM thread_activity WHERE thread_id = ?", (str(thread_id),))
+
+    # --- async API (SqliteSaver is sync-only; run it off the event loop) ---
+
+    async def aget_tuple(self, config):
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(self, config, *, filter=None, before=None, limit=None):
+        items = await asyncio.to_thread(
+            lambda: list(self.list(config, filter=filter, before=before, limit=limit))
+        )
+        for item in items:
+            yield item
+
+    async def aput(self, config, checkpoint, metadata, new_versions):
+        return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config, writes, task_id, task_path=""):
+        return await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
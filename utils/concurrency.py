@@ -0,0 +1,132 @@
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+
+from utils import metrics
+
+# Max simultaneous calls per model backend, shared by every request in the process
+LIMITS = {
+    "yolo": int(os.environ.get("FAULTLENS_YOLO_CONCURRENCY", "1")),
+    "vlm": int(os.environ.get("FAULTLENS_VLM_CONCURRENCY", "2")),
+    "llm": int(os.environ.get("FAULTLENS_LLM_CONCURRENCY", "2")),
+    # upload-time jobs running ahead of Submit, kept low so they never crowd out submissions
+    "speculative": int(os.environ.get("FAULTLENS_SPECULATIVE_CONCURRENCY", "2")),
+}
+
+
+class _Waiter:
+    __slots__ = ("wake", "granted")
+
+    def __init__(self, wake):
+        self.wake = wake
+        self.granted = False
+
+
+class ResourceLimiter:
+    """
+    Process-wide concurrency limit for one backend.
+    Sync callers (threads) and async callers (any event loop) share the same
+    FIFO queue, and a released slot is handed directly to the next waiter.
+    Priority waiters go to the front of the queue (calls on a request's critical path).
+    """
+
+    def __init__(self, name, limit):
+        self.name = name
+        self.limit = max(1, limit)
+        self._available = self.limit
+        self._waiters = deque()
+        self._lock = threading.Lock()
+
+    @property
+    def in_use(self):
+        return self.limit - self._available
+
+    @property
+    def waiting(self):
+        return len(self._waiters)
+
+    def _enqueue(self, waiter, priority):
+        if priority:
+            self._waiters.appendleft(waiter)
+        else:
+            self._waiters.append(waiter)
+
+    def acquire(self, priority=False):
+        with self._lock:
+            if self._available > 0 and not self._waiters:
+                self._available -= 1
+                metrics.observe(f"queue_wait.{self.name}", 0.0)
+                return
+            event = threading.Event()
+            self._enqueue(_Waiter(event.set), priority)
+        start = time.perf_counter()
+        event.wait()
+        metrics.observe(f"queue_wait.{self.name}", time.perf_counter() - start)
+
+    async def aacquire(self, priority=False):
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if self._available > 0 and not self._waiters:
+                self._available -= 1
+                metrics.observe(f"queue_wait.{self.name}", 0.0)
+                return
+            future = loop.create_future()
+
+            def wake():
+                loop.call_soon_threadsafe(lambda: future.done() or future.set_result(None))
+
+            waiter = _Waiter(wake)
+            self._enqueue(waiter, priority)
+        start = time.perf_counter()
+        try:
+            await future
+            metrics.observe(f"queue_wait.{self.name}", time.perf_counter() - start)
+        except asyncio.CancelledError:
+            with self._lock:
+                if not waiter.granted:
+                    self._waiters.remove(waiter)
+                    raise
+            # the slot was already handed to us: pass it on
+            self.release()
+            raise
+
+    def release(self):
+        with self._lock:
+            if self._waiters:
+                waiter = self._waiters.popleft()
+                waiter.granted = True
+                waiter.wake()
+            else:
+                self._available += 1
+
+    @contextmanager
+    def hold(self, priority=False):
+        self.acquire(priority)
+        try:
+            yield
+        finally:
+            self.release()
+
+    @asynccontextmanager
+    async def ahold(self, priority=False):
+        await self.aacquire(priority)
+        try:
+            yield
+        finally:
+            self.release()
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def limiter(name):
+    """Shared ResourceLimiter for `name` ("yolo", "vlm", "llm", "speculative")"""
+    if name not in _limiters:
+        with _limiters_lock:
+            if name not in _limiters:
+                _limiters[name] = ResourceLimiter(name, LIMITS.get(name, 1))
+    return _limiters[name]
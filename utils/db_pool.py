@@ -0,0 +1,107 @@
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+DB_POOL_SIZE = int(os.environ.get("FAULTLENS_DB_POOL_SIZE", "8"))
+DB_BUSY_TIMEOUT = float(os.environ.get("FAULTLENS_DB_BUSY_TIMEOUT", "5"))
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of SQLite connections to one database file.
+    Connections run in WAL mode, so readers never block on a writer (and vice versa),
+    and each keeps its own cache of prepared statements for the hot lookups.
+    """
+
+    def __init__(self, path, size=None, timeout=None):
+        self.path = path
+        self.size = max(1, DB_POOL_SIZE if size is None else size)
+        self.timeout = DB_BUSY_TIMEOUT if timeout is None else timeout
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def _connect(self):
+        conn = sqlite3.connect(
+            self.path, timeout=self.timeout, check_same_thread=False, cached_statements=256,
+        )
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA busy_timeout={int(self.timeout * 1000)}")
+        return conn
+
+    def _checkout(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._created < self.size:
+                self._created += 1
+                create = True
+            else:
+                create = False
+        if create:
+            try:
+                return self._connect()
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+        return self._idle.get()
+
+    def _checkin(self, conn):
+        if self._closed:
+            conn.close()
+        else:
+            self._idle.put(conn)
+
+    @contextmanager
+    def connection(self):
+        """
+        Borrow a connection for one unit of work: committed on success, rolled back on error
+        """
+        conn = self._checkout()
+        try:
+            yield conn
+            if conn.in_transaction:
+                conn.commit()
+        except BaseException:
+            if conn.in_transaction:
+                conn.rollback()
+            raise
+        finally:
+            self._checkin(conn)
+
+    def execute(self, sql, params=()):
+        with self.connection() as conn:
+            return conn.execute(sql, params).fetchall()
+
+    def fetchone(self, sql, params=()):
+        with self.connection() as conn:
+            return conn.execute(sql, params).fetchone()
+
+    def close(self):
+        self._closed = True
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(path):
+    """Shared ConnectionPool for the database at `path`"""
+    key = os.path.abspath(path)
+    if key not in _pools:
+        with _pools_lock:
+            if key not in _pools:
+                _pools[key] = ConnectionPool(path)
+    return _pools[key]
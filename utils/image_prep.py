@@ -0,0 +1,220 @@
+import base64
+import hashlib
+import io
+import math
+import os
+import tempfile
+import threading
+from dataclasses import dataclass
+from typing import Optional
+
+from PIL import Image, ImageDraw, ImageOps
+
+IMAGE_MAX_SIDE = int(os.environ.get("FAULTLENS_IMAGE_MAX_SIDE", "1024"))
+IMAGE_QUALITY = int(os.environ.get("FAULTLENS_IMAGE_QUALITY", "85"))
+MOSAIC_TILE = int(os.environ.get("FAULTLENS_MOSAIC_TILE", "512"))
+NORMALIZED_DIR = os.environ.get("FAULTLENS_NORMALIZED_DIR") or os.path.join(tempfile.gettempdir(), "faultlens_normalized")
+# crops stay in memory; set this to also keep a JPEG copy of every one for auditing
+AUDIT_DIR = os.environ.get("FAULTLENS_AUDIT_DIR") or None
+
+_MEMO_MAX_ENTRIES = 4096
+_memo = {}
+_memo_lock = threading.Lock()
+
+
+def load_oriented(image_path):
+    """Open an image with its EXIF orientation applied, as RGB"""
+    img = Image.open(image_path)
+    return ImageOps.exif_transpose(img).convert("RGB")
+
+
+@dataclass(eq=False)
+class ImageBuffer:
+    """
+    An image ready for the models, held in memory and shared by every stage without copies:
+    the decoded PIL image plus one encoded JPEG (and its base64 form) reused by every LLM call.
+    Only `digest` and `path` are dataclass fields, so a graph checkpoint stores a few bytes
+    instead of the pixels; a restored buffer reads its JPEG back from `path` when there is one.
+    """
+    digest: str                 # "s:<sha256 of the JPEG>", same form as analysis_cache.image_digest
+    path: Optional[str] = None  # JPEG on disk (audit copy / normalized file), if any
+
+    def __post_init__(self):
+        self._image = None
+        self._jpeg = None
+        self._b64 = None
+
+    @classmethod
+    def from_jpeg(cls, jpeg, image=None, path=None):
+        buffer = cls("s:" + hashlib.sha256(jpeg).hexdigest(), path)
+        buffer._jpeg = jpeg
+        buffer._image = image
+        return buffer
+
+    @classmethod
+    def from_image(cls, img, quality=None):
+        """Encode a decoded RGB image once"""
+        out = io.BytesIO()
+        img.save(out, format="JPEG", quality=IMAGE_QUALITY if quality is None else quality, optimize=True)
+        return cls.from_jpeg(out.getvalue(), image=img)
+
+    @property
+    def jpeg(self):
+        if self._jpeg is None:
+            if not self.path:
+                raise ValueError("ImageBuffer has no data: restored from a checkpoint without a copy on disk")
+            with open(self.path, "rb") as f:
+                self._jpeg = f.read()
+        return self._jpeg
+
+    @property
+    def image(self):
+        if self._image is None:
+            self._image = Image.open(io.BytesIO(self.jpeg)).convert("RGB")
+        return self._image
+
+    @property
+    def b64(self):
+        """Base64 payload for the Ollama API, encoded on first use"""
+        if self._b64 is None:
+            self._b64 = base64.b64encode(self.jpeg).decode("ascii")
+        return self._b64
+
+    def save(self, directory=None):
+        """Write the JPEG once (content-addressed) and return its path"""
+        if self.path is None:
+            directory = directory or AUDIT_DIR or NORMALIZED_DIR
+            os.makedirs(directory, exist_ok=True)
+            path = os.path.join(directory, f"{self.digest[2:]}.jpg")
+            if not os.path.exists(path):
+                tmp_path = f"{path}.{threading.get_ident()}.tmp"
+                with open(tmp_path, "wb") as f:
+                    f.write(self.jpeg)
+                os.replace(tmp_path, path)
+            self.path = path
+        return self.path
+
+
+def as_image(image):
+    """Decoded RGB image of an ImageBuffer, PIL image or path"""
+    if isinstance(image, ImageBuffer):
+        return image.image
+    if isinstance(image, Image.Image):
+        return image
+    return load_oriented(image)
+
+
+def prepare_image(img, max_side=None, quality=None):
+    """
+    In-memory counterpart of normalize_image for an already decoded image (e.g. a YOLO crop):
+    cap the long side and encode once. Nothing touches the disk unless FAULTLENS_AUDIT_DIR is set.
+    Args:
+        img: PIL.Image, RGB with EXIF orientation applied (resized in place)
+    Returns:
+        ImageBuffer
+    """
+    max_side = IMAGE_MAX_SIDE if max_side is None else max_side
+    if max(img.size) > max_side:
+        img.thumbnail((max_side, max_side), Image.LANCZOS)
+    buffer = ImageBuffer.from_image(img, quality)
+    if AUDIT_DIR:
+        buffer.save(AUDIT_DIR)
+    return buffer
+
+
+def _memo_key(image_path, max_side, quality):
+    st = os.stat(image_path)
+    return (os.path.abspath(image_path), st.st_mtime_ns, st.st_size, max_side, quality)
+
+
+def normalize_image(image_path, max_side=None, quality=None):
+    """
+    Prepare an image for the VLM: apply EXIF orientation, cap the long side and re-encode as JPEG.
+    The result is memoized per source file (path + mtime + size + settings), in memory and on disk.
+    Args:
+        image_path: str
+        max_side: int, optional, longest side in pixels
+        quality: int, optional, JPEG quality
+    Returns:
+        str: path of the normalized JPEG
+    """
+    max_side = IMAGE_MAX_SIDE if max_side is None else max_side
+    quality = IMAGE_QUALITY if quality is None else quality
+
+    key = _memo_key(image_path, max_side, quality)
+    cached = _memo.get(key)
+    if cached and os.path.exists(cached):
+        return cached
+
+    digest = hashlib.sha1(repr(key).encode("utf-8")).hexdigest()
+    out_path = os.path.join(NORMALIZED_DIR, f"{digest}.jpg")
+
+    if not os.path.exists(out_path):
+        os.makedirs(NORMALIZED_DIR, exist_ok=True)
+        img = load_oriented(image_path)
+        if max(img.size) > max_side:
+            img.thumbnail((max_side, max_side), Image.LANCZOS)
+        # write then rename, so a concurrent reader never sees a half-written file
+        tmp_path = f"{out_path}.{threading.get_ident()}.tmp"
+        img.save(tmp_path, format="JPEG", quality=quality, optimize=True)
+        os.replace(tmp_path, out_path)
+
+    with _memo_lock:
+        if len(_memo) >= _MEMO_MAX_ENTRIES:
+            _memo.clear()
+        _memo[key] = out_path
+    return out_path
+
+
+_buffers = {}
+
+
+def load_prepared(image_path):
+    """
+    ImageBuffer of normalize_image(image_path), memoized in memory so a file used by many
+    requests (e.g. a reference image) is read and base64-encoded once per process
+    """
+    normalized = normalize_image(image_path)
+    buffer = _buffers.get(normalized)
+    if buffer is None:
+        with open(normalized, "rb") as f:
+            buffer = ImageBuffer.from_jpeg(f.read(), path=normalized)
+        with _memo_lock:
+            if len(_buffers) >= _MEMO_MAX_ENTRIES // 16:
+                _buffers.clear()
+            _buffers[normalized] = buffer
+    return buffer
+
+
+def build_mosaic(image_paths, labels=None, tile=None, quality=None):
+    """
+    Tile several images into one labelled grid, for backends that accept a single image per request
+    Args:
+        image_paths: list of str paths or ImageBuffer
+        labels: list of str, optional, drawn in the corner of each cell (default "1", "2", ...)
+        tile: int, optional, cell size in pixels
+        quality: int, optional, JPEG quality
+    Returns:
+        bytes: the encoded JPEG mosaic
+    """
+    tile = MOSAIC_TILE if tile is None else tile
+    quality = IMAGE_QUALITY if quality is None else quality
+    labels = labels or [str(i + 1) for i in range(len(image_paths))]
+    cols = math.ceil(math.sqrt(len(image_paths)))
+    rows = math.ceil(len(image_paths) / cols)
+
+    mosaic = Image.new("RGB", (cols * tile, rows * tile), "white")
+    draw = ImageDraw.Draw(mosaic)
+    for i, (image_path, label) in enumerate(zip(image_paths, labels)):
+        img = as_image(image_path).copy()
+        img.thumbnail((tile, tile), Image.LANCZOS)
+        x, y = (i % cols) * tile, (i // cols) * tile
+        mosaic.paste(img, (x + (tile - img.width) // 2, y + (tile - img.height) // 2))
+        text = f"{i + 1}: {label}"
+        box = draw.textbbox((x + 6, y + 6), text)
+        draw.rectangle((box[0] - 4, box[1] - 4, box[2] + 4, box[3] + 4), fill="black")
+        draw.text((x + 6, y + 6), text, fill="white")
+
+    buffer = io.BytesIO()
+    mosaic.save(buffer, format="JPEG", quality=quality, optimize=True)
+    return buffer.getvalue()
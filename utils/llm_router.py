@@ -0,0 +1,350 @@
+"""
+Route model calls across several Ollama servers.
+
+Backends come from FAULTLENS_LLM_BACKENDS, either a JSON list (inline or a path to a .json file):
+
+    [{"host": "http://gpu-1:11434", "models": ["qwen2.5vl:7b"], "max_concurrency": 2, "weight": 2},
+     {"host": "http://cpu-1:11434", "models": ["phi3", "llama3.2:3b"], "max_concurrency": 4}]
+
+or a comma-separated list of hosts that serve every model. Each request goes to the healthy
+backend serving its model with the fewest outstanding requests (relative to its weight);
+a backend that fails (connection error, 5xx) is taken out of rotation until its next successful
+health check, and the request fails over to the next candidate. Requests that continue a
+conversation from its `context` tokens stay on the backend that produced them.
+"""
+import asyncio
+import json
+import os
+import threading
+from collections import OrderedDict
+
+import httpx
+
+from utils import metrics
+from utils.concurrency import ResourceLimiter
+from utils.ollama_client import ContextLost, OllamaClient, OllamaError
+
+LLM_BACKENDS = os.environ.get("FAULTLENS_LLM_BACKENDS", "")
+LLM_HEALTH_INTERVAL = float(os.environ.get("FAULTLENS_LLM_HEALTH_INTERVAL", "15"))
+# conversations whose backend is remembered for `context` continuations (least recent dropped first)
+LLM_CONTEXT_OWNERS = int(os.environ.get("FAULTLENS_LLM_CONTEXT_OWNERS", "4096"))
+
+
+class Backend:
+    """
+    One Ollama server
+    Args:
+        host: str
+        models: list of str, optional, models it serves (None = whatever /api/tags reports)
+        max_concurrency: int, requests sent to it at once, extra requests queue here
+        weight: float, relative capacity used when balancing
+    """
+
+    def __init__(self, host, models=None, max_concurrency=2, weight=1.0, **client_kwargs):
+        self.client = OllamaClient(host=host, **client_kwargs)
+        self.host = self.client.host
+        self.models = set(models) if models else None
+        self.weight = max(float(weight), 1e-6)
+        self.limiter = ResourceLimiter(f"backend.{self.host}", max_concurrency)
+        self.healthy = True
+        self.reported_models = None   # from the last health check
+        self.last_error = None
+
+    @property
+    def outstanding(self):
+        return self.limiter.in_use + self.limiter.waiting
+
+    def serves(self, model):
+        if self.models is not None:
+            return model in self.models
+        if self.reported_models is None:
+            return True
+        return model in self.reported_models or model.split(":")[0] in {m.split(":")[0] for m in self.reported_models}
+
+    def load(self):
+        """Outstanding requests relative to capacity (lower is better)"""
+        return (self.outstanding + 1) / (self.limiter.limit * self.weight)
+
+    def mark_down(self, error):
+        if self.healthy:
+            print(f"--- LLM backend {self.host} marked down: {error} ---")
+        self.healthy = False
+        self.last_error = str(error)
+        metrics.increment(f"llm_router.{self.host}.failures")
+
+    def check(self):
+        """Probe /api/tags and update health / served models"""
+        try:
+            response = self.client.client.get("/api/tags", timeout=5)
+            response.raise_for_status()
+            self.reported_models = {m.get("name", "") for m in response.json().get("models", [])}
+            if not self.healthy:
+                print(f"--- LLM backend {self.host} is back ---")
+            self.healthy = True
+        except Exception as e:
+            self.mark_down(e)
+        return self.healthy
+
+    def snapshot(self):
+        return {
+            "host": self.host,
+            "healthy": self.healthy,
+            "models": sorted(self.models or self.reported_models or []),
+            "in_use": self.limiter.in_use,
+            "waiting": self.limiter.waiting,
+            "max_concurrency": self.limiter.limit,
+            "weight": self.weight,
+            "last_error": self.last_error,
+        }
+
+
+def _cause(exc):
+    """The HTTP / transport error an OllamaError wraps (the error itself otherwise)"""
+    if isinstance(exc, OllamaError) and exc.__cause__ is not None:
+        return exc.__cause__
+    return exc
+
+
+def _status_code(exc):
+    cause = _cause(exc)
+    if isinstance(cause, httpx.HTTPStatusError):
+        return cause.response.status_code
+    return None
+
+
+def _is_failover_error(exc):
+    """
+    Connection problems, server errors and 404 (model not on that server) move the request to
+    another backend. Anything else, e.g. an error the model reports inside the stream, is about
+    the request itself and goes straight to the caller.
+    """
+    status = _status_code(exc)
+    if status is not None:
+        return status >= 500 or status == 404
+    return isinstance(_cause(exc), httpx.TransportError)
+
+
+def _context_key(context):
+    return hash(tuple(context))
+
+
+class LLMRouter:
+    """
+    Drop-in replacement for OllamaClient that spreads calls over several backends.
+    Exposes the same generate / generate_stream / agenerate / agenerate_stream / ping API.
+    """
+
+    def __init__(self, backends, health_interval=None):
+        if not backends:
+            raise ValueError("LLMRouter needs at least one backend")
+        self.backends = list(backends)
+        self.health_interval = LLM_HEALTH_INTERVAL if health_interval is None else health_interval
+        self._health_thread = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._context_owners = OrderedDict()   # context key -> Backend that produced it
+
+    @classmethod
+    def from_config(cls, config, **kwargs):
+        """
+        Build from a JSON list / path to a JSON file / comma-separated host list
+        """
+        config = config.strip()
+        if config.endswith(".json") and os.path.exists(config):
+            with open(config, encoding="utf-8") as f:
+                entries = json.load(f)
+        elif config.startswith("["):
+            entries = json.loads(config)
+        else:
+            entries = [{"host": host.strip()} for host in config.split(",") if host.strip()]
+        if len(entries) > 1:
+            # fail over to the next backend right away instead of retrying the same one
+            entries = [dict({"retries": 0}, **entry) for entry in entries]
+        return cls([Backend(**entry) for entry in entries], **kwargs)
+
+    # --- health ---
+
+    def start_health_checks(self):
+        """Probe every backend now, then every `health_interval` seconds in a daemon thread"""
+        if self._health_thread is not None or self.health_interval <= 0:
+            return
+        with self._lock:
+            if self._health_thread is not None:
+                return
+            self._health_thread = threading.Thread(target=self._health_loop, name="llm-health", daemon=True)
+            self._health_thread.start()
+
+    def _health_loop(self):
+        while not self._stop.is_set():
+            for backend in self.backends:
+                backend.check()
+            self._stop.wait(self.health_interval)
+
+    def status(self):
+        return [backend.snapshot() for backend in self.backends]
+
+    # --- selection ---
+
+    def _candidates(self, model, exclude=()):
+        """Backends for `model`, least loaded first. Falls back to unhealthy ones if none is up."""
+        self.start_health_checks()
+        serving = [b for b in self.backends if b.serves(model) and b not in exclude]
+        healthy = [b for b in serving if b.healthy]
+        if not serving:
+            if not any(b.serves(model) for b in self.backends):
+                raise OllamaError(f"No LLM backend serves model '{model}'")
+            return []
+        return sorted(healthy or serving, key=lambda b: b.load())
+
+    def _pick(self, model, tried, context=None):
+        if context:
+            # `context` tokens only continue the conversation on the backend that produced them
+            self.start_health_checks()
+            backend = self._context_owner(context)
+            if backend is None or backend in tried or not backend.healthy or not backend.serves(model):
+                return None
+        else:
+            candidates = self._candidates(model, tried)
+            if not candidates:
+                return None
+            backend = candidates[0]
+        metrics.increment(f"llm_router.{backend.host}.requests")
+        return backend
+
+    def _context_owner(self, context):
+        with self._lock:
+            return self._context_owners.get(_context_key(context))
+
+    def _remember_context(self, backend, done_info):
+        context = (done_info or {}).get("context")
+        if not context:
+            return
+        key = _context_key(context)
+        with self._lock:
+            self._context_owners[key] = backend
+            self._context_owners.move_to_end(key)
+            while len(self._context_owners) > LLM_CONTEXT_OWNERS:
+                self._context_owners.popitem(last=False)
+
+    def _failed(self, backend, exc, tried):
+        # 404 = model not pulled on that server: skip it for this request, but keep it in rotation
+        if _status_code(exc) != 404:
+            backend.mark_down(exc)
+        tried.append(backend)
+        metrics.increment("llm_router.failovers")
+
+    def _no_backend(self, model, last_exc, context=None):
+        if context:
+            metrics.increment("llm_router.context_lost")
+            raise ContextLost(f"The LLM backend holding this conversation ('{model}') is unavailable") from last_exc
+        raise OllamaError(f"All LLM backends failed for model '{model}': {last_exc}") from last_exc
+
+    # --- sync API ---
+
+    def _call(self, model, fn, context=None):
+        tried, last_exc = [], None
+        while True:
+            backend = self._pick(model, tried, context)
+            if backend is None:
+                self._no_backend(model, last_exc, context)
+            try:
+                with backend.limiter.hold():
+                    return fn(backend.client)
+            except Exception as e:
+                if not _is_failover_error(e):
+                    raise
+                self._failed(backend, e, tried)
+                last_exc = e
+
+    def generate(self, model, prompt, images=None, options=None, **extra):
+        return self._call(
+            model, lambda client: client.generate(model, prompt, images, options, **extra), extra.get("context")
+        )
+
+    def generate_stream(self, model, prompt, images=None, options=None, done_info=None, **extra):
+        """Streams fail over only until the first chunk has been yielded"""
+        tried, last_exc = [], None
+        while True:
+            backend = self._pick(model, tried, extra.get("context"))
+            if backend is None:
+                self._no_backend(model, last_exc, extra.get("context"))
+            started = False
+            try:
+                with backend.limiter.hold():
+                    for chunk in backend.client.generate_stream(model, prompt, images, options, done_info, **extra):
+                        started = True
+                        yield chunk
+                self._remember_context(backend, done_info)
+                return
+            except Exception as e:
+                if started or not _is_failover_error(e):
+                    raise
+                self._failed(backend, e, tried)
+                last_exc = e
+
+    def ping(self, model):
+        """Load `model` on every healthy backend that serves it"""
+        results = []
+        for backend in self._candidates(model):
+            try:
+                results.append(backend.client.ping(model))
+            except Exception as e:
+                backend.mark_down(e)
+        if not results:
+            raise OllamaError(f"No LLM backend could load model '{model}'")
+        return results
+
+    def close(self):
+        self._stop.set()
+        for backend in self.backends:
+            backend.client.close()
+
+    # --- async API ---
+
+    async def _acall(self, model, fn, context=None):
+        tried, last_exc = [], None
+        while True:
+            backend = self._pick(model, tried, context)
+            if backend is None:
+                self._no_backend(model, last_exc, context)
+            try:
+                async with backend.limiter.ahold():
+                    return await fn(backend.client)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if not _is_failover_error(e):
+                    raise
+                self._failed(backend, e, tried)
+                last_exc = e
+
+    async def agenerate(self, model, prompt, images=None, options=None, **extra):
+        return await self._acall(
+            model, lambda client: client.agenerate(model, prompt, images, options, **extra), extra.get("context")
+        )
+
+    async def agenerate_stream(self, model, prompt, images=None, options=None, done_info=None, **extra):
+        tried, last_exc = [], None
+        while True:
+            backend = self._pick(model, tried, extra.get("context"))
+            if backend is None:
+                self._no_backend(model, last_exc, extra.get("context"))
+            started = False
+            try:
+                async with backend.limiter.ahold():
+                    async for chunk in backend.client.agenerate_stream(model, prompt, images, options, done_info, **extra):
+                        started = True
+                        yield chunk
+                self._remember_context(backend, done_info)
+                return
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if started or not _is_failover_error(e):
+                    raise
+                self._failed(backend, e, tried)
+                last_exc = e
+
+    async def aclose(self):
+        for backend in self.backends:
+            await backend.client.aclose()
@@ -1,28 +1,31 @@
-import subprocess
+import os
 
+from utils.ollama_client import get_client
+from utils.concurrency import limiter
+from utils.model_registry import register
 
-def run_qwen2vl(prompt, image_paths=None):
+# vision-language model for every call that carries images (vision, comparison)
+MODEL = os.environ.get("FAULTLENS_VISION_MODEL", "qwen2.5vl:7b")
+
+# warm-up = one empty request, which loads the model into Ollama and pins it for keep_alive
+register(MODEL, get_client, lambda client: client.ping(MODEL))
+
+
+async def arun_qwen2vl(prompt, image_paths=None, format=None, priority=False):
     """
     Run local Ollama model Qwen2.5VL
     Args:
         prompt: str
         image_paths: str or list of str, optional, if you want to pass images
+        format: "json" or a JSON schema dict, optional, constrains the reply (Ollama structured output)
+        priority: bool, jump the queue of waiting VLM calls (critical-path calls only)
     Returns:
         str: model output
     """
-    cmd = ["ollama", "run", "qwen2.5vl:7b"]
-
-    if image_paths:
-        if isinstance(image_paths, str):
-            image_paths = [image_paths]
-        cmd += image_paths
-
-    cmd.append(prompt)
-
-    result = subprocess.run(cmd, capture_output=True, text=False)
-    stdout_decoded = result.stdout.decode('utf-8', errors='replace')
-    return stdout_decoded.strip()
+    async with limiter("vlm").ahold(priority):
+        response = await get_client().agenerate(MODEL, prompt, images=image_paths, format=format)
+    return response.strip()
 
 #def run_llm_vision(prompt):
 #    output = text_generator(prompt, max_new_tokens=300, do_sample=True, temperature=0.7)
-#    return output[0]["generated_text"]
\ No newline at end of file
+#    return output[0]["generated_text"]
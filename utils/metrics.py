@@ -0,0 +1,188 @@
+import cProfile
+import functools
+import inspect
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+METRICS_PORT = int(os.environ.get("FAULTLENS_METRICS_PORT", "0"))
+PROFILE_ENABLED = os.environ.get("FAULTLENS_PROFILE", "0") == "1"
+PROFILE_DIR = os.environ.get("FAULTLENS_PROFILE_DIR", "profiles")
+HISTOGRAM_WINDOW = 2048  # most recent observations kept per histogram
+
+
+class Histogram:
+    """Sliding window of observations with percentile summaries"""
+
+    def __init__(self, window=HISTOGRAM_WINDOW):
+        self.values = deque(maxlen=window)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, value):
+        self.values.append(value)
+        self.count += 1
+        self.total += value
+
+    def percentile(self, q):
+        if not self.values:
+            return 0.0
+        ordered = sorted(self.values)
+        index = min(len(ordered) - 1, max(0, round(q / 100 * (len(ordered) - 1))))
+        return ordered[index]
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "sum": round(self.total, 6),
+            "mean": round(self.total / self.count, 6) if self.count else 0.0,
+            "p50": round(self.percentile(50), 6),
+            "p95": round(self.percentile(95), 6),
+            "p99": round(self.percentile(99), 6),
+        }
+
+
+_histograms = {}
+_counters = {}
+_lock = threading.Lock()
+
+
+def observe(name, value):
+    with _lock:
+        histogram = _histograms.get(name)
+        if histogram is None:
+            histogram = _histograms[name] = Histogram()
+        histogram.observe(value)
+
+
+def increment(name, amount=1):
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + amount
+
+
+def snapshot():
+    """All counters and histogram summaries as a JSON-friendly dict"""
+    with _lock:
+        return {
+            "counters": dict(_counters),
+            "histograms": {name: h.summary() for name, h in sorted(_histograms.items())},
+        }
+
+
+def reset():
+    with _lock:
+        _histograms.clear()
+        _counters.clear()
+
+
+def dump_json(path):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(snapshot(), f, indent=2)
+
+
+# --- Spans ---
+
+@contextmanager
+def span(name):
+    """Time a block and record it as the `span.<name>` histogram (seconds)"""
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        increment(f"span.{name}.errors")
+        raise
+    finally:
+        observe(f"span.{name}", time.perf_counter() - start)
+
+
+def traced(name):
+    """Decorator version of span() for sync or async functions (e.g. graph nodes)"""
+    def decorator(fn):
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with span(name):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def record_llm_call(model, duration, prompt_chars=0, prompt_tokens=None, output_tokens=None,
+                    image_bytes=0, stream=False):
+    """Per-LLM-call timing and payload size, labelled by model"""
+    prefix = f"llm.{model}"
+    observe(f"{prefix}.seconds", duration)
+    observe(f"{prefix}.prompt_chars", prompt_chars)
+    if prompt_tokens is not None:
+        observe(f"{prefix}.prompt_tokens", prompt_tokens)
+    if output_tokens is not None:
+        observe(f"{prefix}.output_tokens", output_tokens)
+    if image_bytes:
+        observe(f"{prefix}.image_bytes", image_bytes)
+    increment(f"{prefix}.calls")
+    if stream:
+        increment(f"{prefix}.streamed_calls")
+
+
+# --- Profiling hook ---
+
+@contextmanager
+def profile_request(name):
+    """
+    cProfile the enclosed block when FAULTLENS_PROFILE=1 and write PROFILE_DIR/<name>-<ts>.prof
+    (open with snakeviz / pstats). For sampling in production, attach py-spy to the PID instead:
+    `py-spy record --pid <pid>` needs no code changes.
+    """
+    if not PROFILE_ENABLED:
+        yield
+        return
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        safe_name = "".join(ch if ch.isalnum() or ch in "-_" else "_" for ch in str(name))
+        path = os.path.join(PROFILE_DIR, f"{safe_name}-{int(time.time() * 1000)}.prof")
+        profiler.dump_stats(path)
+        print(f"--- Profile written to {path} ---")
+
+
+# --- /metrics endpoint ---
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.rstrip("/") not in ("/metrics", ""):
+            self.send_error(404)
+            return
+        body = json.dumps(snapshot(), indent=2).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_metrics_server(port=None, host="127.0.0.1"):
+    """Serve snapshot() as JSON on http://host:port/metrics from a daemon thread"""
+    port = METRICS_PORT if port is None else port
+    if not port:
+        return None
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    print(f"--- Metrics available at http://{host}:{server.server_port}/metrics ---")
+    return server
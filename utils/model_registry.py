@@ -0,0 +1,74 @@
+import os
+import threading
+import time
+
+WARMUP_ENABLED = os.environ.get("FAULTLENS_WARMUP", "1") != "0"
+
+_loaders = {}
+_warmups = {}
+_models = {}
+_load_times = {}
+_locks = {}
+_registry_lock = threading.Lock()
+
+
+def register(name, loader, warmup=None):
+    """
+    Register a lazily loaded model
+    Args:
+        name: str
+        loader: callable returning the loaded model
+        warmup: callable(model), optional, cheap call that primes caches / the backend
+    """
+    with _registry_lock:
+        _loaders[name] = loader
+        _models.pop(name, None)   # re-registering replaces an already loaded model
+        if warmup:
+            _warmups[name] = warmup
+        else:
+            _warmups.pop(name, None)
+        _locks.setdefault(name, threading.Lock())
+
+
+def get_model(name):
+    """Return the model registered under `name`, loading it on first use"""
+    if name in _models:
+        return _models[name]
+    with _locks[name]:
+        if name not in _models:
+            start = time.time()
+            _models[name] = _loaders[name]()
+            _load_times[name] = time.time() - start
+            print(f"--- Loaded model '{name}' in {_load_times[name]:.2f} seconds ---")
+    return _models[name]
+
+
+def is_loaded(name):
+    return name in _models
+
+
+def load_times():
+    """Seconds spent loading each model so far"""
+    return dict(_load_times)
+
+
+def warm_up(names=None):
+    """Load and warm up the given (default: all) registered models, one after another"""
+    for name in names or list(_loaders):
+        start = time.time()
+        try:
+            model = get_model(name)
+            if name in _warmups:
+                _warmups[name](model)
+            print(f"--- Warm-up '{name}' done in {time.time() - start:.2f} seconds ---")
+        except Exception as e:
+            print(f"--- Warm-up '{name}' failed: {e} ---")
+
+
+def start_background_warmup(names=None):
+    """Run warm_up in a daemon thread so it never delays serving"""
+    if not WARMUP_ENABLED:
+        return None
+    thread = threading.Thread(target=warm_up, args=(names,), name="model-warmup", daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,320 @@
+import base64
+import json
+import os
+import threading
+import time
+import asyncio
+import weakref
+
+import httpx
+
+from utils import metrics
+from utils.image_prep import ImageBuffer
+
+OLLAMA_HOST = os.environ.get("OLLAMA_HOST", "http://127.0.0.1:11434")
+LLM_TIMEOUT = float(os.environ.get("FAULTLENS_LLM_TIMEOUT", "300"))
+LLM_CONNECT_TIMEOUT = float(os.environ.get("FAULTLENS_LLM_CONNECT_TIMEOUT", "5"))
+LLM_RETRIES = int(os.environ.get("FAULTLENS_LLM_RETRIES", "2"))
+LLM_RETRY_BACKOFF = float(os.environ.get("FAULTLENS_LLM_RETRY_BACKOFF", "0.5"))
+LLM_KEEP_ALIVE = os.environ.get("FAULTLENS_LLM_KEEP_ALIVE", "30m")
+LLM_MAX_CONNECTIONS = int(os.environ.get("FAULTLENS_LLM_MAX_CONNECTIONS", "8"))
+
+
+class OllamaError(RuntimeError):
+    """Raised when the Ollama server keeps failing after all retries."""
+
+
+class ContextLost(OllamaError):
+    """
+    Raised before any output when the server holding a conversation's `context` is gone:
+    the caller has to resend the conversation as a full prompt.
+    """
+
+
+def _normalize_host(host):
+    host = host.strip().rstrip("/")
+    if not host.startswith(("http://", "https://")):
+        host = "http://" + host
+    return host
+
+
+def encode_images(images):
+    """
+    Turn image paths / raw bytes / ImageBuffers into the base64 strings the Ollama API expects
+    Args:
+        images: str, bytes, ImageBuffer or list of those, optional
+    Returns:
+        list of str or None
+    """
+    if not images:
+        return None
+    if isinstance(images, (str, bytes, bytearray, ImageBuffer)):
+        images = [images]
+
+    encoded = []
+    for image in images:
+        if isinstance(image, ImageBuffer):
+            # encoded once per image, however many calls send it
+            encoded.append(image.b64)
+            continue
+        if isinstance(image, (bytes, bytearray)):
+            data = bytes(image)
+        else:
+            with open(image, "rb") as f:
+                data = f.read()
+        encoded.append(base64.b64encode(data).decode("ascii"))
+    return encoded
+
+
+def _is_retryable(exc):
+    if isinstance(exc, httpx.TransportError):
+        return True
+    if isinstance(exc, httpx.HTTPStatusError):
+        return exc.response.status_code >= 500
+    return False
+
+
+class OllamaClient:
+    """
+    Thin pooled client over the Ollama REST API.
+    One instance keeps its HTTP connections alive and is safe to share between threads.
+    """
+
+    def __init__(self, host=None, timeout=None, connect_timeout=None, retries=None,
+                 retry_backoff=None, keep_alive=None, max_connections=None):
+        self.host = _normalize_host(host or OLLAMA_HOST)
+        self.timeout = httpx.Timeout(
+            LLM_TIMEOUT if timeout is None else timeout,
+            connect=LLM_CONNECT_TIMEOUT if connect_timeout is None else connect_timeout,
+        )
+        self.retries = LLM_RETRIES if retries is None else retries
+        self.retry_backoff = LLM_RETRY_BACKOFF if retry_backoff is None else retry_backoff
+        self.keep_alive = LLM_KEEP_ALIVE if keep_alive is None else keep_alive
+        self.limits = httpx.Limits(
+            max_connections=max_connections or LLM_MAX_CONNECTIONS,
+            max_keepalive_connections=max_connections or LLM_MAX_CONNECTIONS,
+        )
+        self._client = None
+        self._async_clients = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    # --- connection pools ---
+
+    @property
+    def client(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = httpx.Client(base_url=self.host, timeout=self.timeout, limits=self.limits)
+        return self._client
+
+    @property
+    def async_client(self):
+        # httpx async pools are bound to the event loop they were created on
+        loop = asyncio.get_running_loop()
+        client = self._async_clients.get(loop)
+        if client is None:
+            client = httpx.AsyncClient(base_url=self.host, timeout=self.timeout, limits=self.limits)
+            self._async_clients[loop] = client
+        return client
+
+    def close(self):
+        if self._client is not None:
+            self._client.close()
+            self._client = None
+
+    async def aclose(self):
+        client = self._async_clients.pop(asyncio.get_running_loop(), None)
+        if client is not None:
+            await client.aclose()
+
+    # --- request building ---
+
+    def _payload(self, model, prompt, images=None, stream=False, options=None, **extra):
+        payload = {
+            "model": model,
+            "prompt": prompt,
+            "stream": stream,
+            "keep_alive": self.keep_alive,
+        }
+        encoded = encode_images(images)
+        if encoded:
+            payload["images"] = encoded
+        if options:
+            payload["options"] = options
+        payload.update({k: v for k, v in extra.items() if v is not None})
+        return payload
+
+    def _record(self, payload, start, data, stream=False):
+        images = payload.get("images") or []
+        metrics.record_llm_call(
+            payload["model"],
+            time.perf_counter() - start,
+            prompt_chars=len(payload.get("prompt", "")),
+            prompt_tokens=data.get("prompt_eval_count"),
+            output_tokens=data.get("eval_count"),
+            image_bytes=sum(len(image) * 3 // 4 for image in images),
+            stream=stream,
+        )
+
+    def _backoff(self, attempt):
+        return self.retry_backoff * (2 ** attempt)
+
+    # --- sync API ---
+
+    def _post(self, path, payload):
+        last_exc = None
+        for attempt in range(self.retries + 1):
+            try:
+                response = self.client.post(path, json=payload)
+                response.raise_for_status()
+                return response.json()
+            except Exception as e:
+                last_exc = e
+                if not _is_retryable(e) or attempt == self.retries:
+                    break
+                print(f"Ollama request failed ({e}), retrying...")
+                time.sleep(self._backoff(attempt))
+        raise OllamaError(f"Ollama request to {path} failed: {last_exc}") from last_exc
+
+    def generate(self, model, prompt, images=None, options=None, **extra):
+        """
+        Run a single non-streaming generation
+        Args:
+            model: str, ollama model tag
+            prompt: str
+            images: str, bytes or list of those, optional
+            options: dict of ollama model options, optional
+        Returns:
+            str: model output
+        """
+        payload = self._payload(model, prompt, images, stream=False, options=options, **extra)
+        start = time.perf_counter()
+        data = self._post("/api/generate", payload)
+        self._record(payload, start, data)
+        return data.get("response", "")
+
+    def generate_stream(self, model, prompt, images=None, options=None, done_info=None, **extra):
+        """
+        Same as generate, but yields the reply chunk by chunk as the model produces it.
+        Retries only happen before the first chunk has been received.
+        Args:
+            done_info: dict, optional, updated with the final chunk (timings and the
+                `context` tokens that can be passed back to continue the conversation)
+        """
+        payload = self._payload(model, prompt, images, stream=True, options=options, **extra)
+        start = time.perf_counter()
+        for attempt in range(self.retries + 1):
+            started = False
+            try:
+                with self.client.stream("POST", "/api/generate", json=payload) as response:
+                    response.raise_for_status()
+                    for line in response.iter_lines():
+                        if not line:
+                            continue
+                        chunk = json.loads(line)
+                        if chunk.get("error"):
+                            raise OllamaError(chunk["error"])
+                        if chunk.get("response"):
+                            started = True
+                            yield chunk["response"]
+                        if chunk.get("done"):
+                            self._record(payload, start, chunk, stream=True)
+                            if done_info is not None:
+                                done_info.update(chunk)
+                            return
+                return
+            except Exception as e:
+                if started or not _is_retryable(e) or attempt == self.retries:
+                    if isinstance(e, OllamaError):
+                        raise
+                    raise OllamaError(f"Ollama stream failed: {e}") from e
+                print(f"Ollama stream failed ({e}), retrying...")
+                time.sleep(self._backoff(attempt))
+
+    def ping(self, model):
+        """Load `model` into memory (empty prompt) and keep it pinned for keep_alive."""
+        return self._post("/api/generate", {"model": model, "keep_alive": self.keep_alive})
+
+    # --- async API ---
+
+    async def _apost(self, path, payload):
+        last_exc = None
+        for attempt in range(self.retries + 1):
+            try:
+                response = await self.async_client.post(path, json=payload)
+                response.raise_for_status()
+                return response.json()
+            except Exception as e:
+                last_exc = e
+                if not _is_retryable(e) or attempt == self.retries:
+                    break
+                print(f"Ollama request failed ({e}), retrying...")
+                await asyncio.sleep(self._backoff(attempt))
+        raise OllamaError(f"Ollama request to {path} failed: {last_exc}") from last_exc
+
+    async def agenerate(self, model, prompt, images=None, options=None, **extra):
+        """Async variant of generate."""
+        payload = self._payload(model, prompt, images, stream=False, options=options, **extra)
+        start = time.perf_counter()
+        data = await self._apost("/api/generate", payload)
+        self._record(payload, start, data)
+        return data.get("response", "")
+
+    async def agenerate_stream(self, model, prompt, images=None, options=None, done_info=None, **extra):
+        """Async variant of generate_stream."""
+        payload = self._payload(model, prompt, images, stream=True, options=options, **extra)
+        start = time.perf_counter()
+        for attempt in range(self.retries + 1):
+            started = False
+            try:
+                async with self.async_client.stream("POST", "/api/generate", json=payload) as response:
+                    response.raise_for_status()
+                    async for line in response.aiter_lines():
+                        if not line:
+                            continue
+                        chunk = json.loads(line)
+                        if chunk.get("error"):
+                            raise OllamaError(chunk["error"])
+                        if chunk.get("response"):
+                            started = True
+                            yield chunk["response"]
+                        if chunk.get("done"):
+                            self._record(payload, start, chunk, stream=True)
+                            if done_info is not None:
+                                done_info.update(chunk)
+                            return
+                return
+            except Exception as e:
+                if started or not _is_retryable(e) or attempt == self.retries:
+                    if isinstance(e, OllamaError):
+                        raise
+                    raise OllamaError(f"Ollama stream failed: {e}") from e
+                print(f"Ollama stream failed ({e}), retrying...")
+                await asyncio.sleep(self._backoff(attempt))
+
+
+# --- Shared instance ---
+_shared_client = None
+_shared_lock = threading.Lock()
+
+
+def get_client():
+    """
+    Process-wide client, created on first use: an LLMRouter when FAULTLENS_LLM_BACKENDS
+    lists several servers, otherwise one OllamaClient for OLLAMA_HOST.
+    """
+    global _shared_client
+    if _shared_client is None:
+        with _shared_lock:
+            if _shared_client is None:
+                from utils.llm_router import LLM_BACKENDS, LLMRouter
+                _shared_client = LLMRouter.from_config(LLM_BACKENDS) if LLM_BACKENDS else OllamaClient()
+    return _shared_client
+
+
+def set_client(client):
+    """Swap the shared client (e.g. to point at a stub server)."""
+    global _shared_client
+    with _shared_lock:
+        _shared_client = client
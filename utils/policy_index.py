@@ -0,0 +1,146 @@
+import math
+import os
+import re
+import threading
+from collections import Counter
+
+POLICY_TOP_K = int(os.environ.get("FAULTLENS_POLICY_TOP_K", "4"))
+POLICY_CHUNK_CHARS = int(os.environ.get("FAULTLENS_POLICY_CHUNK_CHARS", "600"))
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize(text):
+    return [t for t in _TOKEN_RE.findall(text.lower()) if len(t) > 1]
+
+
+def chunk_text(text, max_chars=POLICY_CHUNK_CHARS):
+    """
+    Split a policy file into chunks of whole paragraphs, each at most ~max_chars long.
+    The first line (the policy title) is prefixed to every chunk so it keeps its context.
+    """
+    paragraphs = [p.strip() for p in re.split(r"\n\s*\n", text) if p.strip()]
+    if not paragraphs:
+        return []
+    title = paragraphs[0].splitlines()[0].strip()
+
+    chunks = []
+    current = ""
+    for paragraph in paragraphs:
+        if current and len(current) + len(paragraph) + 2 > max_chars:
+            chunks.append(current)
+            current = ""
+        current = f"{current}\n\n{paragraph}" if current else paragraph
+    if current:
+        chunks.append(current)
+
+    return [c if c.startswith(title) else f"{title}\n{c}" for c in chunks]
+
+
+class PolicyIndex:
+    """
+    BM25 index over the .txt policy files of a directory.
+    Files are re-chunked only when their mtime changes, so calling search()
+    on every request costs one os.stat per file.
+    """
+
+    def __init__(self, policies_dir="policies", k1=1.5, b=0.75):
+        self.policies_dir = policies_dir
+        self.k1 = k1
+        self.b = b
+        self._files = {}   # file name -> (mtime, [(chunk_text, Counter(tokens), length)])
+        self._df = Counter()
+        self._n_chunks = 0
+        self._avg_len = 0.0
+        self._lock = threading.Lock()
+        self.refresh()
+
+    def refresh(self):
+        """Re-index files that were added, changed or removed since the last call"""
+        current = {}
+        if os.path.isdir(self.policies_dir):
+            for file in os.listdir(self.policies_dir):
+                if file.endswith(".txt"):
+                    current[file] = os.path.getmtime(os.path.join(self.policies_dir, file))
+
+        with self._lock:
+            changed = False
+            for file in list(self._files):
+                if file not in current:
+                    del self._files[file]
+                    changed = True
+            for file, mtime in current.items():
+                if file in self._files and self._files[file][0] == mtime:
+                    continue
+                with open(os.path.join(self.policies_dir, file), "r", encoding="utf-8") as f:
+                    chunks = chunk_text(f.read())
+                entries = []
+                for chunk in chunks:
+                    tokens = tokenize(chunk)
+                    entries.append((chunk, Counter(tokens), len(tokens)))
+                self._files[file] = (mtime, entries)
+                changed = True
+                print(f"--- Indexed policy file: {file} ({len(entries)} chunks) ---")
+            if changed:
+                self._rebuild_stats()
+
+    def _rebuild_stats(self):
+        self._df = Counter()
+        total_len = 0
+        self._n_chunks = 0
+        for _, entries in self._files.values():
+            for _, tf, length in entries:
+                self._df.update(tf.keys())
+                total_len += length
+                self._n_chunks += 1
+        self._avg_len = total_len / self._n_chunks if self._n_chunks else 0.0
+
+    def _idf(self, term):
+        df = self._df.get(term, 0)
+        return math.log(1 + (self._n_chunks - df + 0.5) / (df + 0.5))
+
+    def search(self, query, top_k=None):
+        """
+        Args:
+            query: str
+            top_k: int, optional
+        Returns:
+            list of (score, file name, chunk text), best first
+        """
+        self.refresh()
+        top_k = POLICY_TOP_K if top_k is None else top_k
+        terms = set(tokenize(query))
+        if not terms:
+            return []
+
+        scored = []
+        with self._lock:
+            for file, (_, entries) in self._files.items():
+                for chunk, tf, length in entries:
+                    score = 0.0
+                    for term in terms:
+                        freq = tf.get(term)
+                        if not freq:
+                            continue
+                        norm = freq + self.k1 * (1 - self.b + self.b * length / (self._avg_len or 1))
+                        score += self._idf(term) * freq * (self.k1 + 1) / norm
+                    if score > 0:
+                        scored.append((score, file, chunk))
+
+        scored.sort(key=lambda item: item[0], reverse=True)
+        return scored[:top_k]
+
+    def all_chunks(self):
+        """Every chunk of every policy file, in file order"""
+        self.refresh()
+        with self._lock:
+            return [chunk for _, (_, entries) in sorted(self._files.items()) for chunk, _, _ in entries]
+
+    def retrieve_text(self, query, top_k=None):
+        """
+        Top-k chunks joined in the same `---` separated format the policy prompt used before.
+        When no query term appears in any policy, the whole policy set is returned (as before
+        the index), so the model never answers without policies.
+        """
+        chunks = [chunk for _, _, chunk in self.search(query, top_k)] or self.all_chunks()
+        return "".join(chunk + "\n---\n" for chunk in chunks)
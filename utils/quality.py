@@ -0,0 +1,118 @@
+import os
+
+import numpy as np
+from PIL import Image, ImageOps
+
+from utils.analysis_cache import perceptual_hash
+
+QUALITY_GATE_ENABLED = os.environ.get("FAULTLENS_QUALITY_GATE", "1") != "0"
+# shorter side in pixels below which a photo cannot show defects
+MIN_SIDE = int(os.environ.get("FAULTLENS_QUALITY_MIN_SIDE", "200"))
+# variance of the Laplacian (long side capped at ANALYSIS_SIDE) below which a photo counts as blurry
+BLUR_THRESHOLD = float(os.environ.get("FAULTLENS_QUALITY_BLUR", "40"))
+# mean brightness (0-255) bounds, and the share of clipped pixels tolerated at either end
+# (high, since catalogue-style shots on a white background are mostly near-white)
+DARK_THRESHOLD = float(os.environ.get("FAULTLENS_QUALITY_DARK", "40"))
+BRIGHT_THRESHOLD = float(os.environ.get("FAULTLENS_QUALITY_BRIGHT", "230"))
+CLIPPED_FRACTION = float(os.environ.get("FAULTLENS_QUALITY_CLIPPED", "0.85"))
+# dHash bits (of 64) two views may differ by and still count as the same photo
+DUPLICATE_DISTANCE = int(os.environ.get("FAULTLENS_QUALITY_DUPLICATE_DISTANCE", "4"))
+
+ANALYSIS_SIDE = 512
+
+
+def _load_gray(image_path):
+    """
+    Original (width, height) and a grayscale copy with the long side capped at ANALYSIS_SIDE.
+    JPEGs are decoded at reduced size (draft mode), so a 12 MP photo costs a few milliseconds.
+    """
+    img = Image.open(image_path)
+    size = img.size
+    img.draft("L", (ANALYSIS_SIDE, ANALYSIS_SIDE))
+    img = ImageOps.exif_transpose(img).convert("L")
+    # smaller photos are measured as they are: upscaling would make them look blurry
+    img.thumbnail((ANALYSIS_SIDE, ANALYSIS_SIDE), Image.BILINEAR)
+    return size, img
+
+
+def laplacian_variance(gray):
+    """Sharpness: variance of the 4-neighbour Laplacian of a grayscale array"""
+    g = gray.astype(np.float32)
+    lap = g[1:-1, :-2] + g[1:-1, 2:] + g[:-2, 1:-1] + g[2:, 1:-1] - 4.0 * g[1:-1, 1:-1]
+    return float(lap.var())
+
+
+def check_image(image_path):
+    """
+    CPU-only quality checks of one upload (resolution, blur, exposure)
+    Returns:
+        dict: "problem" (str or None, the first failed check as a user-facing reason),
+        "phash" and the raw measurements
+    """
+    (width, height), img = _load_gray(image_path)
+    gray = np.asarray(img)
+    report = {
+        "width": width,
+        "height": height,
+        "sharpness": laplacian_variance(gray),
+        "brightness": float(gray.mean()),
+        "dark_fraction": float((gray <= 10).mean()),
+        "bright_fraction": float((gray >= 245).mean()),
+        "phash": perceptual_hash(img),
+        "problem": None,
+    }
+    if min(width, height) < MIN_SIDE:
+        report["problem"] = f"the photo is too small ({width}x{height}, at least {MIN_SIDE}px per side needed)"
+    elif report["brightness"] < DARK_THRESHOLD or report["dark_fraction"] > CLIPPED_FRACTION:
+        report["problem"] = "the photo is too dark"
+    elif report["brightness"] > BRIGHT_THRESHOLD or report["bright_fraction"] > CLIPPED_FRACTION:
+        report["problem"] = "the photo is overexposed"
+    elif report["sharpness"] < BLUR_THRESHOLD:
+        report["problem"] = "the photo is blurry"
+    return report
+
+
+def hamming(hash_a, hash_b):
+    return bin(int(hash_a, 16) ^ int(hash_b, 16)).count("1")
+
+
+def check_views(view_images):
+    """
+    Quality-check every view of a submission, including near-duplicate views
+    Args:
+        view_images: dict view name -> image path
+    Returns:
+        dict: view name -> reason to retake it (empty when every view is usable)
+    """
+    problems = {}
+    hashes = {}
+    for view_name, path in view_images.items():
+        if not path:
+            continue
+        try:
+            report = check_image(path)
+        except (OSError, ValueError) as e:
+            problems[view_name] = f"the file could not be read as an image ({e})"
+            continue
+        if report["problem"]:
+            problems[view_name] = report["problem"]
+            continue
+        duplicate_of = next(
+            (other for other, h in hashes.items() if hamming(h, report["phash"]) <= DUPLICATE_DISTANCE), None
+        )
+        if duplicate_of is not None:
+            problems[view_name] = f"it looks like the same photo as the [{duplicate_of}] view"
+        else:
+            hashes[view_name] = report["phash"]
+    return problems
+
+
+def retake_message(problems):
+    """User-facing answer asking to retake the listed views"""
+    lines = [f"- **{view_name}**: {reason}." for view_name, reason in problems.items()]
+    views = ", ".join(problems)
+    return (
+        f"Please retake the following photo{'s' if len(problems) > 1 else ''} ({views}) and submit again:\n"
+        + "\n".join(lines)
+        + "\nUse good lighting, hold the camera steady and make sure the whole product is in the frame."
+    )
@@ -1,24 +1,42 @@
-import subprocess
+import os
 
+from utils.ollama_client import get_client
+from utils.concurrency import limiter
+from utils.model_registry import register
 
-def run_qwen2vl(prompt, image_paths=None):
+# text model for policy answers and chat; a small text-only model works here,
+# leaving the VLM to the image stages
+MODEL = os.environ.get("FAULTLENS_POLICY_MODEL", "qwen2.5vl:7b")
+
+# warm-up = one empty request, which loads the model into Ollama and pins it for keep_alive
+register(MODEL, get_client, lambda client: client.ping(MODEL))
+
+
+async def arun_qwen2vl(prompt, image_paths=None, options=None):
     """
-    Run local Ollama model Qwen2.5VL
+    Run the policy / chat model
     Args:
         prompt: str
         image_paths: str or list of str, optional, if you want to pass images
+        options: dict of ollama model options, optional
     Returns:
         str: model output
     """
-    cmd = ["ollama", "run", "qwen2.5vl:7b"]
-
-    if image_paths:
-        if isinstance(image_paths, str):
-            image_paths = [image_paths]
-        cmd += image_paths
+    async with limiter("llm").ahold():
+        response = await get_client().agenerate(MODEL, prompt, images=image_paths, options=options)
+    return response.strip()
 
-    cmd.append(prompt)
 
-    result = subprocess.run(cmd, capture_output=True, text=False)
-    stdout_decoded = result.stdout.decode('utf-8', errors='replace')
-    return stdout_decoded.strip()
\ No newline at end of file
+async def astream_qwen2vl(prompt, image_paths=None, context=None, done_info=None):
+    """
+    Streaming variant of arun_qwen2vl, yields text chunks as the model produces them
+    Args:
+        context: list of int, optional, `context` returned by a previous call; the server
+            reuses the already evaluated prefix, so only the new prompt is prefilled
+        done_info: dict, optional, filled with the final chunk (incl. the new `context`)
+    """
+    async with limiter("llm").ahold():
+        async for chunk in get_client().agenerate_stream(
+            MODEL, prompt, images=image_paths, done_info=done_info, context=context
+        ):
+            yield chunk
@@ -0,0 +1,86 @@
+import os
+
+import numpy as np
+from PIL import Image
+
+from utils.image_prep import as_image
+
+PRECHECK_ENABLED = os.environ.get("FAULTLENS_PRECHECK", "1") != "0"
+# best-view score at or above which the VLM is skipped as a match; lower scores always go to the VLM
+# (on the img_for_test pairs, wrong products score up to ~0.41 and genuine items anywhere from ~0.25,
+# so a low score is no evidence of a wrong product; re-check with benchmarks/precheck_calibration.py)
+PRECHECK_MATCH = float(os.environ.get("FAULTLENS_PRECHECK_MATCH", "0.85"))
+
+_SIZE = 128
+_HIST_BINS = (16, 4, 4)          # H, S, V
+_GRID = 4                        # cells per side for the gradient histogram
+_ORIENTATIONS = 8
+_HIST_LEN = int(np.prod(_HIST_BINS))
+
+
+def compute_features(image):
+    """
+    Cheap CPU-only signature of an image: an HSV colour histogram plus a
+    coarse grid of gradient-orientation histograms (shape/layout).
+    Args:
+        image: str path, PIL.Image or ImageBuffer
+    Returns:
+        np.ndarray float32
+    """
+    img = as_image(image)
+    img = img.convert("RGB").resize((_SIZE, _SIZE), Image.BILINEAR)
+
+    hsv = np.asarray(img.convert("HSV"), dtype=np.int32)
+    idx = [(hsv[..., c] * bins) // 256 for c, bins in enumerate(_HIST_BINS)]
+    flat = (idx[0] * _HIST_BINS[1] + idx[1]) * _HIST_BINS[2] + idx[2]
+    hist = np.bincount(flat.ravel(), minlength=_HIST_LEN).astype(np.float32)
+    hist /= hist.sum() or 1.0
+
+    gray = np.asarray(img.convert("L"), dtype=np.float32)
+    gy, gx = np.gradient(gray)
+    magnitude = np.hypot(gx, gy)
+    orientation = ((np.arctan2(gy, gx) % np.pi) / np.pi * _ORIENTATIONS).astype(np.int32) % _ORIENTATIONS
+    cell = _SIZE // _GRID
+    grads = np.zeros((_GRID, _GRID, _ORIENTATIONS), dtype=np.float32)
+    for row in range(_GRID):
+        for col in range(_GRID):
+            window = np.s_[row * cell:(row + 1) * cell, col * cell:(col + 1) * cell]
+            grads[row, col] = np.bincount(
+                orientation[window].ravel(), weights=magnitude[window].ravel(), minlength=_ORIENTATIONS
+            )
+    grads = grads.ravel()
+    grads /= np.linalg.norm(grads) or 1.0
+
+    return np.concatenate([hist, grads]).astype(np.float32)
+
+
+def similarity(features_a, features_b):
+    """Score in [0, 1]: mean of colour-histogram intersection and gradient cosine similarity"""
+    hist_a, grads_a = features_a[:_HIST_LEN], features_a[_HIST_LEN:]
+    hist_b, grads_b = features_b[:_HIST_LEN], features_b[_HIST_LEN:]
+    colour = float(np.minimum(hist_a, hist_b).sum())
+    shape = float(np.clip(np.dot(grads_a, grads_b), 0.0, 1.0))
+    return 0.5 * colour + 0.5 * shape
+
+
+def score_views(view_images, reference_features):
+    """
+    Args:
+        view_images: dict view name -> image path or ImageBuffer
+        reference_features: np.ndarray from compute_features
+    Returns:
+        list of (score, view name, image), best first
+    """
+    scored = [
+        (similarity(compute_features(path), reference_features), view_name, path)
+        for view_name, path in view_images.items()
+    ]
+    scored.sort(key=lambda item: item[0], reverse=True)
+    return scored
+
+
+def precheck_verdict(score):
+    """'MATCH', or None when the VLM has to decide"""
+    if score >= PRECHECK_MATCH:
+        return "MATCH"
+    return None
@@ -0,0 +1,102 @@
+import asyncio
+import weakref
+
+from utils import metrics
+
+
+class _Flight:
+    """One running stream, replayed to every subscriber from its first event"""
+
+    def __init__(self):
+        self.events = []
+        self.done = False
+        self.error = None
+        self.subscribers = 0
+        self.task = None
+        self.changed = asyncio.Condition()
+
+
+class StreamCoalescer:
+    """
+    Singleflight for async streams: concurrent subscribers with the same key share one
+    producer run and all receive every event it yields (late joiners get a replay first).
+    The producer is cancelled if every subscriber goes away before it finishes.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._flights = {}
+
+    def in_flight(self):
+        return len(self._flights)
+
+    async def subscribe(self, key, factory):
+        """
+        Args:
+            key: hashable, identical work has identical keys
+            factory: callable returning the async iterator to run when no flight exists
+        Yields:
+            the events of the (shared) run
+        """
+        # asyncio primitives belong to one event loop, so flights never cross loops
+        key = (id(asyncio.get_running_loop()), key)
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = _Flight()
+            self._flights[key] = flight
+            flight.task = asyncio.create_task(self._produce(flight, factory))
+            # new identical submissions after this point start a fresh run
+            flight.task.add_done_callback(
+                lambda _: self._flights.get(key) is flight and self._flights.pop(key, None)
+            )
+        else:
+            metrics.increment(f"singleflight.{self.name}.joined")
+            print(f"--- Joining in-flight {self.name} run ---")
+
+        flight.subscribers += 1
+        index = 0
+        try:
+            while True:
+                async with flight.changed:
+                    await flight.changed.wait_for(lambda: index < len(flight.events) or flight.done)
+                while index < len(flight.events):
+                    yield flight.events[index]
+                    index += 1
+                if flight.done and index >= len(flight.events):
+                    if flight.error is not None:
+                        raise flight.error
+                    return
+        finally:
+            flight.subscribers -= 1
+            if flight.subscribers == 0 and not flight.done:
+                flight.task.cancel()
+
+    async def _produce(self, flight, factory):
+        try:
+            async for event in factory():
+                async with flight.changed:
+                    flight.events.append(event)
+                    flight.changed.notify_all()
+        except asyncio.CancelledError:
+            flight.error = asyncio.CancelledError()
+        except Exception as e:
+            flight.error = e
+        finally:
+            async with flight.changed:
+                flight.done = True
+                flight.changed.notify_all()
+
+
+class KeyedLocks:
+    """asyncio.Lock per key (per event loop), dropped once nobody holds or waits for it"""
+
+    def __init__(self):
+        self._locks = weakref.WeakValueDictionary()
+
+    def get(self, key):
+        key = (id(asyncio.get_running_loop()), key)
+        lock = self._locks.get(key)
+        if lock is None:
+            lock = asyncio.Lock()
+            self._locks[key] = lock
+        return lock
@@ -0,0 +1,112 @@
+import asyncio
+import os
+
+from utils import metrics
+
+SPECULATIVE_ENABLED = os.environ.get("FAULTLENS_SPECULATIVE", "1") != "0"
+# jobs nobody submitted within this many seconds are cancelled and dropped
+SPECULATIVE_TTL = float(os.environ.get("FAULTLENS_SPECULATIVE_TTL", "900"))
+# jobs kept at most, across all sessions (the oldest are dropped first)
+SPECULATIVE_MAX_JOBS = int(os.environ.get("FAULTLENS_SPECULATIVE_MAX_JOBS", "256"))
+
+
+class _Job:
+    def __init__(self, image, task):
+        self.image = image
+        self.task = task
+        self.timer = None
+
+
+class SpeculativeJobs:
+    """
+    Background jobs started when an image is uploaded, keyed by (session, view), so the
+    work is done (or under way) by the time the user submits.
+    A job is replaced when its view gets a different image, and cancelled on reset,
+    session end or after `ttl` seconds. Results live in memory only, so dropping a job frees them.
+    """
+
+    def __init__(self, runner, ttl=SPECULATIVE_TTL, max_jobs=SPECULATIVE_MAX_JOBS):
+        """
+        Args:
+            runner: async callable, image path -> result
+            ttl: float, seconds before an untaken job expires
+            max_jobs: int, jobs kept at most; starting one more drops the oldest
+        """
+        self.runner = runner
+        self.ttl = ttl
+        self.max_jobs = max_jobs
+        self._jobs = {}
+
+    def __len__(self):
+        return len(self._jobs)
+
+    def start(self, session, view, image):
+        """Start preparing `image` for the view (no-op if that exact image is already being prepared)"""
+        key = (session, view)
+        job = self._jobs.get(key)
+        if job is not None and job.image == image:
+            return
+        self.cancel(session, view)
+        if image is None:
+            return
+        while len(self._jobs) >= max(1, self.max_jobs):
+            metrics.increment("speculative.evicted")
+            self._drop(self._jobs.pop(next(iter(self._jobs))))
+        job = _Job(image, asyncio.create_task(self.runner(image)))
+        self._jobs[key] = job
+        self._arm(key, job)
+        metrics.increment("speculative.started")
+
+    async def take(self, session, view, image):
+        """
+        Result prepared for `image`, waiting for the job if it is still running.
+        Returns None when nothing was started for that image or the job failed.
+        """
+        key = (session, view)
+        job = self._jobs.get(key)
+        if job is None or job.image != image:
+            metrics.increment("speculative.miss")
+            return None
+        del self._jobs[key]
+        if job.timer is not None:
+            job.timer.cancel()
+        ready = job.task.done()
+        try:
+            # shielded: a client disconnecting mid-wait must not cancel work another submit can use
+            result = await asyncio.shield(job.task)
+        except asyncio.CancelledError:
+            if job.task.cancelled():
+                # the job itself was cancelled (reset in another tab), not this caller
+                return None
+            if self._jobs.setdefault(key, job) is job:
+                self._arm(key, job)
+            raise
+        except Exception as e:
+            print(f" Speculative job for view {view} failed: {e}")
+            metrics.increment("speculative.failed")
+            return None
+        metrics.increment("speculative.hit" if ready else "speculative.joined")
+        return result
+
+    def cancel(self, session, view=None):
+        """Cancel the job of one view, or every job of the session"""
+        keys = [(session, view)] if view is not None else [k for k in self._jobs if k[0] == session]
+        for key in keys:
+            job = self._jobs.pop(key, None)
+            if job is not None:
+                self._drop(job)
+
+    def _arm(self, key, job):
+        # abandoned jobs (no submit, no reset, no session end) expire even if no other upload comes
+        job.timer = asyncio.get_running_loop().call_later(self.ttl, self._expire_job, key, job)
+
+    def _expire_job(self, key, job):
+        if self._jobs.get(key) is job:
+            metrics.increment("speculative.expired")
+            self._drop(self._jobs.pop(key))
+
+    def _drop(self, job):
+        if job.timer is not None:
+            job.timer.cancel()
+        if not job.task.done():
+            job.task.cancel()
@@ -0,0 +1,188 @@
+"""
+JSON schemas for the model answers that drive decisions, plus parsing / validation with retry.
+
+Schemas are passed as the Ollama `format` (constrained decoding); set
+FAULTLENS_STRUCTURED_FORMAT=json for servers that only support plain JSON mode.
+"""
+import json
+import os
+import re
+
+STRUCTURED_FORMAT = os.environ.get("FAULTLENS_STRUCTURED_FORMAT", "schema")
+STRUCTURED_RETRIES = int(os.environ.get("FAULTLENS_STRUCTURED_RETRIES", "2"))
+
+VERDICTS = ("MATCH", "WRONG_PRODUCT", "UNSURE")
+SEVERITIES = ("none", "low", "medium", "high")
+
+DEFECT_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "type": {"type": "string"},
+        "location": {"type": "string"},
+        "severity": {"type": "string", "enum": list(SEVERITIES)},
+    },
+    "required": ["type", "location", "severity"],
+}
+
+VIEW_REPORT_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "defects": {"type": "array", "items": DEFECT_SCHEMA},
+        "severity": {"type": "string", "enum": list(SEVERITIES)},
+        "summary": {"type": "string"},
+    },
+    "required": ["defects", "severity", "summary"],
+}
+
+MULTIVIEW_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "views": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": dict(VIEW_REPORT_SCHEMA["properties"], view={"type": "string"}),
+                "required": ["view"] + VIEW_REPORT_SCHEMA["required"],
+            },
+        },
+    },
+    "required": ["views"],
+}
+
+COMPARISON_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "verdict": {"type": "string", "enum": list(VERDICTS)},
+        "confidence": {"type": "number", "minimum": 0, "maximum": 1},
+        "reasoning": {"type": "string"},
+        "defects": {"type": "array", "items": DEFECT_SCHEMA},
+    },
+    "required": ["verdict", "confidence", "reasoning"],
+}
+
+
+class StructuredOutputError(ValueError):
+    """Raised when the model keeps answering with JSON that does not fit the schema."""
+
+    def __init__(self, message, text=""):
+        super().__init__(message)
+        self.text = text
+
+
+def response_format(schema):
+    """Value for the Ollama `format` field"""
+    return "json" if STRUCTURED_FORMAT == "json" else schema
+
+
+def load_json(text):
+    """Parse a JSON object, tolerating ```json fences or chatter around it"""
+    text = (text or "").strip()
+    try:
+        return json.loads(text)
+    except ValueError:
+        match = re.search(r"\{.*\}", text, re.DOTALL)
+        if not match:
+            raise
+        return json.loads(match.group(0))
+
+
+def _severity(value):
+    value = str(value or "none").strip().lower()
+    if value not in SEVERITIES:
+        raise ValueError(f"invalid severity {value!r}")
+    return value
+
+
+def _defects(items):
+    if not isinstance(items, list):
+        raise ValueError("defects must be a list")
+    defects = []
+    for item in items:
+        if not isinstance(item, dict):
+            raise ValueError("defect entries must be objects")
+        defects.append({
+            "type": str(item.get("type", "")).strip() or "unspecified",
+            "location": str(item.get("location", "")).strip(),
+            "severity": _severity(item.get("severity")),
+        })
+    return defects
+
+
+def validate_view_report(data):
+    """
+    Returns:
+        dict: defects (list of {type, location, severity}), severity (worst one), summary
+    Raises:
+        ValueError: if required fields are missing or invalid
+    """
+    if not isinstance(data, dict):
+        raise ValueError("view report must be an object")
+    summary = str(data.get("summary", "")).strip()
+    if not summary:
+        raise ValueError("missing summary")
+    defects = _defects(data.get("defects", []))
+    worst = max(
+        [SEVERITIES.index(_severity(data.get("severity")))] + [SEVERITIES.index(d["severity"]) for d in defects]
+    )
+    return {"defects": defects, "severity": SEVERITIES[worst], "summary": summary}
+
+
+def validate_comparison(data):
+    """
+    Returns:
+        dict: verdict (MATCH / WRONG_PRODUCT / UNSURE), confidence (0..1), reasoning, defects
+    Raises:
+        ValueError: if required fields are missing or invalid
+    """
+    if not isinstance(data, dict):
+        raise ValueError("comparison must be an object")
+    verdict = str(data.get("verdict", "")).strip().upper().replace(" ", "_")
+    if verdict not in VERDICTS:
+        raise ValueError(f"invalid verdict {verdict!r}")
+    confidence = float(data.get("confidence"))
+    if not 0.0 <= confidence <= 1.0:
+        raise ValueError(f"confidence out of range: {confidence}")
+    return {
+        "verdict": verdict,
+        "confidence": confidence,
+        "reasoning": str(data.get("reasoning", "")).strip(),
+        "defects": _defects(data.get("defects", [])),
+    }
+
+
+def _retry_prompt(prompt, error):
+    return (
+        f"{prompt}\n\nYour previous answer was rejected ({error}). "
+        f"Answer again with ONLY a JSON object that follows the requested format."
+    )
+
+
+async def agenerate_validated(generate, prompt, validate, retries=None):
+    """
+    Call `generate(prompt)` (awaitable returning text) until `validate(parsed JSON)` succeeds.
+    Each retry repeats the prompt with the validation error appended.
+    Returns:
+        the validated value
+    Raises:
+        StructuredOutputError: after `retries` failed retries
+    """
+    retries = STRUCTURED_RETRIES if retries is None else retries
+    attempt_prompt, text, error = prompt, "", None
+    for attempt in range(retries + 1):
+        text = await generate(attempt_prompt)
+        try:
+            return validate(load_json(text))
+        except (ValueError, TypeError) as e:
+            error = e
+            print(f" Invalid structured answer (attempt {attempt + 1}): {e}")
+            attempt_prompt = _retry_prompt(prompt, e)
+    raise StructuredOutputError(f"No valid JSON answer after {retries + 1} attempts: {error}", text)
+
+
+def render_comparison(comparison):
+    """Comparison result as the text the policy prompt reads"""
+    verdict = comparison["verdict"].replace("_", " ")
+    text = f"VERDICT: {verdict} (confidence {comparison['confidence']:.2f})."
+    if comparison.get("reasoning"):
+        text += f" Reasoning: {comparison['reasoning']}"
+    return text
@@ -0,0 +1,181 @@
+"""
+CPU inference for exported YOLOv8 detectors without PyTorch / ultralytics.
+
+ONNX Runtime (`pip install onnxruntime`) and OpenVINO (`pip install openvino`) are optional;
+each is imported only when its backend is selected. Both backends return results with the
+slice of the ultralytics API yolov8_crop reads (`result.boxes.xyxy`, best box first).
+"""
+import os
+from abc import ABC, abstractmethod
+
+import numpy as np
+from PIL import Image
+
+LETTERBOX_COLOR = (114, 114, 114)
+
+
+class _Boxes:
+    def __init__(self, xyxy, conf, cls):
+        self.xyxy = xyxy
+        self.conf = conf
+        self.cls = cls
+
+
+class Detections:
+    """Detections of one image, in original image pixels, sorted by confidence"""
+
+    def __init__(self, xyxy, conf, cls):
+        self.boxes = _Boxes(xyxy, conf, cls)
+
+
+def letterbox(img, imgsz):
+    """
+    Resize keeping the aspect ratio and pad to imgsz x imgsz (same as ultralytics)
+    Returns:
+        (np.ndarray HWC uint8, scale, (pad_x, pad_y))
+    """
+    w, h = img.size
+    scale = min(imgsz / w, imgsz / h)
+    new_w, new_h = round(w * scale), round(h * scale)
+    canvas = Image.new("RGB", (imgsz, imgsz), LETTERBOX_COLOR)
+    pad = (round((imgsz - new_w) / 2 - 0.1), round((imgsz - new_h) / 2 - 0.1))
+    canvas.paste(img.resize((new_w, new_h), Image.BILINEAR), pad)
+    return np.asarray(canvas), scale, pad
+
+
+def preprocess(images, imgsz, dtype=np.float32):
+    """PIL images -> NCHW batch in [0, 1] plus the letterbox parameters of each image"""
+    arrays, meta = [], []
+    for img in images:
+        array, scale, pad = letterbox(img, imgsz)
+        arrays.append(array)
+        meta.append((scale, pad, img.size))
+    batch = np.stack(arrays).transpose(0, 3, 1, 2).astype(dtype) / 255.0
+    return np.ascontiguousarray(batch, dtype=dtype), meta
+
+
+def nms(boxes, scores, iou_threshold):
+    """Greedy non-maximum suppression, returns kept indices (highest score first)"""
+    order = scores.argsort()[::-1]
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    keep = []
+    while order.size:
+        i = order[0]
+        keep.append(i)
+        xx1 = np.maximum(boxes[i, 0], boxes[order[1:], 0])
+        yy1 = np.maximum(boxes[i, 1], boxes[order[1:], 1])
+        xx2 = np.minimum(boxes[i, 2], boxes[order[1:], 2])
+        yy2 = np.minimum(boxes[i, 3], boxes[order[1:], 3])
+        inter = np.clip(xx2 - xx1, 0, None) * np.clip(yy2 - yy1, 0, None)
+        iou = inter / (areas[i] + areas[order[1:]] - inter + 1e-9)
+        order = order[1:][iou <= iou_threshold]
+    return np.array(keep, dtype=np.int64)
+
+
+def postprocess(output, meta, conf_threshold=0.25, iou_threshold=0.7, max_det=300):
+    """
+    Decode raw YOLOv8 output (N, 4 + classes, anchors) into Detections per image
+    """
+    results = []
+    for prediction, (scale, (pad_x, pad_y), (w, h)) in zip(np.asarray(output, dtype=np.float32), meta):
+        prediction = prediction.T                       # anchors x (4 + classes)
+        class_scores = prediction[:, 4:]
+        cls = class_scores.argmax(axis=1)
+        conf = class_scores[np.arange(len(cls)), cls]
+        mask = conf > conf_threshold
+        xywh, conf, cls = prediction[mask, :4], conf[mask], cls[mask]
+        if not len(conf):
+            results.append(Detections(np.zeros((0, 4), np.float32), conf, cls))
+            continue
+        xyxy = np.empty_like(xywh)
+        xyxy[:, :2] = xywh[:, :2] - xywh[:, 2:] / 2
+        xyxy[:, 2:] = xywh[:, :2] + xywh[:, 2:] / 2
+        # class-aware NMS: offset boxes per class so different classes never suppress each other
+        keep = nms(xyxy + cls[:, None] * 7680.0, conf, iou_threshold)[:max_det]
+        xyxy, conf, cls = xyxy[keep], conf[keep], cls[keep]
+        xyxy[:, [0, 2]] = np.clip((xyxy[:, [0, 2]] - pad_x) / scale, 0, w)
+        xyxy[:, [1, 3]] = np.clip((xyxy[:, [1, 3]] - pad_y) / scale, 0, h)
+        results.append(Detections(xyxy, conf, cls))
+    return results
+
+
+class _ExportedYOLO(ABC):
+    """Shared call logic: batch when the model has a dynamic batch axis, else one image at a time"""
+
+    imgsz = 640
+    dtype = np.float32
+    dynamic_batch = False
+
+    @abstractmethod
+    def _infer(self, batch):
+        """NCHW batch -> raw output (N, 4 + classes, anchors)"""
+
+    def __call__(self, images, conf=0.25, iou=0.7, **kwargs):
+        if not isinstance(images, list):
+            images = [images]
+        batch, meta = preprocess(images, self.imgsz, self.dtype)
+        if self.dynamic_batch:
+            output = self._infer(batch)
+        else:
+            output = np.concatenate([self._infer(batch[i:i + 1]) for i in range(len(batch))])
+        return postprocess(output, meta, conf, iou)
+
+
+class OnnxYOLO(_ExportedYOLO):
+    """
+    Args:
+        path: str, .onnx file exported from the YOLOv8 weights (fp32, fp16 or int8)
+        imgsz: int, optional, input size (read from the model when it is fixed)
+        threads: int, intra-op threads (0 = ONNX Runtime default)
+    """
+
+    def __init__(self, path, imgsz=None, threads=0):
+        try:
+            import onnxruntime as ort
+        except ImportError as e:
+            raise ImportError("The onnx YOLO backend needs `pip install onnxruntime`") from e
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+            options.inter_op_num_threads = 1
+        self.session = ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        self.dtype = np.float16 if "float16" in model_input.type else np.float32
+        batch_dim, _, height, _ = model_input.shape
+        self.dynamic_batch = not isinstance(batch_dim, int)
+        self.imgsz = height if isinstance(height, int) else (imgsz or 640)
+
+    def _infer(self, batch):
+        return self.session.run(None, {self.input_name: batch})[0]
+
+
+class OpenVinoYOLO(_ExportedYOLO):
+    """
+    Args:
+        path: str, OpenVINO model directory from the export (or its .xml file)
+        imgsz: int, optional, input size (read from the model when it is fixed)
+        threads: int, inference threads (0 = OpenVINO default)
+    """
+
+    def __init__(self, path, imgsz=None, threads=0):
+        try:
+            import openvino as ov
+        except ImportError as e:
+            raise ImportError("The openvino YOLO backend needs `pip install openvino`") from e
+        if os.path.isdir(path):
+            path = next(os.path.join(path, f) for f in sorted(os.listdir(path)) if f.endswith(".xml"))
+        core = ov.Core()
+        config = {"PERFORMANCE_HINT": "LATENCY"}
+        if threads:
+            config["INFERENCE_NUM_THREADS"] = threads
+        model = core.read_model(path)
+        shape = model.inputs[0].get_partial_shape()
+        self.dynamic_batch = shape[0].is_dynamic
+        self.imgsz = shape[2].get_length() if shape[2].is_static else (imgsz or 640)
+        self.compiled = core.compile_model(model, "CPU", config)
+        self.output = self.compiled.outputs[0]
+
+    def _infer(self, batch):
+        return self.compiled(batch)[self.output]
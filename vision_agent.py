@@ -1,12 +1,165 @@
-from utils.llm_wrapper import run_qwen2vl
+import asyncio
+import json
+import os
+from utils.llm_wrapper import arun_qwen2vl, MODEL
+from utils.analysis_cache import get_cache
+from utils.image_prep import build_mosaic
+from utils.structured import (
+    MULTIVIEW_SCHEMA, VIEW_REPORT_SCHEMA, StructuredOutputError,
+    agenerate_validated, response_format, validate_view_report,
+)
 
-def run_vision_agent(cropped_image_path, product_description):
-    prompt = f"""
+# "per_view": one VLM call per view (default), "multi_image": all views in one request,
+# "mosaic": all views tiled into one image, for backends limited to a single image
+VISION_MODES = ("per_view", "multi_image", "mosaic")
+VISION_MODE = os.environ.get("FAULTLENS_VISION_MODE", "per_view")
+
+_JSON_INSTRUCTIONS = (
+    'severity is one of "none", "low", "medium", "high" ("none" and an empty defects list '
+    'when the product looks undamaged).'
+)
+
+
+def build_vision_prompt(product_description):
+    """product_description None gives the description-independent prompt used ahead of Submit"""
+    description = f"Description: {product_description}\n" if product_description is not None else ""
+    return f"""
 You are a professional product quality inspector.
 Analyze the product in the image.
+{description}Explain defect type, location, and severity in plain language.
+Answer ONLY with JSON of this form:
+{{"defects": [{{"type": "...", "location": "...", "severity": "low"}}], "severity": "<worst severity>", "summary": "..."}}
+{_JSON_INSTRUCTIONS}
+"""
+
+
+def build_multiview_prompt(view_names, product_description, mosaic=False):
+    if mosaic:
+        layout = "The image is a grid of numbered, labelled photos of the same product:"
+    else:
+        layout = "You are given several photos of the same product, in this order:"
+    views = "\n".join(f"{i + 1}. {name}" for i, name in enumerate(view_names))
+    return f"""
+You are a professional product quality inspector.
+{layout}
+{views}
 Description: {product_description}
-Explain defect type, location, and severity in plain language.
+Inspect every view separately. For each one, explain defect type, location, and severity in plain language.
+Answer ONLY with JSON of this form, one entry per view, in the same order:
+{{"views": [{{"view": "<view name>", "defects": [{{"type": "...", "location": "...", "severity": "low"}}], "severity": "<worst severity>", "summary": "..."}}]}}
+{_JSON_INSTRUCTIONS}
 """
-    return run_qwen2vl(prompt, image_paths=cropped_image_path)
 
 
+def _unparsed_report(text):
+    return {"defects": [], "severity": None, "summary": (text or "").strip()}
+
+
+def validate_view_reports(data, view_names):
+    """
+    Per-view reports from a multi-view answer. Views are matched by name, then by position.
+    Returns:
+        dict: view name -> report (see utils.structured.validate_view_report)
+    Raises:
+        ValueError: if the answer has no usable entry for some view
+    """
+    entries = data.get("views") if isinstance(data, dict) else data
+    if not isinstance(entries, list):
+        raise ValueError("missing views list")
+    by_name = {str(e.get("view", "")).strip().lower(): e for e in entries if isinstance(e, dict)}
+    reports = {}
+    for i, name in enumerate(view_names):
+        entry = by_name.get(name.lower())
+        if entry is None and i < len(entries):
+            entry = entries[i]
+        if entry is None:
+            raise ValueError(f"no entry for view {name!r}")
+        reports[name] = validate_view_report(entry)
+    return reports
+
+
+def format_view_reports(reports):
+    """Render per-view reports as the "View [name]: ..." text the comparison / policy prompts expect"""
+    lines = []
+    for name, report in reports.items():
+        defects = "; ".join(
+            f"{d['type']} at {d['location'] or 'unspecified location'} ({d['severity']})"
+            for d in report.get("defects", [])
+        )
+        details = ", ".join(filter(None, [
+            f"severity: {report['severity']}" if report.get("severity") else "",
+            f"defects: {defects}" if defects else "",
+        ]))
+        lines.append(f"View [{name}]: {report.get('summary', '')}" + (f" ({details})" if details else ""))
+    return "\n".join(lines)
+
+
+async def arun_vision_agent(cropped_image_path, product_description):
+    """
+    Returns:
+        dict: structured report of one view (defects, severity, summary)
+    """
+    prompt = build_vision_prompt(product_description)
+    fmt = response_format(VIEW_REPORT_SCHEMA)
+
+    async def compute():
+        report = await agenerate_validated(
+            lambda p: arun_qwen2vl(p, image_paths=cropped_image_path, format=fmt), prompt, validate_view_report
+        )
+        return json.dumps(report)
+
+    try:
+        text = await get_cache().aget_or_compute(MODEL, prompt, cropped_image_path, compute)
+    except StructuredOutputError as e:
+        return _unparsed_report(e.text)
+    return validate_view_report(json.loads(text))
+
+
+async def arun_multiview_agent(cropped_images, product_description, mosaic=False):
+    """
+    Analyze all views of a submission in one VLM request
+    Args:
+        cropped_images: dict, view name -> image path
+        product_description: str
+        mosaic: bool, send one tiled image instead of one image per view
+    Returns:
+        dict: view name -> report (defects, severity, summary)
+    """
+    view_names = list(cropped_images)
+    prompt = build_multiview_prompt(view_names, product_description, mosaic=mosaic)
+    if mosaic:
+        images = await asyncio.to_thread(build_mosaic, list(cropped_images.values()), view_names)
+    else:
+        images = list(cropped_images.values())
+    fmt = response_format(MULTIVIEW_SCHEMA)
+
+    def validate(data):
+        return validate_view_reports(data, view_names)
+
+    async def compute():
+        reports = await agenerate_validated(lambda p: arun_qwen2vl(p, image_paths=images, format=fmt), prompt, validate)
+        return json.dumps({"views": [dict(report, view=name) for name, report in reports.items()]})
+
+    try:
+        text = await get_cache().aget_or_compute(MODEL, prompt, images, compute)
+    except StructuredOutputError as e:
+        return {name: _unparsed_report(e.text) for name in view_names}
+    return validate(json.loads(text))
+
+
+async def arun_vision_views(cropped_images, product_description, mode=None):
+    """
+    Per-view reports for every cropped view, using the configured VISION_MODE
+    Returns:
+        dict: view name -> {"defects", "severity", "summary"}
+    """
+    mode = mode or VISION_MODE
+    if mode in ("multi_image", "mosaic") and len(cropped_images) > 1:
+        return await arun_multiview_agent(cropped_images, product_description, mosaic=(mode == "mosaic"))
+
+    # concurrency is bounded process-wide by the "vlm" limiter inside the wrapper
+    names = list(cropped_images)
+    reports = await asyncio.gather(
+        *(arun_vision_agent(cropped_images[name], product_description) for name in names)
+    )
+    return dict(zip(names, reports))
@@ -1,13 +1,179 @@
-from ultralytics import YOLO
+import argparse
+import os
+import shutil
 from PIL import Image
+from utils.image_prep import load_oriented
+from utils.model_registry import register, get_model
 
-model = YOLO("model\\best.pt")
-def run_yolo_crop(image_path, save_path="cropped.jpg", conf_threshold=0.5):
-    results = model(image_path, conf=conf_threshold)
-    if len(results[0].boxes.xyxy) == 0:
-        return None
-    box = results[0].boxes.xyxy[0].tolist()
-    img = Image.open(image_path)
-    crop = img.crop((box[0], box[1], box[2], box[3]))
-    crop.save(save_path)
-    return save_path
\ No newline at end of file
+# "torch" (ultralytics + best.pt), or the exported CPU runtimes "onnx" / "openvino"
+YOLO_BACKEND = os.environ.get("FAULTLENS_YOLO_BACKEND", "torch")
+# fp32, fp16 or int8 (exported backends only)
+YOLO_PRECISION = os.environ.get("FAULTLENS_YOLO_PRECISION", "fp32")
+YOLO_IMGSZ = int(os.environ.get("FAULTLENS_YOLO_IMGSZ", "640"))
+YOLO_THREADS = int(os.environ.get("FAULTLENS_YOLO_THREADS", "0"))
+TORCH_MODEL_PATH = os.path.join("model", "best.pt")
+
+
+def default_model_path(backend, precision="fp32"):
+    """Where `python yolov8_crop.py export` writes each backend / precision"""
+    suffix = "" if precision == "fp32" else f"_{precision}"
+    if backend == "onnx":
+        return os.path.join("model", f"best{suffix}.onnx")
+    if backend == "openvino":
+        return os.path.join("model", f"best{suffix}_openvino_model")
+    return TORCH_MODEL_PATH
+
+
+YOLO_MODEL_PATH = os.environ.get("FAULTLENS_YOLO_MODEL") or default_model_path(YOLO_BACKEND, YOLO_PRECISION)
+
+
+def load_yolo_backend(backend=None, model_path=None, imgsz=None, threads=None):
+    """
+    Load the detector for `backend` ("torch", "onnx" or "openvino")
+    Returns:
+        callable(images, conf=...) -> results with `.boxes.xyxy`
+    """
+    backend = backend or YOLO_BACKEND
+    model_path = model_path or (YOLO_MODEL_PATH if backend == YOLO_BACKEND else default_model_path(backend))
+    imgsz = imgsz or YOLO_IMGSZ
+    threads = YOLO_THREADS if threads is None else threads
+    if backend == "onnx":
+        from utils.yolo_backends import OnnxYOLO
+        return OnnxYOLO(model_path, imgsz=imgsz, threads=threads)
+    if backend == "openvino":
+        from utils.yolo_backends import OpenVinoYOLO
+        return OpenVinoYOLO(model_path, imgsz=imgsz, threads=threads)
+    if backend != "torch":
+        raise ValueError(f"Unknown YOLO backend: {backend}")
+
+    # ultralytics itself is slow to import, so it is only pulled in on first use
+    from ultralytics import YOLO
+    if threads:
+        import torch
+        torch.set_num_threads(threads)
+    model = YOLO(model_path)
+
+    def predict(images, conf=0.5, **kwargs):
+        return model(images, conf=conf, imgsz=imgsz, verbose=False, **kwargs)
+    return predict
+
+
+def _load_yolo():
+    return load_yolo_backend()
+
+
+def _warm_up_yolo(model):
+    model(Image.new("RGB", (640, 640)))
+
+
+register("yolo", _load_yolo, _warm_up_yolo)
+
+
+def crop_images(image_paths, conf_threshold=0.5):
+    """
+    Crop the detected product out of several images with a single batched forward pass, in memory
+    Args:
+        image_paths: list of str
+        conf_threshold: float
+    Returns:
+        list of PIL.Image or None: crop per input image, None where nothing was detected
+    """
+    if not image_paths:
+        return []
+
+    # Decode once with PIL: a list of in-memory images is run as one batch by ultralytics,
+    # and the same decoded (EXIF-oriented) image is reused for cropping.
+    images = [load_oriented(path) for path in image_paths]
+    results = get_model("yolo")(images, conf=conf_threshold)
+
+    crops = []
+    for img, result in zip(images, results):
+        if len(result.boxes.xyxy) == 0:
+            crops.append(None)
+            continue
+        box = result.boxes.xyxy[0].tolist()
+        crops.append(img.crop((box[0], box[1], box[2], box[3])))
+    return crops
+
+
+def export_model(backend, precision="fp32", imgsz=None, source=None, calib_dir="img_for_test", data=None):
+    """
+    Export the PyTorch weights for a CPU backend (needs ultralytics; fp16/int8 ONNX also need
+    onnxconverter-common / onnxruntime, INT8 OpenVINO needs nncf and a dataset yaml in `data`)
+    Returns:
+        str: path of the exported model (default_model_path(backend, precision))
+    """
+    from ultralytics import YOLO
+    imgsz = imgsz or YOLO_IMGSZ
+    source = source or TORCH_MODEL_PATH
+    target = default_model_path(backend, precision)
+
+    if backend == "openvino":
+        exported = YOLO(source).export(
+            format="openvino", imgsz=imgsz, half=(precision == "fp16"), int8=(precision == "int8"), data=data,
+        )
+        if os.path.abspath(exported) != os.path.abspath(target):
+            shutil.rmtree(target, ignore_errors=True)
+            shutil.move(exported, target)
+        return target
+    if backend != "onnx":
+        raise ValueError(f"Cannot export to backend: {backend}")
+
+    fp32_path = YOLO(source).export(format="onnx", imgsz=imgsz, dynamic=True, simplify=True)
+    if precision == "fp32":
+        if os.path.abspath(fp32_path) != os.path.abspath(target):
+            shutil.move(fp32_path, target)
+        return target
+
+    import onnx
+    if precision == "fp16":
+        from onnxconverter_common import float16
+        onnx.save(float16.convert_float_to_float16(onnx.load(fp32_path)), target)
+        return target
+
+    if precision == "int8":
+        from onnxruntime.quantization import CalibrationDataReader, QuantFormat, QuantType, quantize_static
+        from utils.yolo_backends import preprocess
+
+        input_name = onnx.load(fp32_path).graph.input[0].name
+        calib_images = [
+            os.path.join(calib_dir, name) for name in sorted(os.listdir(calib_dir))
+            if name.lower().endswith((".jpg", ".jpeg", ".png"))
+        ]
+
+        class _Reader(CalibrationDataReader):
+            def __init__(self):
+                self.items = iter(calib_images)
+
+            def get_next(self):
+                path = next(self.items, None)
+                if path is None:
+                    return None
+                return {input_name: preprocess([load_oriented(path)], imgsz)[0]}
+
+        quantize_static(
+            fp32_path, target, _Reader(), quant_format=QuantFormat.QDQ,
+            activation_type=QuantType.QUInt8, weight_type=QuantType.QInt8, per_channel=True,
+        )
+        return target
+    raise ValueError(f"Unknown precision: {precision}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="YOLO cropper utilities")
+    sub = parser.add_subparsers(dest="command", required=True)
+    exp = sub.add_parser("export", help="export best.pt for a CPU backend")
+    exp.add_argument("--backend", choices=["onnx", "openvino"], default="onnx")
+    exp.add_argument("--precision", choices=["fp32", "fp16", "int8"], default="fp32")
+    exp.add_argument("--imgsz", type=int, default=YOLO_IMGSZ)
+    exp.add_argument("--calib-dir", default="img_for_test", help="images for ONNX INT8 calibration")
+    exp.add_argument("--data", default=None, help="dataset yaml for OpenVINO INT8 calibration")
+    args = parser.parse_args()
+
+    if args.command == "export":
+        path = export_model(args.backend, args.precision, args.imgsz, calib_dir=args.calib_dir, data=args.data)
+        print(f"--- Exported {args.backend} ({args.precision}) model to {path} ---")
+
+
+if __name__ == "__main__":
+    main()